@@ -1,26 +1,209 @@
 # agent.py
-from planner import generate_plan
-from executor import execute_code
+import os
+import argparse
+import shutil
+
+from planner import (generate_plan, generate_plans, refine_plan, generate_step_plan, refine_step_plan,
+                     usage, reset_usage)
+from executor import execute_code, race_plans, failed_result
+from step_plan import parse_step_plan, format_step_plan, run_step_plan, StepPlanError
 from feedback_loop import feedback_loop
+from agent_stats import record_task, summarize
+from hedging import enable_hedging
+from workspace import Workspace, get_dependency_cache, evict, purge, list_workspaces
 
-def main():
-    print("👩‍💻 Welcome to the Local AI Agent!")
-    task = input("📌 What task do you want the agent to perform?\n> ")
+def choose_plans(plans, answer):
+    """The plans picked by an approval answer: 'yes' for all, or numbers like '1,3'."""
+    if answer == 'yes':
+        return plans
+    picked = []
+    for part in answer.replace(" ", "").split(","):
+        if part.isdigit() and 1 <= int(part) <= len(plans) and plans[int(part) - 1] not in picked:
+            picked.append(plans[int(part) - 1])
+    return picked
+
+def print_stats():
+    modes = summarize()
+    if not modes:
+        print("No finished tasks recorded yet.")
+        return
+    for name, mode in sorted(modes.items()):
+        print(f"{name}: {mode['tasks']} tasks, {mode['success_rate']:.0%} solved, "
+              f"{mode['attempts_per_solved']} attempts and {mode['tokens_per_solved']} tokens per solved task")
+
+def open_workspace(task, fresh=False):
+    """The task's kept workspace, after making room for it among the others."""
+    workspace = Workspace(task)
+    if fresh:
+        shutil.rmtree(workspace.path, ignore_errors=True)
+    reused = os.path.isdir(workspace.path)
+    workspace.open()
+    freed = evict(keep=workspace.path)
+    print(f"\n📁 {'Reusing' if reused else 'New'} workspace {workspace.path}")
+    if freed:
+        print(f"🧹 Removed {freed / (1024 * 1024):.0f} MB of least recently used workspaces")
+    return workspace
 
+def print_workspaces():
+    workspaces = list_workspaces()
+    if not workspaces:
+        print("No task workspaces kept.")
+        return
+    for entry in workspaces:
+        task = " ".join(entry["task"].split())
+        print(f"{entry['path']}  {entry['bytes'] / (1024 * 1024):.1f} MB, "
+              f"used {entry['age_s'] / 3600:.1f}h ago  {task[:60]}")
+
+def run_step_task(task, fresh=False):
+    """--steps mode: plan a graph of steps, run it, and on retry re-run only what failed.
+
+    Returns whether the task succeeded and how many runs it took.
+    """
+    workspace = open_workspace(task, fresh).subdir("steps")
+    state = {}  # step id -> last run, so unchanged steps that succeeded are not re-run
+    attempts = 0
+    plan_text = None
+    failures = None
     while True:
-        plan = generate_plan(task)
-        print("\n🧠 Plan Generated:\n", plan)
+        if failures:
+            print("\n🛠️ Refining the failed steps with their error output...")
+            plan_text = refine_step_plan(task, plan_text, failures)
+        else:
+            plan_text = generate_step_plan(task)
+        try:
+            steps = parse_step_plan(plan_text)
+        except StepPlanError as e:
+            print("\n🧠 Plan Generated:\n", plan_text)
+            print(f"\n⚠️ {e}")
+            if feedback_loop(False):
+                return False, attempts
+            failures = {"(whole plan)": failed_result(str(e))}
+            continue
+        print("\n🧠 Plan Generated:\n" + format_step_plan(steps))
 
         approve = input("\n✅ Approve and run this plan? (yes/no): ").lower()
         if approve != 'yes':
             task = input("🔁 Enter revised task: ")
+            failures = None
+            # Steps of the old task that happen to match the new plan must still run
+            state = {}
+            workspace = open_workspace(task).subdir("steps")
             continue
 
-        success = execute_code(plan)
+        attempts += 1
+        print(f"\n🚀 Executing {len(steps)} steps in {workspace}...")
+        results = run_step_plan(steps, workspace, state, deps=get_dependency_cache())
+        success = all(state.get(step["id"], {}).get("success") for step in steps)
         if feedback_loop(success):
+            return success, attempts
+        print("\n🔁 Retrying... Re-refining the plan.")
+        # Skipped steps are not reported: they had no chance to fail on their own
+        failures = {step_id: result for step_id, result in results.items()
+                    if not result["success"] and not result.get("skipped")}
+
+def report_task(success, attempts, mode):
+    spent = usage()
+    record_task(success, attempts, spent, mode)
+    print(f"\n📈 {attempts} attempt(s), {spent['requests']} planner requests, "
+          f"{spent['prompt_tokens'] + spent['output_tokens']} tokens")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local AI agent: plan a task with Gemini and run it",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""environment variables:
+  GEMINI_EXEC_TIMEOUT          wall-clock and CPU-time limit per plan run, in seconds (60)
+  GEMINI_EXEC_INSTALL_TIMEOUT  limit for runs that install packages, in seconds (600)
+  GEMINI_EXEC_MEMORY_MB        memory cap per plan run in MB; 0 means no cap (0)
+  GEMINI_EXEC_WORKERS          pre-started Python workers that plans run in (2)
+  GEMINI_EXEC_OUTPUT_LIMIT_MB  stop a run once it has printed this much output (64)
+  GEMINI_EXEC_LOG              file that receives the complete output of every run
+  GEMINI_WORKSPACE_MAX_MB      workspaces and dependency cache are trimmed back to this size (4096)""")
+    parser.add_argument("--candidates", "-n", type=int, default=1,
+                        help="Generate this many plans concurrently and race them; the first to succeed wins")
+    parser.add_argument("--no-refine", action="store_true",
+                        help="After a failure, plan again from the task alone instead of fixing the failed plan")
+    parser.add_argument("--steps", action="store_true",
+                        help="Plan the task as a graph of steps; independent steps run at the same time")
+    parser.add_argument("--stats", action="store_true",
+                        help="Show attempts and tokens per solved task for past runs, then exit")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Send a duplicate of a planner request that is slower than usual and take the first answer")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Empty the task's workspace before the first run instead of reusing its files")
+    parser.add_argument("--workspaces", action="store_true",
+                        help="List the kept task workspaces, then exit")
+    parser.add_argument("--purge", action="store_true",
+                        help="Delete every task workspace and the package cache, then exit")
+    args = parser.parse_args()
+    if args.hedge:
+        enable_hedging()
+
+    if args.stats:
+        print_stats()
+        return
+    if args.workspaces:
+        print_workspaces()
+        return
+    if args.purge:
+        print(f"🧹 Freed {purge() / (1024 * 1024):.1f} MB of workspaces and cached packages")
+        return
+
+    print("👩‍💻 Welcome to the Local AI Agent!")
+    task = input("📌 What task do you want the agent to perform?\n> ")
+
+    reset_usage()
+    if args.steps:
+        success, attempts = run_step_task(task, args.fresh)
+        report_task(success, attempts, "steps")
+        return
+
+    attempts = 0
+    failed = None  # (plan, result) of the last failed run, for refinement
+    # Kept between retries, so downloads and installed packages are reused
+    workspace = open_workspace(task, args.fresh)
+
+    while True:
+        if failed is not None:
+            print("\n🛠️ Refining the plan with the error output...")
+        if args.candidates > 1:
+            plans = generate_plans(task, args.candidates, failed)
+            for number, plan in enumerate(plans, 1):
+                print(f"\n🧠 Plan {number} of {len(plans)}:\n", plan)
+            answer = input("\n✅ Approve and run these plans? (yes/no, or plan numbers like 1,3): ").lower().strip()
+            plans = choose_plans(plans, answer)
+            if not plans:
+                task = input("🔁 Enter revised task: ")
+                failed = None
+                workspace = open_workspace(task)
+                continue
+            attempts += 1
+            if len(plans) > 1:
+                shown, result = race_plans(plans, workspace=workspace)
+                plan = plans[shown]
+            else:
+                plan = plans[0]
+                result = execute_code(plan, workspace=workspace)
+        else:
+            plan = refine_plan(task, *failed) if failed is not None else generate_plan(task)
+            print("\n🧠 Plan Generated:\n", plan)
+
+            approve = input("\n✅ Approve and run this plan? (yes/no): ").lower()
+            if approve != 'yes':
+                task = input("🔁 Enter revised task: ")
+                failed = None
+                workspace = open_workspace(task)
+                continue
+
+            attempts += 1
+            result = execute_code(plan, workspace=workspace)
+        if feedback_loop(result["success"]):
+            report_task(result["success"], attempts, "restart" if args.no_refine else "refine")
             break
         else:
             print("\n🔁 Retrying... Re-refining the plan.")
+            if not args.no_refine:
+                failed = (plan, result)
 
 if __name__ == '__main__':
     main()
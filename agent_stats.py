@@ -0,0 +1,44 @@
+# agent_stats.py
+import os
+import json
+import time
+from typing import Dict, Any
+
+STATS_PATH = os.path.expanduser("~/.gemini_cli/agent_runs.jsonl")
+
+
+def record_task(success: bool, attempts: int, usage: Dict[str, int], mode: str,
+                path: str = STATS_PATH) -> None:
+    """Append one finished task (solved or abandoned) to the agent's run log."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    record = {"time": time.time(), "mode": mode, "success": success, "attempts": attempts,
+              "requests": usage["requests"], "prompt_tokens": usage["prompt_tokens"],
+              "output_tokens": usage["output_tokens"]}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def summarize(path: str = STATS_PATH) -> Dict[str, Dict[str, Any]]:
+    """Per retry mode: tasks, success rate, and mean attempts and tokens per solved task."""
+    modes: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(path):
+        return modes
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            mode = modes.setdefault(record.get("mode", "restart"),
+                                    {"tasks": 0, "solved": 0, "attempts": 0, "tokens": 0})
+            mode["tasks"] += 1
+            if record.get("success"):
+                mode["solved"] += 1
+                mode["attempts"] += record.get("attempts", 0)
+                mode["tokens"] += record.get("prompt_tokens", 0) + record.get("output_tokens", 0)
+    for mode in modes.values():
+        solved = mode["solved"] or 1
+        mode["success_rate"] = round(mode["solved"] / mode["tasks"], 3)
+        mode["attempts_per_solved"] = round(mode.pop("attempts") / solved, 2)
+        mode["tokens_per_solved"] = round(mode.pop("tokens") / solved)
+    return modes
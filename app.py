@@ -1,12 +1,25 @@
-import requests
 import json
 import argparse
 import os
-from getpass import getpass
+import importlib.util
 import sys
 import time
-import platform
-from typing import Optional, Dict, Any
+import threading
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple, TYPE_CHECKING
+
+from gemini_client import get_client, configure_client, extract_text, GeminiResponseError, DEFAULT_MODEL
+from tracing import traced, get_tracer, enable_tracing, DEFAULT_TRACE_PATH
+
+# The rest of the project is imported where it is used, so `--version` and `--help`
+# start quickly (see bench/startup.py)
+if TYPE_CHECKING:
+    from response_cache import ResponseCache
+    from context_cache import CachedContext
+    from daemon import DaemonClient
+    from session_store import SessionStore
+    from history_view import HistoryView
+    from jobs import Job, JobQueue
+    from conversation import Conversation
 
 # Add colorama for cross-platform colored terminal text
 try:
@@ -30,12 +43,21 @@ except ImportError:
     Back = DummyBack()
     HAS_COLORS = False
 
-# Add keyboard support for scrolling
-try:
-    import keyboard
-    HAS_KEYBOARD = True
-except ImportError:
-    HAS_KEYBOARD = False
+# Add keyboard support for scrolling. The package is slow to import, so only its
+# presence is checked here; load_keyboard() imports it when interactive mode starts.
+HAS_KEYBOARD = importlib.util.find_spec("keyboard") is not None
+keyboard = None
+
+def load_keyboard() -> bool:
+    """Import the keyboard package on first use; returns whether it is available."""
+    global keyboard, HAS_KEYBOARD
+    if keyboard is None and HAS_KEYBOARD:
+        try:
+            import keyboard as keyboard_module
+            keyboard = keyboard_module
+        except ImportError:
+            HAS_KEYBOARD = False
+    return HAS_KEYBOARD
 
 # Banner and UI constants
 BANNER = r"""
@@ -48,10 +70,6 @@ BANNER = r"""
 """
 VERSION = "1.1.0"
 
-# Constants for chat display
-MAX_DISPLAY_MESSAGES = 10  # Number of messages to show at once
-SCROLL_OFFSET = 0  # Global variable to track scroll position
-
 # UI Constants
 UI_SEPARATOR = "─"  # Horizontal separator
 UI_MESSAGE_PREFIX_USER = "▷ "  # User message prefix
@@ -63,9 +81,54 @@ UI_MUTED_COLOR = Fore.LIGHTBLACK_EX
 UI_USER_COLOR = Fore.WHITE
 UI_AI_COLOR = Fore.CYAN
 
+# Sampling settings sent with every query
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "maxOutputTokens": 2000,
+    "topP": 0.95
+}
+
+# Characters of retrieved project context packed into a prompt when --context is a directory
+DEFAULT_CONTEXT_BUDGET = 50000
+
+# Asked of a --file too large for one request when no prompt is given
+DEFAULT_LARGE_FILE_QUESTION = "Summarize this input: what it is, its key points, and any errors or problems it shows."
+
+# Asked about --watch files when neither a prompt nor a prompt file is given
+DEFAULT_WATCH_PROMPT = "Review this code: point out bugs, risky changes and concrete improvements."
+
+# What --watch sends after an edit: the diff, not the files
+WATCH_CHANGE_PROMPT = """The files changed since your last answer. Unified diff:
+
+```diff
+{diff}```
+
+Update your answer for the new version, focusing on what this change affects. The request was:
+{prompt}"""
+
+# Stands in for the first --watch turn in later requests, so the full files are sent only once
+WATCH_FIRST_TURN = "{prompt}\n\n[The full contents of {files} were attached here.]"
+
+# Most recent turns of a saved session loaded back into the conversation by !resume
+RESUME_TURNS = 20
+
+# On-disk response cache; set up in main() unless --no-cache is given
+RESPONSE_CACHE: Optional["ResponseCache"] = None
+
+# A large --context file served from a server-side cache instead of being sent with every request
+CACHED_CONTEXT: Optional["CachedContext"] = None
+
+# Connection to a warm `app.py --serve` daemon; queries are forwarded to it when set
+DAEMON: Optional["DaemonClient"] = None
+
 def clear_screen():
     """Clear the terminal screen in a cross-platform way."""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    if os.name == 'nt':
+        os.system('cls')
+    else:
+        # An escape sequence instead of spawning `clear`
+        sys.stdout.write("\x1b[2J\x1b[3J\x1b[H")
+        sys.stdout.flush()
 
 def print_banner():
     """Print the application banner with version."""
@@ -79,30 +142,54 @@ def print_banner():
         print(f"Gemini AI Assistant v{VERSION}")
         print('=' * 50 + "\n")
 
+class Spinner:
+    """Non-blocking "Thinking" indicator drawn on stderr from a background thread."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "Spinner":
+        if self.enabled:
+            self._thread = threading.Thread(target=self._spin, daemon=True)
+            self._thread.start()
+        return self
+
+    def _spin(self):
+        cursor = spinning_cursor()
+        if HAS_COLORS:
+            sys.stderr.write(f"{UI_MUTED_COLOR}Thinking")
+        else:
+            sys.stderr.write("Thinking")
+        while not self._stop.is_set():
+            sys.stderr.write(f" {next(cursor)}")
+            sys.stderr.flush()
+            self._stop.wait(0.1)
+            sys.stderr.write("\b\b")
+        # Clear spinner
+        sys.stderr.write("\r" + " " * 20 + "\r" + (Style.RESET_ALL if HAS_COLORS else ""))
+        sys.stderr.flush()
+
+    def stop(self):
+        """Stop the animation and wipe it; safe to call more than once."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
 def spinning_cursor():
     """Generator for a spinning cursor animation."""
     while True:
         for cursor in '|/-\\':
             yield cursor
 
-def query_gemini(prompt: str, api_key: str) -> str:
-    """Query Google's Gemini API with the given prompt and API key."""
-    if not api_key:
-        return f"{UI_MUTED_COLOR}Error: No API key provided. Use --api-key or set GEMINI_API_KEY environment variable.{Style.RESET_ALL}"
-        
-    # Using Google's Gemini API
-    API_URL = "https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent"
-    
-    # Add API key as query parameter
-    url_with_key = f"{API_URL}?key={api_key}"
-    
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "contents": [
+def build_payload(prompt: str, history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Build the generateContent request body for a prompt and any earlier turns."""
+    return {
+        "contents": (history or []) + [
             {
+                "role": "user",
                 "parts": [
                     {
                         "text": prompt
@@ -110,71 +197,289 @@ def query_gemini(prompt: str, api_key: str) -> str:
                 ]
             }
         ],
-        "generationConfig": {
-            "temperature": 0.7,
-            "maxOutputTokens": 2000,
-            "topP": 0.95
-        }
+        "generationConfig": GENERATION_CONFIG
     }
 
-    try:
-        # For non-interactive mode, show a simple message instead of spinner animation
-        is_vscode_extension = os.environ.get("VSCODE_EXTENSION") == "true"
-        
-        if not is_vscode_extension:
-            # Show loading spinner
-            spinner = spinning_cursor()
-            if HAS_COLORS:
-                print(f"{UI_MUTED_COLOR}Thinking", end="", file=sys.stderr)
-            else:
-                print("Thinking", end="", file=sys.stderr)
-                
-            for _ in range(10):  # Show animation for a short time
-                sys.stderr.write(f" {next(spinner)}")
-                sys.stderr.flush()
-                time.sleep(0.1)
-                sys.stderr.write("\b\b")
-        
-        # Make the API request
-        response = requests.post(url_with_key, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        if not is_vscode_extension:
-            # Clear spinner
-            print("\r" + " " * 20 + "\r", end="", file=sys.stderr)
-        
-        data = response.json()
-        
+def request_payload(prompt: str, api_key: str, history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """build_payload, plus the project context: a reference to its server-side cache, or inline."""
+    if CACHED_CONTEXT is None:
+        return build_payload(prompt, history)
+    name = CACHED_CONTEXT.handle(get_client(), api_key)
+    if name is None:
+        return build_payload(f"{CACHED_CONTEXT.text}\n\nQuery: {prompt}", history)
+    payload = build_payload(f"Query: {prompt}", history)
+    payload["cachedContent"] = name
+    return payload
+
+def generate(payload: Dict[str, Any], api_key: str) -> Dict[str, Any]:
+    """Send a request to the best configured endpoint (key and model), failing over between them."""
+    if "cachedContent" in payload:
+        # A server-side cache belongs to the key and model that created it
+        return get_client().generate_content(payload, api_key, DEFAULT_MODEL)
+    from router import get_router
+    from hedging import get_hedger
+
+    router = get_router(api_key, DEFAULT_MODEL)
+    call = lambda: router.call(
+        lambda endpoint, retries: get_client().generate_content(payload, endpoint.key, endpoint.model, retries))
+    hedger = get_hedger()
+    return hedger.run(call) if hedger is not None else call()
+
+def generate_stream(payload: Dict[str, Any], api_key: str) -> Iterator[Dict[str, Any]]:
+    """The streaming counterpart of generate."""
+    if "cachedContent" in payload:
+        return get_client().stream_generate_content(payload, api_key, DEFAULT_MODEL)
+    from router import get_router
+    from hedging import get_hedger
+
+    router = get_router(api_key, DEFAULT_MODEL)
+    open_stream = lambda endpoint, retries: get_client().stream_generate_content(
+        payload, endpoint.key, endpoint.model, retries)
+    hedger = get_hedger()
+    if hedger is None:
+        return router.stream(open_stream)
+    # Hedge up to the first event; a stream that lost is closed, the winner is read on
+    events, head = hedger.run(lambda: router.start_stream(open_stream), discard=lambda started: started[0].close())
+
+    def resumed():
+        if head is not None:
+            yield head
+            yield from events
+    return resumed()
+
+def is_stale_context_cache(e: Exception, payload: Dict[str, Any]) -> bool:
+    """Whether a request failed because its cached context expired or was deleted on the server."""
+    import requests
+
+    return ("cachedContent" in payload and isinstance(e, requests.exceptions.HTTPError)
+            and e.response is not None and e.response.status_code in (403, 404))
+
+def format_error(error_msg: str) -> str:
+    """Style an error message the way query_gemini reports it."""
+    if HAS_COLORS and os.environ.get("VSCODE_EXTENSION") != "true":
+        return f"{UI_MUTED_COLOR}{error_msg}{Style.RESET_ALL}"
+    return error_msg
+
+def describe_request_error(e: Exception) -> str:
+    """Turn a requests exception into a user-facing message."""
+    error_msg = f"Network Error: {str(e)}"
+    if "invalid API key" in str(e).lower() or "unauthorized" in str(e).lower():
+        error_msg = "Invalid API key or authorization error. Please check your Gemini API key."
+    elif "timeout" in str(e).lower():
+        error_msg = "Request timed out. Please check your internet connection and try again."
+    return error_msg
+
+def _cache_material(prompt: str, history: Optional[List[Dict[str, Any]]]) -> str:
+    """What the cache key hashes: the prompt, the project context and earlier turns in a conversation."""
+    if CACHED_CONTEXT is not None:
+        prompt = f"{CACHED_CONTEXT.key}\n{prompt}"
+    if not history:
+        return prompt
+    return json.dumps(history + [{"role": "user", "parts": [{"text": prompt}]}], sort_keys=True)
+
+def answering_model() -> Optional[str]:
+    """The model that will answer a request, for the cache key; None if that is not known in advance.
+
+    An endpoints file that mixes models lets the router pick any of them, so no
+    cached answer can be attributed to one model.
+    """
+    from router import configured_router
+
+    router = configured_router()
+    if router is None:
+        return DEFAULT_MODEL
+    models = {endpoint.model for endpoint in router.endpoints}
+    if len(models) != 1:
+        return None
+    model = models.pop()
+    if CACHED_CONTEXT is not None and model != DEFAULT_MODEL:
+        # Requests that reference the cached context go to DEFAULT_MODEL instead of the router
+        return None
+    return model
+
+def lookup_cached_response(prompt: str, history: Optional[List[Dict[str, Any]]] = None) -> Optional[str]:
+    """Return a cached answer for this exact prompt and model settings, if any."""
+    model = answering_model()
+    if RESPONSE_CACHE is None or model is None:
+        return None
+    from response_cache import cache_key
+
+    return RESPONSE_CACHE.get(cache_key(model, GENERATION_CONFIG, _cache_material(prompt, history)))
+
+def store_cached_response(prompt: str, text: str, history: Optional[List[Dict[str, Any]]] = None) -> None:
+    """Remember a successful answer; errors are never cached."""
+    model = answering_model()
+    if RESPONSE_CACHE is not None and model is not None:
+        from response_cache import cache_key
+
+        RESPONSE_CACHE.put(cache_key(model, GENERATION_CONFIG, _cache_material(prompt, history)), text, model)
+
+def request_gemini(prompt: str, api_key: str, history: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Return the answer to a prompt, raising on network or response errors.
+
+    This is the UI-free core of query_gemini, used where failures must be told
+    apart from answers (e.g. batch mode). `history` holds earlier turns as
+    Gemini `contents`.
+    """
+    with traced("generate", prompt_chars=len(prompt)) as span:
+        cached = lookup_cached_response(prompt, history)
+        if span is not None and RESPONSE_CACHE is not None:
+            span["cache"] = "hit" if cached is not None else "miss"
+        if cached is not None:
+            return cached
+
+        # Using Google's Gemini API over the shared keep-alive client
+        payload = request_payload(prompt, api_key, history)
+        try:
+            data = generate(payload, api_key)
+        except Exception as e:
+            if not is_stale_context_cache(e, payload):
+                raise
+            CACHED_CONTEXT.invalidate(payload["cachedContent"])
+            data = generate(request_payload(prompt, api_key, history), api_key)
+
         # Parse Gemini response format
-        if "candidates" in data and len(data["candidates"]) > 0:
-            content = data["candidates"][0]["content"]
-            if "parts" in content and len(content["parts"]) > 0:
-                return content["parts"][0]["text"]
-        
-        # If the expected structure wasn't found, dump the full response
-        error_msg = f"Error parsing response from Gemini API. Raw response:\n{json.dumps(data, indent=2)}"
-        if HAS_COLORS and not is_vscode_extension:
-            return f"{UI_MUTED_COLOR}{error_msg}{Style.RESET_ALL}"
-        else:
-            return error_msg
-            
-    except requests.exceptions.RequestException as e:
-        error_msg = f"Network Error: {str(e)}"
-        if "invalid API key" in str(e).lower() or "unauthorized" in str(e).lower():
-            error_msg = "Invalid API key or authorization error. Please check your Gemini API key."
-        elif "timeout" in str(e).lower():
-            error_msg = "Request timed out. Please check your internet connection and try again."
-        
-        if HAS_COLORS and not is_vscode_extension:
-            return f"{UI_MUTED_COLOR}{error_msg}{Style.RESET_ALL}"
-        else:
-            return error_msg
+        text = extract_text(data)
+        if text is None:
+            # If the expected structure wasn't found, dump the full response
+            raise GeminiResponseError(f"Error parsing response from Gemini API. Raw response:\n{json.dumps(data, indent=2)}")
+        store_cached_response(prompt, text, history)
+        return text
+
+def stream_gemini(prompt: str, api_key: str, on_text: Callable[[str], None],
+                  history: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Stream the answer to a prompt through on_text, raising on network or response errors.
+
+    The streaming counterpart of request_gemini.
+    """
+    with traced("stream", prompt_chars=len(prompt)) as span:
+        cached = lookup_cached_response(prompt, history)
+        if span is not None and RESPONSE_CACHE is not None:
+            span["cache"] = "hit" if cached is not None else "miss"
+        if cached is not None:
+            on_text(cached)
+            return cached
+
+        parts = []
+
+        def receive(payload):
+            for chunk in generate_stream(payload, api_key):
+                text = extract_text(chunk)
+                if text:
+                    parts.append(text)
+                    on_text(text)
+
+        payload = request_payload(prompt, api_key, history)
+        try:
+            receive(payload)
+        except Exception as e:
+            # A stale cache is rejected before anything streams, so the retry repeats nothing
+            if parts or not is_stale_context_cache(e, payload):
+                raise
+            CACHED_CONTEXT.invalidate(payload["cachedContent"])
+            receive(request_payload(prompt, api_key, history))
+        if not parts:
+            raise GeminiResponseError("Error: Gemini API returned an empty stream.")
+        text = "".join(parts)
+        store_cached_response(prompt, text, history)
+        return text
+
+def describe_error(e: Exception) -> str:
+    """User-facing message for any failure of request_gemini or stream_gemini."""
+    import requests
+    from daemon import DaemonError
+
+    if isinstance(e, requests.exceptions.RequestException):
+        return describe_request_error(e)
+    if isinstance(e, (GeminiResponseError, DaemonError)):
+        return str(e)
+    return f"Error: {str(e)}"
+
+def forward_to_daemon(prompt: str, api_key: str, history: Optional[List[Dict[str, Any]]] = None,
+                      on_text: Optional[Callable[[str], None]] = None) -> Optional[str]:
+    """Run a query on the warm daemon, or return None if it cannot be reached.
+
+    Errors reported by the daemon are raised as DaemonError; an unreachable daemon
+    switches this process back to making requests itself. A daemon lost after part of
+    a streamed answer was delivered is an error too, not a reason to ask again here.
+    """
+    global DAEMON
+    if DAEMON is None or CACHED_CONTEXT is not None:
+        # The daemon does not know this run's cached project context
+        return None
+    params = {"prompt": prompt, "api_key": api_key, "history": history or [], "stream": on_text is not None}
+    delivered = []
+
+    def relay(text):
+        delivered.append(text)
+        on_text(text)
+
+    try:
+        return DAEMON.call("query", params, relay if on_text is not None else None)
+    except OSError as e:
+        DAEMON = None
+        if delivered:
+            from daemon import DaemonError
+
+            # Part of the answer is already shown; asking again would repeat (and bill) it
+            raise DaemonError(f"Lost the connection to the daemon part-way through the answer: {e}")
+        return None
+
+def _query(prompt: str, api_key: str, history: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, bool]:
+    """query_gemini's work, also reporting whether the answer is a real response."""
+    if not api_key:
+        return f"{UI_MUTED_COLOR}Error: No API key provided. Use --api-key or set GEMINI_API_KEY environment variable.{Style.RESET_ALL}", False
+
+    # For non-interactive mode, show a simple message instead of spinner animation
+    is_vscode_extension = os.environ.get("VSCODE_EXTENSION") == "true"
+    spinner = Spinner(enabled=not is_vscode_extension).start()
+    try:
+        # Make the API request while the spinner animates in the background
+        response = forward_to_daemon(prompt, api_key, history)
+        if response is None:
+            response = request_gemini(prompt, api_key, history)
+        return response, True
     except Exception as e:
-        error_msg = f"Error: {str(e)}"
-        if HAS_COLORS and not is_vscode_extension:
-            return f"{UI_MUTED_COLOR}{error_msg}{Style.RESET_ALL}"
-        else:
-            return error_msg
+        return format_error(describe_error(e)), False
+    finally:
+        spinner.stop()
+
+def query_gemini(prompt: str, api_key: str, history: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Query Google's Gemini API with the given prompt and API key."""
+    return _query(prompt, api_key, history)[0]
+
+def _query_stream(prompt: str, api_key: str, on_text: Callable[[str], None],
+                  history: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, bool]:
+    """query_gemini_stream's work, also reporting whether the answer is a real response."""
+    if not api_key:
+        return f"{UI_MUTED_COLOR}Error: No API key provided. Use --api-key or set GEMINI_API_KEY environment variable.{Style.RESET_ALL}", False
+
+    is_vscode_extension = os.environ.get("VSCODE_EXTENSION") == "true"
+    spinner = Spinner(enabled=not is_vscode_extension).start()
+
+    def on_chunk(text):
+        # The spinner only covers the wait for the first token
+        spinner.stop()
+        on_text(text)
+
+    try:
+        response = forward_to_daemon(prompt, api_key, history, on_chunk)
+        if response is None:
+            response = stream_gemini(prompt, api_key, on_chunk, history)
+        return response, True
+    except Exception as e:
+        return format_error(describe_error(e)), False
+    finally:
+        spinner.stop()
+
+def query_gemini_stream(prompt: str, api_key: str, on_text: Callable[[str], None],
+                        history: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Stream a Gemini answer, passing each text fragment to on_text as it arrives.
+
+    Returns the full response text, or a formatted error message (which is not passed
+    to on_text) if the request fails before or during streaming.
+    """
+    return _query_stream(prompt, api_key, on_text, history)[0]
 
 def get_api_key() -> Optional[str]:
     """Get API key from environment or prompt user."""
@@ -251,7 +556,16 @@ def print_help_interactive():
         ("clear", "Clear the screen"),
         ("help", "Show this help message"),
         ("!save", "Save the current API key for future use"),
-        ("!history", "View your conversation history")
+        ("!history", "View your conversation history"),
+        ("!reset", "Start a new conversation (forget earlier turns)"),
+        ("!sessions", "List saved sessions"),
+        ("!search <terms>", "Search all saved conversations"),
+        ("!resume <session>", "Continue a saved session"),
+        ("!stats", "Show connection and retry statistics"),
+        ("!bg <prompt>", "Ask in the background and keep typing"),
+        ("!jobs", "List background queries still running"),
+        ("!cancel <job>", "Cancel a background query"),
+        ("Ctrl-C", "Cancel the request in progress (at the prompt: exit)")
     ]
     
     if HAS_KEYBOARD:
@@ -261,12 +575,339 @@ def print_help_interactive():
     if HAS_COLORS:
         print(f"\n{UI_PRIMARY_COLOR}Commands{Style.RESET_ALL}")
         for cmd, desc in help_text:
-            print(f"  {UI_ACCENT_COLOR}{cmd:<15}{Style.RESET_ALL} {UI_MUTED_COLOR}{desc}{Style.RESET_ALL}")
+            print(f"  {UI_ACCENT_COLOR}{cmd:<18}{Style.RESET_ALL} {UI_MUTED_COLOR}{desc}{Style.RESET_ALL}")
     else:
         print("\nAvailable commands:")
         for cmd, desc in help_text:
-            print(f"  {cmd:<15} - {desc}")
+            print(f"  {cmd:<18} - {desc}")
+    print()
+
+def print_connection_stats():
+    """Print connection reuse, retry and throttling counters."""
+    stats = get_client().stats()
+    lines = [
+        ("Requests", stats["requests"]),
+        ("New connections", stats["new_connections"]),
+        ("Reused connections", stats["reused_connections"]),
+        ("Retries", stats["retries"]),
+        ("Throttled (429)", stats["throttled"]),
+        ("Rate limit wait", f"{stats['rate_limit_wait_s']}s"),
+    ]
+    if HAS_COLORS:
+        print(f"\n{UI_PRIMARY_COLOR}Connection stats{Style.RESET_ALL}")
+        for label, value in lines:
+            print(f"  {UI_ACCENT_COLOR}{label:<20}{Style.RESET_ALL} {UI_MUTED_COLOR}{value}{Style.RESET_ALL}")
+    else:
+        print("\nConnection stats:")
+        for label, value in lines:
+            print(f"  {label:<20} {value}")
+    print_endpoint_stats()
+    print_hedge_stats()
+    print()
+
+def print_hedge_stats():
+    """How often slow requests were hedged, and how often the duplicate answered first."""
+    from hedging import get_hedger
+
+    hedger = get_hedger()
+    if hedger is None:
+        return
+    stats = hedger.stats()
+    print_muted(f"  Hedged {stats['hedged']} of {stats['calls']} requests after {stats['delay_ms']:.0f} ms, "
+                f"duplicate won {stats['hedge_won']}, {stats['capped']} held back by the rate cap")
+
+def print_endpoint_stats():
+    """Per-endpoint health when requests are routed over an endpoints file."""
+    from router import configured_router
+
+    router = configured_router()
+    if router is None:
+        return
     print()
+    for stats in router.stats():
+        latency = f"{stats['latency_ms']:.0f} ms" if stats["latency_ms"] is not None else "untried"
+        line = (f"{stats['name']:<32} {stats['requests']} requests, {stats['errors']} errors "
+                f"({stats['throttled']} throttled), latency {latency}")
+        if stats["cooldown_s"]:
+            line += f", benched for {stats['cooldown_s']}s"
+        print_muted(f"  {line}")
+
+def print_trace_summary():
+    """Print latency percentiles and token throughput of the traced calls, if any."""
+    tracer = get_tracer()
+    if tracer is None or not tracer.summary()["calls"]:
+        return
+    for line in tracer.format_summary():
+        print_muted(line)
+    tracer.close()
+
+def print_muted(message: str):
+    """Print a status line in the muted UI color."""
+    if HAS_COLORS:
+        print(f"{UI_MUTED_COLOR}{message}{Style.RESET_ALL}")
+    else:
+        print(message)
+
+def retrieve_context(prompt: str, context_path: str, budget_chars: int,
+                     exclude_patterns: Optional[list] = None) -> Tuple[str, int, Dict[str, int]]:
+    """Relevant chunks of the repository at context_path, from the daemon's warm index if one is up."""
+    global DAEMON
+    if DAEMON is not None:
+        params = {"prompt": prompt, "path": os.path.abspath(context_path),
+                  "budget": budget_chars, "exclude": exclude_patterns or []}
+        try:
+            result = DAEMON.call("context", params)
+            return result["context"], result["chunks"], result["counts"]
+        except OSError:
+            DAEMON = None
+
+    from project_index import ProjectIndex, DEFAULT_EXCLUDE_PATTERNS
+    index = ProjectIndex(context_path, DEFAULT_EXCLUDE_PATTERNS + (exclude_patterns or []))
+    counts = index.refresh()
+    context, chunk_count = index.build_context(prompt, budget_chars)
+    return context, chunk_count, counts
+
+def attach_context_file(prompt: str, context_path: str, server_cache: bool = True) -> str:
+    """Include a context file whole: inline, or when large, through a server-side cache.
+
+    A cached file is uploaded once (per content and model, shared by every CLI run
+    until it expires) and later requests only reference it; the prompt is then
+    returned unchanged and request_payload adds the reference.
+    """
+    global CACHED_CONTEXT
+    from context_cache import CachedContext, DEFAULT_MIN_CHARS as CONTEXT_CACHE_MIN_CHARS
+
+    with open(context_path, "r", encoding="utf-8") as f:
+        context = f.read()
+    text = f"Project Context:\n{context}"
+    if server_cache and len(text) >= CONTEXT_CACHE_MIN_CHARS:
+        CACHED_CONTEXT = CachedContext(text, DEFAULT_MODEL)
+        print_muted(f"Using a server-side cache for project context from {context_path} ({len(context)} chars)")
+        return prompt
+    print_muted(f"Added project context from {context_path}")
+    return f"{text}\n\nQuery: {prompt}"
+
+def add_project_context(prompt: str, context_path: str, budget_chars: int = DEFAULT_CONTEXT_BUDGET,
+                        exclude_patterns: Optional[list] = None, server_cache: bool = True) -> str:
+    """Prefix the prompt with project context from a file or a repository root.
+
+    A file is included whole (see attach_context_file). For a directory, the
+    persistent project index is refreshed and only the chunks most relevant to the
+    prompt are packed in, up to budget_chars characters.
+    """
+    try:
+        if os.path.isdir(context_path):
+            context, chunk_count, counts = retrieve_context(prompt, context_path, budget_chars, exclude_patterns)
+            print_muted(f"Indexed {counts['files']} files under {context_path} "
+                        f"({counts['indexed']} re-indexed, {counts['removed']} removed)")
+            if not context:
+                print_muted("No project files matched the query; sending it without context")
+                return prompt
+            prompt = f"Project Context:\n{context}\n\nQuery: {prompt}"
+            print_muted(f"Added {chunk_count} relevant chunks ({len(context)} chars) from {context_path}")
+            return prompt
+        prompt = attach_context_file(prompt, context_path, server_cache)
+    except Exception as e:
+        print_muted(f"Error reading context file: {str(e)}")
+    return prompt
+
+def widen_client_pool(workers: int) -> None:
+    """Give each of `workers` concurrent requests its own keep-alive connection."""
+    client = get_client()
+    if workers > client.pool_size:
+        configure_client(**dict(client.settings(), pool_size=workers))
+
+def needs_map_reduce(path: str, chunk_chars: int, force: bool = False) -> bool:
+    """Whether a --file or --context file has to be read in chunks rather than sent whole."""
+    return os.path.isfile(path) and (force or os.path.getsize(path) > chunk_chars)
+
+def answer_large_file(path: str, question: str, api_key: str, workers: int,
+                      chunk_chars: Optional[int] = None, stream: bool = False, force: bool = False,
+                      add_context: Optional[Callable[[str], str]] = None) -> bool:
+    """Answer a question about a file of any size: map over its chunks, reduce the notes, print the answer.
+
+    `force` reads even a small file in chunks. `add_context` is applied to the final
+    prompt, e.g. to attach --context to the question rather than to every chunk.
+    """
+    from map_reduce import map_reduce_prompt, DEFAULT_CHUNK_CHARS
+
+    chunk_chars = chunk_chars or DEFAULT_CHUNK_CHARS
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    print_muted(f"Reading {path} ({size_mb:.1f} MB) in chunks of {chunk_chars} characters, {workers} at a time")
+    widen_client_pool(workers)
+    prompt = map_reduce_prompt(path, question, lambda text: request_gemini(text, api_key), workers, chunk_chars,
+                               force=force)
+    if prompt is None:
+        print_muted(f"Error: every request for {path} failed; see the messages above.")
+        return False
+    if add_context is not None:
+        prompt = add_context(prompt)
+    return print_ai_response(prompt, api_key, stream)[1]
+
+def watch_and_review(paths: List[str], prompt: str, api_key: str, stream: bool = False,
+                     exclude: Optional[List[str]] = None, max_chars: Optional[int] = None) -> None:
+    """Answer `prompt` about the watched files, then again after every edit, until Ctrl+C.
+
+    The files are sent once. After that each edit sends only the unified diff since the
+    last answered turn, with that turn and its answer as history, so an edit costs
+    tokens in proportion to its size. A failed turn is retried with the next edit's diff.
+    """
+    from file_watch import Snapshot, open_watcher, wait_for_change
+    from map_reduce import DEFAULT_CHUNK_CHARS
+
+    max_chars = max_chars or DEFAULT_CHUNK_CHARS
+
+    answered = Snapshot(paths, exclude).refresh()
+    if not answered.files:
+        print_muted(f"No readable text files in {', '.join(paths)}")
+        return
+    full = answered.render()
+    if len(full) > max_chars:
+        print_muted(f"The watched files are {len(full)} characters, more than one request ({max_chars}); "
+                    f"watch fewer files or raise --chunk-chars")
+        return
+    names = ", ".join(answered.files)
+    watcher = open_watcher(paths, exclude)
+    print_muted(f"Watching {names} ({watcher.kind}); Ctrl+C to stop")
+    try:
+        response, ok = print_ai_response(f"{prompt}\n\n{full}", api_key, stream)
+        # The turn sent with the next request: (user message, answer)
+        last_turn = (WATCH_FIRST_TURN.format(prompt=prompt, files=names), response) if ok else None
+        while True:
+            wait_for_change(watcher)
+            current = answered.refresh()
+            diff = answered.diff(current)
+            if not diff:
+                continue
+            full = current.render()
+            if last_turn is None or len(diff) >= len(full):
+                # Nothing to diff against, or a rewrite: start over from the full files
+                message, history = f"{prompt}\n\n{full}", None
+                sent = WATCH_FIRST_TURN.format(prompt=prompt, files=", ".join(current.files))
+            else:
+                message = sent = WATCH_CHANGE_PROMPT.format(diff=diff, prompt=prompt)
+                history = [{"role": "user", "parts": [{"text": last_turn[0]}]},
+                           {"role": "model", "parts": [{"text": last_turn[1]}]}]
+            diff_lines = diff.count("\n")
+            print_muted(f"\nChange detected: {diff_lines} diff lines, {len(message)} characters sent")
+            response, ok = print_ai_response(message, api_key, stream, history)
+            if ok:
+                answered, last_turn = current, (sent, response)
+    finally:
+        watcher.close()
+
+def print_cache_stats(cache: "ResponseCache"):
+    """Print size and hit rate of the on-disk response cache."""
+    stats = cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = f"{100.0 * stats['hits'] / lookups:.1f}%" if lookups else "n/a"
+    lines = [
+        ("Directory", stats["directory"]),
+        ("Entries", stats["entries"]),
+        ("Size", f"{stats['bytes'] / 1024:.1f} KiB of {stats['max_bytes'] / (1024 * 1024):.0f} MiB"),
+        ("TTL", f"{stats['ttl']:.0f}s" if stats["ttl"] else "none"),
+        ("Hits / misses", f"{stats['hits']} / {stats['misses']} ({hit_rate})"),
+    ]
+    if HAS_COLORS:
+        print(f"{UI_PRIMARY_COLOR}Response cache{Style.RESET_ALL}")
+        for label, value in lines:
+            print(f"  {UI_ACCENT_COLOR}{label:<15}{Style.RESET_ALL} {UI_MUTED_COLOR}{value}{Style.RESET_ALL}")
+    else:
+        print("Response cache:")
+        for label, value in lines:
+            print(f"  {label:<15} {value}")
+
+def print_ai_response(prompt: str, api_key: str, stream: bool = False,
+                      history: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, bool]:
+    """Query Gemini and print the answer, token by token when streaming.
+
+    Returns the response (or error message) and whether the query succeeded.
+    """
+    if not stream:
+        response, ok = _query(prompt, api_key, history)
+        if HAS_COLORS:
+            print(f"\n{UI_AI_COLOR}{UI_MESSAGE_PREFIX_AI}{response}{Style.RESET_ALL}")
+        else:
+            print(f"\n{response}")
+        return response, ok
+
+    shown = []
+
+    def on_text(text):
+        if not shown:
+            if HAS_COLORS:
+                print(f"\n{UI_AI_COLOR}{UI_MESSAGE_PREFIX_AI}", end="")
+            else:
+                print()
+        shown.append(text)
+        # colorama's autoreset ends every write, so each fragment carries its own color
+        if HAS_COLORS:
+            print(f"{UI_AI_COLOR}{text}", end="", flush=True)
+        else:
+            print(text, end="", flush=True)
+
+    response, ok = _query_stream(prompt, api_key, on_text, history)
+    if shown:
+        print()
+    if not ok:
+        # The request failed before or part-way through the stream
+        print(f"\n{response}")
+    return response, ok
+
+def conversation_history(conversation: "Conversation", lock: threading.Lock) -> List[Dict[str, Any]]:
+    """The conversation as history for the next request, summarizing old turns if they no longer fit.
+
+    Background answers are recorded under `lock`, so the summary is requested outside
+    it, behind the usual spinner; Ctrl+C cancels it like any other request.
+    """
+    with lock:
+        compaction = conversation.compaction()
+    if compaction is not None:
+        spinner = Spinner(enabled=os.environ.get("VSCODE_EXTENSION") != "true").start()
+        try:
+            summary = conversation.summarize(compaction[0]).strip()
+        except Exception:
+            # Without a summary the old turns are simply dropped from the context
+            summary = None
+        finally:
+            spinner.stop()
+        with lock:
+            conversation.fold(compaction, summary)
+    with lock:
+        return conversation.contents(compact=False)
+
+def job_answer(job: "Job") -> Tuple[str, bool]:
+    """A finished background query's response (or error message) and whether it succeeded."""
+    if job.error is not None:
+        return format_error(describe_error(job.error)), False
+    return job.response, True
+
+def job_title(job: "Job") -> str:
+    return job.prompt if len(job.prompt) <= 60 else job.prompt[:57] + "..."
+
+def print_job_result(job: "Job", idle: bool) -> None:
+    """Print a background query's answer; `idle` means it interrupts the prompt, which is redrawn after it."""
+    response, _ = job_answer(job)
+    print()
+    print_muted(f"[job {job.number}] {job_title(job)} ({job.elapsed():.1f}s)")
+    if HAS_COLORS:
+        print(f"{UI_AI_COLOR}{UI_MESSAGE_PREFIX_AI}{response}{Style.RESET_ALL}")
+    else:
+        print(response)
+    if idle:
+        if HAS_COLORS:
+            print(f"\n{UI_USER_COLOR}{UI_MESSAGE_PREFIX_USER}{Style.RESET_ALL}", end="", flush=True)
+        else:
+            print("\n> ", end="", flush=True)
+
+def print_jobs(jobs: "JobQueue") -> None:
+    """List the background queries that have not answered yet."""
+    pending = jobs.pending()
+    if not pending:
+        print_muted("No background queries running.")
+        return
+    for job in pending:
+        print_muted(f"  [job {job.number}] {job_title(job)} ({job.elapsed():.1f}s)")
 
 def format_response(response: str) -> str:
     """Format AI response with proper styling."""
@@ -274,45 +915,142 @@ def format_response(response: str) -> str:
         return f"{UI_AI_COLOR}{response}{Style.RESET_ALL}"
     return response
 
-def display_chat_history(history, scroll_offset=0):
-    """Display chat history with scrolling capability."""
-    clear_screen()
-    print_banner()
-    
-    if not history:
-        if HAS_COLORS:
-            print(f"{UI_MUTED_COLOR}No conversation history yet.{Style.RESET_ALL}")
-        else:
-            print("No conversation history yet.")
-        return
-    
-    total_messages = len(history)
-    start_idx = max(0, min(total_messages - MAX_DISPLAY_MESSAGES, scroll_offset))
-    end_idx = min(total_messages, start_idx + MAX_DISPLAY_MESSAGES)
-    
+def open_history_view(store: "SessionStore", session_id: int) -> "HistoryView":
+    """Show the scrollable history view for a session."""
+    from history_view import HistoryView
+
+    view = HistoryView(store, session_id,
+                       user_prefix=UI_MESSAGE_PREFIX_USER, ai_prefix=UI_MESSAGE_PREFIX_AI,
+                       user_color=UI_USER_COLOR, ai_color=UI_AI_COLOR, muted_color=UI_MUTED_COLOR,
+                       use_scroll_region=os.name != 'nt')
+    view.open()
+    return view
+
+def print_history_message(q: str, a: str):
+    """Print one prompt/response pair of the conversation history."""
     if HAS_COLORS:
-        print(f"{UI_PRIMARY_COLOR}Conversation{Style.RESET_ALL} {UI_MUTED_COLOR}({start_idx+1}-{end_idx} of {total_messages}){Style.RESET_ALL}")
-        print(f"{UI_MUTED_COLOR}Use arrow keys to scroll{Style.RESET_ALL}")
+        print(f"{UI_USER_COLOR}{UI_MESSAGE_PREFIX_USER}{q}{Style.RESET_ALL}")
+        print(f"{UI_AI_COLOR}{UI_MESSAGE_PREFIX_AI}{a}{Style.RESET_ALL}")
+        print(f"{UI_MUTED_COLOR}{UI_SEPARATOR * 50}{Style.RESET_ALL}")
     else:
-        print(f"Conversation ({start_idx+1}-{end_idx} of {total_messages}):")
-        print("Use arrow keys to scroll")
-    
+        print(f"You: {q}")
+        print(f"AI: {a}")
+        print("-" * 50)
+
+def print_full_history(store: "SessionStore", session_id: int, page_size: int = 50):
+    """Print a whole session without the keyboard package, one database page at a time."""
+    if HAS_COLORS:
+        print(f"\n{UI_PRIMARY_COLOR}Conversation{Style.RESET_ALL}")
+    else:
+        print("\nConversation History:")
     print(f"{UI_SECONDARY_COLOR}{UI_SEPARATOR * 50}{Style.RESET_ALL}")
-    
-    for i, (q, a) in enumerate(history[start_idx:end_idx], start_idx + 1):
+    offset = 0
+    while True:
+        rows = store.page(session_id, offset, page_size)
+        for q, a in rows:
+            print_history_message(q, a)
+        if len(rows) < page_size:
+            break
+        offset += page_size
+
+def print_search_results(store: "SessionStore", terms: str):
+    """Print full-text search hits across all saved sessions."""
+    results = store.search(terms)
+    if not results:
+        print_muted(f"No messages match '{terms}'.")
+        return
+    for hit in results:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(hit["created"]))
+        snippet = " ".join(hit["snippet"].split())
         if HAS_COLORS:
-            print(f"{UI_USER_COLOR}{UI_MESSAGE_PREFIX_USER}{q}{Style.RESET_ALL}")
-            print(f"{UI_AI_COLOR}{UI_MESSAGE_PREFIX_AI}{a}{Style.RESET_ALL}")
-            print(f"{UI_MUTED_COLOR}{UI_SEPARATOR * 50}{Style.RESET_ALL}")
+            print(f"  {UI_ACCENT_COLOR}#{hit['session_id']:<6}{Style.RESET_ALL} {UI_MUTED_COLOR}{when}{Style.RESET_ALL}  {snippet}")
         else:
-            print(f"You: {q}")
-            print(f"AI: {a}")
-            print("-" * 50)
-    
-    if start_idx > 0:
-        print(f"{UI_MUTED_COLOR}↑ More messages above ↑{Style.RESET_ALL}")
-    if end_idx < total_messages:
-        print(f"{UI_MUTED_COLOR}↓ More messages below ↓{Style.RESET_ALL}")
+            print(f"  #{hit['session_id']:<6} {when}  {snippet}")
+    print_muted("Use !resume <session> to continue one of these conversations.")
+
+def print_sessions(store: "SessionStore"):
+    """Print the most recent saved sessions."""
+    sessions = store.sessions()
+    if not sessions:
+        print_muted("No saved sessions yet.")
+        return
+    for session in sessions:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(session["started"]))
+        first = " ".join(session["first_prompt"].split())[:60]
+        if HAS_COLORS:
+            print(f"  {UI_ACCENT_COLOR}#{session['id']:<6}{Style.RESET_ALL} {UI_MUTED_COLOR}{when}  {session['messages']:>4} msgs{Style.RESET_ALL}  {first}")
+        else:
+            print(f"  #{session['id']:<6} {when}  {session['messages']:>4} msgs  {first}")
+
+def serve_daemon(api_key: str, path: Optional[str] = None) -> None:
+    """Keep this process warm and answer queries from thin clients over a Unix socket.
+
+    The daemon owns the connection pool, the response cache and one loaded project
+    index per repository, so each `app.py` invocation only pays for starting Python.
+    """
+    from daemon import DaemonError, SOCKET_PATH
+    from daemon_server import DaemonServer
+    from project_index import ProjectIndex, DEFAULT_EXCLUDE_PATTERNS
+    from router import configured_router
+    from hedging import get_hedger
+
+    path = path or SOCKET_PATH
+    indexes: Dict[Tuple[str, Tuple[str, ...]], Any] = {}
+    index_lock = threading.Lock()
+
+    def query(params, emit):
+        prompt, history = params["prompt"], params.get("history") or None
+        key = params.get("api_key") or api_key
+        try:
+            if params.get("stream"):
+                return stream_gemini(prompt, key, emit, history)
+            return request_gemini(prompt, key, history)
+        except Exception as e:
+            raise DaemonError(describe_error(e))
+
+    def context(params, emit):
+        exclude = tuple(params.get("exclude") or ())
+        root = params["path"]
+        # ProjectIndex is not thread-safe, and refreshing one is I/O bound anyway
+        with index_lock:
+            index = indexes.get((root, exclude))
+            if index is None:
+                index = indexes[(root, exclude)] = ProjectIndex(root, DEFAULT_EXCLUDE_PATTERNS + list(exclude))
+            counts = index.refresh()
+            text, chunk_count = index.build_context(params["prompt"], params.get("budget", DEFAULT_CONTEXT_BUDGET))
+        return {"context": text, "chunks": chunk_count, "counts": counts}
+
+    def stats(params, emit):
+        router = configured_router()
+        return {"client": get_client().stats(),
+                "cache": RESPONSE_CACHE.stats() if RESPONSE_CACHE is not None else None,
+                "endpoints": router.stats() if router is not None else None,
+                "hedging": get_hedger().stats() if get_hedger() is not None else None}
+
+    server = DaemonServer({"query": query, "context": context, "stats": stats}, path)
+    print_muted(f"Serving on {path} (pid {os.getpid()}); stop with --stop-daemon or Ctrl+C")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        get_client().close()
+
+def connect_daemon(path: Optional[str] = None) -> Optional["DaemonClient"]:
+    """A client for a daemon already listening on path, or None to run requests in-process."""
+    from daemon import DaemonClient, DaemonError, SOCKET_PATH, supported as daemon_supported
+
+    path = path or SOCKET_PATH
+    if not os.path.exists(path) or not daemon_supported():
+        return None
+    client = DaemonClient(path)
+    try:
+        client.call("ping")
+    except (OSError, ValueError, DaemonError):
+        client.close()
+        return None
+    return client
 
 def main():
     """Main function to handle CLI arguments and run the query."""
@@ -321,14 +1059,60 @@ def main():
     parser.add_argument("--api-key", "-k", help="Google Gemini API key")
     parser.add_argument("--interactive", "-i", action="store_true", help="Run in interactive mode")
     parser.add_argument("--file", "-f", help="Read prompt from a file")
-    parser.add_argument("--context", "-c", help="Additional context file (for project context)")
+    parser.add_argument("--context", "-c", help="Additional context file, or a project root to retrieve relevant code from")
+    parser.add_argument("--exclude", action="append", default=[], help="Extra file or directory pattern to skip when indexing a --context directory (repeatable)")
+    parser.add_argument("--context-budget", type=int, default=DEFAULT_CONTEXT_BUDGET, help="Maximum characters of retrieved context when --context is a directory")
     parser.add_argument("--version", "-v", action="store_true", help="Show version information")
     parser.add_argument("--install-deps", action="store_true", help="Install required dependencies")
+    parser.add_argument("--connect-timeout", type=float, help="Seconds to wait for a connection to the API")
+    parser.add_argument("--read-timeout", type=float, help="Seconds to wait for the API to respond")
+    parser.add_argument("--pool-size", type=int, help="Maximum number of pooled keep-alive connections")
+    parser.add_argument("--rpm", type=float, help="Client-side limit on requests per minute, shared by all CLI processes")
+    parser.add_argument("--tpm", type=float, help="Client-side limit on input tokens per minute, shared by all CLI processes")
+    parser.add_argument("--history-budget", type=int, help="Tokens of earlier conversation sent with each interactive turn")
+    parser.add_argument("--stream", "-s", action="store_true", help="Print the response as it is generated")
+    parser.add_argument("--no-cache", action="store_true", help="Always query the API instead of reusing cached responses")
+    parser.add_argument("--cache-ttl", type=float, help="Expire cached responses older than this many seconds")
+    parser.add_argument("--cache", action="store_true", help="Reuse cached responses in interactive mode too (off there by default, since answers are sampled)")
+    parser.add_argument("--cache-stats", action="store_true", help="Show response cache statistics")
+    parser.add_argument("--batch", "-b", help="Process a JSONL file of prompts (one {\"id\", \"prompt\"} object per line)")
+    parser.add_argument("--out", "-o", help="Where --batch writes its JSONL results (default: <batch>.results.jsonl)")
+    parser.add_argument("--workers", "-w", type=int, help="Concurrent requests in --batch and map-reduce mode")
+    parser.add_argument("--serve", action="store_true", help="Run a warm background daemon that other invocations forward requests to")
+    parser.add_argument("--stop-daemon", action="store_true", help="Stop a running --serve daemon")
+    parser.add_argument("--no-daemon", action="store_true", help="Run requests in this process even if a daemon is running")
+    parser.add_argument("--no-context-cache", action="store_true", help="Send a large --context file with every request instead of caching it on the server")
+    parser.add_argument("--map-reduce", action="store_true", help="Read --file or --context in chunks and combine the partial answers (automatic for files larger than --chunk-chars)")
+    parser.add_argument("--chunk-chars", type=int, help="Characters of input per request in map-reduce mode")
+    parser.add_argument("--trace", nargs="?", const=DEFAULT_TRACE_PATH, metavar="PATH", help=f"Record per-request timings and token counts as JSONL (default: {DEFAULT_TRACE_PATH}) and print a summary at the end")
+    parser.add_argument("--watch", action="append", metavar="PATH", help="Watch a file or directory (repeatable) and ask again about each edit, sending only the diff")
+    parser.add_argument("--hedge", action="store_true", default=os.environ.get("GEMINI_HEDGE") == "1", help="Send a duplicate of a request that is slower than usual and take whichever answers first (or set GEMINI_HEDGE=1)")
     
     args = parser.parse_args()
     
+    if args.trace:
+        # Before the client is created, so its connections are timed too
+        enable_tracing(args.trace)
+        import atexit
+        atexit.register(print_trace_summary)
+    if args.hedge:
+        # Also before the client, which then lets a hedged attempt that lost be aborted
+        from hedging import enable_hedging
+        enable_hedging()
+    
+    if args.connect_timeout or args.read_timeout or args.pool_size or args.rpm or args.tpm:
+        limiter = None
+        if args.rpm or args.tpm:
+            from rate_limiter import RateLimiter
+            limiter = RateLimiter(args.rpm or 0, args.tpm or 0)
+        configure_client(connect_timeout=args.connect_timeout,
+                         read_timeout=args.read_timeout,
+                         pool_size=args.pool_size,
+                         limiter=limiter)
+    
     # Show version and exit
     if args.version:
+        import platform
         if HAS_COLORS:
             print(f"{UI_PRIMARY_COLOR}Gemini AI Assistant{Style.RESET_ALL} {UI_MUTED_COLOR}v{VERSION}{Style.RESET_ALL}")
             print(f"{UI_MUTED_COLOR}Running on Python {platform.python_version()}{Style.RESET_ALL}")
@@ -339,6 +1123,42 @@ def main():
             print(f"Platform: {platform.platform()}")
         return
     
+    # Defaults kept in modules that are only imported past this point
+    from batch import run_batch, DEFAULT_WORKERS
+    from conversation import Conversation, DEFAULT_HISTORY_BUDGET
+    from map_reduce import DEFAULT_CHUNK_CHARS
+    if args.workers is None:
+        args.workers = DEFAULT_WORKERS
+    if args.history_budget is None:
+        args.history_budget = DEFAULT_HISTORY_BUDGET
+    if args.chunk_chars is None:
+        args.chunk_chars = DEFAULT_CHUNK_CHARS
+    
+    global RESPONSE_CACHE
+    # A sampled answer repeated from the cache in a conversation would go unnoticed; there it is opt-in
+    sampled_chat = args.interactive and GENERATION_CONFIG["temperature"] > 0 and not args.cache
+    if (not args.no_cache and not sampled_chat) or args.cache_stats:
+        from response_cache import ResponseCache
+        RESPONSE_CACHE = ResponseCache(ttl=args.cache_ttl) if args.cache_ttl else ResponseCache()
+    if args.cache_stats:
+        print_cache_stats(RESPONSE_CACHE)
+        return
+    
+    from daemon import SOCKET_PATH, supported as daemon_supported
+    from router import configured_router, RouterConfigError
+    if args.stop_daemon:
+        if not daemon_supported():
+            print_muted("Daemon mode needs Unix domain sockets, which this platform does not provide")
+            sys.exit(1)
+        client = connect_daemon()
+        if client is None:
+            print_muted(f"No daemon is running on {SOCKET_PATH}")
+            return
+        client.call("shutdown")
+        client.close()
+        print_muted("Daemon stopped")
+        return
+    
     # Install dependencies
     if args.install_deps:
         try:
@@ -351,8 +1171,18 @@ def main():
             print(f"Failed to install dependencies: {str(e)}")
             return
     
+    # An endpoints file spreads requests over several keys and models
+    try:
+        router = configured_router()
+    except RouterConfigError as e:
+        print_muted(f"Error: {str(e)}")
+        sys.exit(1)
+    
     # Get API key from arguments, environment, config file, or user input
     api_key = args.api_key or os.environ.get("GEMINI_API_KEY") or load_api_key()
+    if not api_key and router is not None:
+        # Still needed for requests tied to one key, such as server-side context caches
+        api_key = router.endpoints[0].key
     if not api_key:
         try:
             if HAS_COLORS:
@@ -379,8 +1209,69 @@ def main():
                 print("python app.py -i --api-key YOUR_API_KEY")
             sys.exit(1)
     
+    if args.serve:
+        if not daemon_supported():
+            print_muted("Daemon mode needs Unix domain sockets, which this platform does not provide")
+            sys.exit(1)
+        try:
+            serve_daemon(api_key)
+        except OSError as e:
+            print_muted(f"Could not start the daemon: {str(e)}")
+            sys.exit(1)
+        return
+    
+    # Forward to a warm daemon when one is running; batch mode keeps its own worker pool,
+    # and traced runs make their requests here so there is something to measure. The
+    # daemon uses its own cache, rate limits, client, endpoints and hedging, so a run that
+    # sets any of those makes its requests here too rather than have them silently ignored
+    global DAEMON
+    own_settings = (RESPONSE_CACHE is None or args.cache_ttl or args.rpm or args.tpm or args.connect_timeout
+                    or args.read_timeout or args.pool_size or router is not None or args.hedge)
+    if not args.no_daemon and not args.batch and not args.trace and not own_settings:
+        DAEMON = connect_daemon()
+    
+    # Batch mode
+    if args.batch:
+        out_path = args.out or f"{os.path.splitext(args.batch)[0]}.results.jsonl"
+        widen_client_pool(args.workers)
+        # Every prompt shares one context file, which makes it worth caching on the server
+        context_prefix = ""
+        if args.context:
+            if not os.path.isfile(args.context):
+                print_muted("--context with --batch must be a file")
+                sys.exit(1)
+            if needs_map_reduce(args.context, args.chunk_chars):
+                print_muted(f"{args.context} is too large to send with every prompt; "
+                            f"ask about it with: python app.py -c {args.context} \"<question>\"")
+                sys.exit(1)
+            context_prefix = attach_context_file("", args.context, not args.no_context_cache)
+        if HAS_COLORS:
+            print(f"{UI_MUTED_COLOR}Running batch {args.batch} -> {out_path} with {args.workers} workers{Style.RESET_ALL}")
+        else:
+            print(f"Running batch {args.batch} -> {out_path} with {args.workers} workers")
+        try:
+            summary = run_batch(args.batch, out_path, lambda prompt: request_gemini(context_prefix + prompt, api_key),
+                                workers=args.workers)
+        except KeyboardInterrupt:
+            print("\nBatch interrupted; rerun the same command to resume.")
+            sys.exit(130)
+        except OSError as e:
+            print(f"Error reading batch file: {str(e)}")
+            sys.exit(1)
+        message = (f"Done: {summary['ok']} ok, {summary['error']} failed, "
+                   f"{summary['skipped']} already complete, in {summary['elapsed_s']}s")
+        if HAS_COLORS:
+            print(f"{UI_ACCENT_COLOR}{message}{Style.RESET_ALL}")
+        else:
+            print(message)
+        print_endpoint_stats()
+        print_hedge_stats()
+        if summary["error"]:
+            sys.exit(1)
+    
     # Interactive mode
-    if args.interactive:
+    elif args.interactive:
+        load_keyboard()
         print_banner()
         if HAS_COLORS:
             print(f"{UI_PRIMARY_COLOR}Gemini AI Assistant{Style.RESET_ALL} {UI_MUTED_COLOR}v{VERSION}{Style.RESET_ALL}")
@@ -389,31 +1280,49 @@ def main():
             print("Gemini AI Assistant - Interactive Mode")
             print("Type 'help' to see available commands")
         
-        history = []
+        from session_store import SessionStore
+        from jobs import JobQueue
+        store = SessionStore()
+        session_id = store.new_session()
+        conversation = Conversation(lambda text: request_gemini(text, api_key),
+                                    budget_tokens=args.history_budget)
         viewing_history = False
-        scroll_offset = 0
+        history_view = None
+        # Background queries write to the session and conversation from their own threads
+        history_lock = threading.Lock()
+        # Bumped by !reset and !resume, so a late answer does not join a conversation it was not asked in
+        conversation_number = 0
+        
+        def record_job(job):
+            response, ok = job_answer(job)
+            asked_in_session, asked_in_conversation = job.context
+            with history_lock:
+                store.add_message(asked_in_session, job.prompt, response, ok)
+                if ok and asked_in_conversation == conversation_number:
+                    conversation.add_turn(job.prompt, response)
+        
+        # In-process rather than through the daemon, whose single connection would serialize them
+        jobs = JobQueue(lambda job: request_gemini(job.prompt, api_key, job.history),
+                        record_job, print_job_result)
         
         while True:
             try:
                 if viewing_history and HAS_KEYBOARD:
-                    # Display chat history with scrolling
-                    display_chat_history(history, scroll_offset)
-                    
-                    # Listen for key presses to handle scrolling
+                    # Listen for key presses to handle scrolling; the view redraws only what changed
                     key_event = keyboard.read_event(suppress=True)
                     if key_event.event_type == keyboard.KEY_DOWN:
                         if key_event.name == 'esc':
                             viewing_history = False
-                            clear_screen()
+                            history_view.close()
                             print_banner()
                         elif key_event.name == 'up':
-                            scroll_offset = max(0, scroll_offset - 1)
+                            history_view.scroll(-1)
                         elif key_event.name == 'down':
-                            scroll_offset = min(len(history) - 1, scroll_offset + 1)
+                            history_view.scroll(1)
                         elif key_event.name == 'page up':
-                            scroll_offset = max(0, scroll_offset - MAX_DISPLAY_MESSAGES)
+                            history_view.page(-1)
                         elif key_event.name == 'page down':
-                            scroll_offset = min(len(history) - 1, scroll_offset + MAX_DISPLAY_MESSAGES)
+                            history_view.page(1)
                     continue
                 
                 if HAS_COLORS:
@@ -422,6 +1331,7 @@ def main():
                     prompt = input("\n> ")
                     
                 if prompt.lower() in ["exit", "quit"]:
+                    jobs.cancel_all()
                     if HAS_COLORS:
                         print(f"{UI_MUTED_COLOR}Goodbye!{Style.RESET_ALL}")
                     else:
@@ -429,7 +1339,6 @@ def main():
                     break
                     
                 elif prompt.lower() == "clear":
-                    clear_screen()
                     print_banner()
                     continue
                     
@@ -441,8 +1350,19 @@ def main():
                     save_api_key(api_key)
                     continue
                     
+                elif prompt.lower() == "!reset":
+                    with history_lock:
+                        conversation.reset()
+                        conversation_number += 1
+                    print_muted("Started a new conversation; earlier turns will not be sent to the model.")
+                    continue
+                    
+                elif prompt.lower() == "!stats":
+                    print_connection_stats()
+                    continue
+                    
                 elif prompt.lower() == "!history":
-                    if not history:
+                    if not store.count(session_id):
                         if HAS_COLORS:
                             print(f"{UI_MUTED_COLOR}No conversation history yet.{Style.RESET_ALL}")
                         else:
@@ -451,43 +1371,94 @@ def main():
                     
                     if HAS_KEYBOARD:
                         viewing_history = True
-                        scroll_offset = 0
+                        history_view = open_history_view(store, session_id)
                     else:
                         # Show history without scrolling for systems without keyboard package
-                        if HAS_COLORS:
-                            print(f"\n{UI_PRIMARY_COLOR}Conversation{Style.RESET_ALL}")
-                        else:
-                            print("\nConversation History:")
-                        print(f"{UI_SECONDARY_COLOR}{UI_SEPARATOR * 50}{Style.RESET_ALL}")
-                        for i, (q, a) in enumerate(history):
-                            if HAS_COLORS:
-                                print(f"{UI_USER_COLOR}{UI_MESSAGE_PREFIX_USER}{q}{Style.RESET_ALL}")
-                                print(f"{UI_AI_COLOR}{UI_MESSAGE_PREFIX_AI}{a}{Style.RESET_ALL}")
-                                print(f"{UI_MUTED_COLOR}{UI_SEPARATOR * 50}{Style.RESET_ALL}")
-                            else:
-                                print(f"\nYou: {q}")
-                                print(f"AI: {a}")
-                                print("-" * 50)
+                        print_full_history(store, session_id)
+                    continue
+                    
+                elif prompt.lower() == "!sessions":
+                    print_sessions(store)
+                    continue
+                    
+                elif prompt.lower().startswith("!search"):
+                    terms = prompt[len("!search"):].strip()
+                    if not terms:
+                        print_muted("Usage: !search <terms>")
+                    else:
+                        print_search_results(store, terms)
+                    continue
+                    
+                elif prompt.lower().startswith("!resume"):
+                    target = prompt[len("!resume"):].strip().lstrip("#")
+                    if not target.isdigit() or not store.session_exists(int(target)):
+                        print_muted("Usage: !resume <session> (see !sessions or !search)")
+                        continue
+                    with history_lock:
+                        session_id = int(target)
+                        # Load just enough recent turns; older ones are summarized on the next query
+                        conversation = Conversation(lambda text: request_gemini(text, api_key),
+                                                    budget_tokens=args.history_budget,
+                                                    turns=store.tail(session_id, RESUME_TURNS))
+                        conversation_number += 1
+                    print_muted(f"Resumed session #{session_id} ({store.count(session_id)} messages).")
+                    continue
+                    
+                elif prompt.lower().startswith("!bg"):
+                    question = prompt[len("!bg"):].strip()
+                    if not question:
+                        print_muted("Usage: !bg <prompt>")
+                        continue
+                    try:
+                        history = conversation_history(conversation, history_lock)
+                    except KeyboardInterrupt:
+                        print()
+                        print_muted("Cancelled.")
+                        continue
+                    job = jobs.submit(question, history, (session_id, conversation_number))
+                    print_muted(f"[job {job.number}] started; the answer is printed when it arrives.")
+                    continue
+                    
+                elif prompt.lower() == "!jobs":
+                    print_jobs(jobs)
+                    continue
+                    
+                elif prompt.lower().startswith("!cancel"):
+                    target = prompt[len("!cancel"):].strip().lstrip("#")
+                    job = jobs.cancel(int(target)) if target.isdigit() else None
+                    if job is None:
+                        print_muted("Usage: !cancel <job> (see !jobs)")
+                    else:
+                        print_muted(f"[job {job.number}] cancelled.")
                     continue
                     
                 elif not prompt:
                     continue
                 
-                response = query_gemini(prompt, api_key)
-                if HAS_COLORS:
-                    print(f"\n{UI_AI_COLOR}{UI_MESSAGE_PREFIX_AI}{response}{Style.RESET_ALL}")
-                else:
-                    print(f"\n{response}")
+                try:
+                    # Background answers arriving meanwhile wait until this one has been printed
+                    with jobs.holding():
+                        history = conversation_history(conversation, history_lock)
+                        response, ok = print_ai_response(prompt, api_key, args.stream, history)
+                except KeyboardInterrupt:
+                    # Only this request stops; background queries keep running
+                    print()
+                    print_muted("Cancelled.")
+                    continue
                 
-                # Save to history
-                history.append((prompt, response))
+                # Save to history; failed turns are shown but not sent back to the model
+                with history_lock:
+                    store.add_message(session_id, prompt, response, ok)
+                    if ok:
+                        conversation.add_turn(prompt, response)
                 
             except KeyboardInterrupt:
                 if viewing_history:
                     viewing_history = False
-                    clear_screen()
+                    history_view.close()
                     print_banner()
                     continue
+                jobs.cancel_all()
                 if HAS_COLORS:
                     print(f"\n{UI_MUTED_COLOR}Goodbye!{Style.RESET_ALL}")
                 else:
@@ -500,6 +1471,32 @@ def main():
                 else:
                     print(f"\nError: {str(e)}")
     
+    # Re-query on every edit of the watched files
+    elif args.watch:
+        prompt = args.prompt or DEFAULT_WATCH_PROMPT
+        if args.file:
+            with open(args.file, "r", encoding="utf-8") as f:
+                prompt = f.read()
+        try:
+            watch_and_review(args.watch, prompt, api_key, args.stream, args.exclude, args.chunk_chars)
+        except KeyboardInterrupt:
+            print_muted("\nStopped watching.")
+    
+    # A file too large for one request: map-reduce over it
+    elif args.file and needs_map_reduce(args.file, args.chunk_chars, args.map_reduce):
+        add_context = None
+        if args.context:
+            # --context goes with the final question, not with every chunk
+            add_context = lambda prompt: add_project_context(prompt, args.context, args.context_budget, args.exclude,
+                                                             server_cache=not args.no_context_cache)
+        if not answer_large_file(args.file, args.prompt or DEFAULT_LARGE_FILE_QUESTION, api_key,
+                                 args.workers, args.chunk_chars, args.stream, args.map_reduce, add_context):
+            sys.exit(1)
+    elif args.prompt and args.context and needs_map_reduce(args.context, args.chunk_chars, args.map_reduce):
+        if not answer_large_file(args.context, args.prompt, api_key, args.workers, args.chunk_chars, args.stream,
+                                 args.map_reduce):
+            sys.exit(1)
+    
     # File input
     elif args.file:
         try:
@@ -512,25 +1509,10 @@ def main():
             
             # Add context from context file if provided
             if args.context:
-                try:
-                    with open(args.context, "r", encoding="utf-8") as f:
-                        context = f.read()
-                    prompt = f"Project Context:\n{context}\n\nQuery: {prompt}"
-                    if HAS_COLORS:
-                        print(f"{UI_MUTED_COLOR}Added project context from {args.context}{Style.RESET_ALL}")
-                    else:
-                        print(f"Added project context from {args.context}")
-                except Exception as e:
-                    if HAS_COLORS:
-                        print(f"{UI_MUTED_COLOR}Error reading context file: {str(e)}{Style.RESET_ALL}")
-                    else:
-                        print(f"Error reading context file: {str(e)}")
+                prompt = add_project_context(prompt, args.context, args.context_budget, args.exclude,
+                                             server_cache=not args.no_context_cache)
             
-            response = query_gemini(prompt, api_key)
-            if HAS_COLORS:
-                print(f"\n{UI_AI_COLOR}{UI_MESSAGE_PREFIX_AI}{response}{Style.RESET_ALL}")
-            else:
-                print(f"\n{response}")
+            print_ai_response(prompt, api_key, args.stream)
         except Exception as e:
             if HAS_COLORS:
                 print(f"{UI_MUTED_COLOR}Error reading file: {str(e)}{Style.RESET_ALL}")
@@ -544,26 +1526,11 @@ def main():
         
         # Add context from file if provided
         if args.context:
-            try:
-                with open(args.context, "r", encoding="utf-8") as f:
-                    context = f.read()
-                prompt = f"Project Context:\n{context}\n\nQuery: {prompt}"
-                if HAS_COLORS:
-                    print(f"{UI_MUTED_COLOR}Added project context from {args.context}{Style.RESET_ALL}")
-                else:
-                    print(f"Added project context from {args.context}")
-            except Exception as e:
-                if HAS_COLORS:
-                    print(f"{UI_MUTED_COLOR}Error reading context file: {str(e)}{Style.RESET_ALL}")
-                else:
-                    print(f"Error reading context file: {str(e)}")
+            prompt = add_project_context(prompt, args.context, args.context_budget, args.exclude,
+                                         server_cache=not args.no_context_cache)
         
         while attempts < max_attempts:
-            response = query_gemini(prompt, api_key)
-            if HAS_COLORS:
-                print(f"\n{UI_AI_COLOR}{UI_MESSAGE_PREFIX_AI}{response}{Style.RESET_ALL}")
-            else:
-                print(f"\n{response}")
+            print_ai_response(prompt, api_key, args.stream)
 
             if HAS_COLORS:
                 feedback = input(f"{UI_MUTED_COLOR}Was this response helpful? (yes/no): {Style.RESET_ALL}").strip().lower()
@@ -0,0 +1,153 @@
+# batch.py
+import os
+import sys
+import json
+import time
+from collections import deque
+from typing import Callable, Dict, Any, Iterator, List, Set
+
+DEFAULT_WORKERS = 4
+
+
+def record_prompt(record: Dict[str, Any]) -> str:
+    """Pick the prompt text out of a batch record.
+
+    Accepts {"prompt": ...}, or {"title": ..., "body": ...} records such as the
+    backlog format used by requests.jsonl.
+    """
+    if record.get("prompt"):
+        return str(record["prompt"])
+    parts = [str(record[field]) for field in ("title", "body") if record.get(field)]
+    return "\n\n".join(parts)
+
+
+def load_batch(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield one item per non-blank input line: its id, its prompt, or a parse error."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = {"id": f"line-{line_no}", "prompt": "", "error": None}
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                item["error"] = f"Invalid JSON: {e}"
+                yield item
+                continue
+            if not isinstance(record, dict):
+                item["error"] = "Expected a JSON object"
+                yield item
+                continue
+            item["id"] = str(record.get("id") or record.get("request_id") or item["id"])
+            item["prompt"] = record_prompt(record)
+            if not item["prompt"]:
+                item["error"] = "Record has no prompt"
+            yield item
+
+
+def resume_results(out_path: str) -> Set[str]:
+    """Keep only the successful results in out_path and return their ids, so a rerun can skip them.
+
+    Failed results are dropped because their ids run again, and a partial last line
+    left by a run killed mid-write is dropped too; the file is rewritten only if
+    anything was dropped. After the rerun, every id appears in the file once.
+    """
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    kept = []
+    dropped = False
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                dropped = True
+                continue
+            if not line.endswith("\n"):
+                # Complete JSON but unterminated: rewrite it so the next record starts on its own line
+                dropped = True
+            if result.get("status") == "ok" and str(result.get("id")) not in done:
+                done.add(str(result.get("id")))
+                kept.append(json.dumps(result) + "\n")
+            else:
+                dropped = True
+    if dropped:
+        tmp_path = f"{out_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(kept)
+        os.replace(tmp_path, out_path)
+    return done
+
+
+def _run_one(item: Dict[str, Any], query: Callable[[str], str]) -> Dict[str, Any]:
+    result = {"id": item["id"], "status": "ok", "response": None, "error": None, "latency_ms": 0.0}
+    if item["error"]:
+        result.update(status="error", error=item["error"])
+        return result
+    started = time.perf_counter()
+    try:
+        result["response"] = query(item["prompt"])
+    except Exception as e:
+        result.update(status="error", error=str(e))
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def run_batch(in_path: str, out_path: str, query: Callable[[str], str],
+              workers: int = DEFAULT_WORKERS, progress: bool = True) -> Dict[str, Any]:
+    """Run every prompt in in_path through query() on a worker pool.
+
+    Results are appended to out_path in input order, one JSON record per line, and
+    flushed as they are written so an interrupted run can resume where it stopped.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    done = resume_results(out_path)
+    items: List[Dict[str, Any]] = []
+    skipped = 0
+    for item in load_batch(in_path):
+        # Results for ids no longer in the input do not count as skipped
+        if item["id"] in done:
+            skipped += 1
+        else:
+            items.append(item)
+    summary = {"total": len(items), "skipped": skipped, "ok": 0, "error": 0, "elapsed_s": 0.0}
+    started = time.perf_counter()
+
+    # A small look-ahead window keeps workers busy while results are written in order
+    max_in_flight = workers * 4
+    window = deque()
+    written = 0
+
+    def write(result, out):
+        nonlocal written
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        written += 1
+        summary[result["status"]] += 1
+        if progress:
+            detail = result["error"] if result["status"] == "error" else f"{result['latency_ms']:.0f} ms"
+            print(f"[{written + summary['skipped']}/{summary['total'] + summary['skipped']}] "
+                  f"{result['id']}: {result['status']} ({detail})", file=sys.stderr)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        with open(out_path, "a", encoding="utf-8") as out:
+            for item in items:
+                window.append(executor.submit(_run_one, item, query))
+                if len(window) >= max_in_flight:
+                    write(window.popleft().result(), out)
+            while window:
+                write(window.popleft().result(), out)
+    except BaseException:
+        # Interrupted: drop queued prompts and return without waiting for the ones in flight,
+        # whose results would not be written anyway; a rerun asks them again
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    else:
+        executor.shutdown(wait=True)
+    finally:
+        summary["elapsed_s"] = round(time.perf_counter() - started, 2)
+    return summary
@@ -0,0 +1,228 @@
+# bench/fake_gemini.py
+"""Local stand-in for the Gemini generateContent, streamGenerateContent and cachedContents endpoints.
+
+Answers with canned text after a configurable delay, streams it in chunks over SSE,
+and injects 5xx errors and 429s at configurable rates, so the client can be
+benchmarked without an API key or network access. Cached contents are kept in
+memory and count towards the prompt tokens of requests that reference them.
+
+    python bench/fake_gemini.py --port 18080 --latency-ms 300 --rate-limit-rate 0.1
+    GEMINI_API_BASE=http://127.0.0.1:18080/v1 python app.py "hello"
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+WORDS = ("the quick brown fox jumps over the lazy dog while the model streams a "
+         "plausible answer about code performance and latency").split()
+
+
+class FakeGeminiConfig:
+    def __init__(self, latency_ms=50.0, chunks=8, chunk_delay_ms=10.0, reply_words=120,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=0.05, seed=0,
+                 throttled_keys=(), key_latency_ms=None, slow_rate=0.0, slow_ms=1000.0,
+                 min_cache_tokens=32768):
+        self.latency_ms = latency_ms          # before the response (or first chunk) is sent
+        self.chunks = chunks                  # SSE events per streamed response
+        self.chunk_delay_ms = chunk_delay_ms  # between SSE events
+        self.reply_words = reply_words
+        self.error_rate = error_rate          # fraction of requests answered with a 503
+        self.rate_limit_rate = rate_limit_rate  # fraction answered with a 429
+        self.retry_after = retry_after        # Retry-After seconds sent with 429s and 503s
+        self.seed = seed
+        self.throttled_keys = set(throttled_keys)  # API keys always answered with a 429
+        self.key_latency_ms = dict(key_latency_ms or {})  # per-key latency_ms overrides
+        self.slow_rate = slow_rate            # fraction of requests that also wait slow_ms: a latency tail
+        self.slow_ms = slow_ms
+        self.min_cache_tokens = min_cache_tokens  # smaller cachedContents are refused with a 400, as by the API
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    # Headers and body go out in separate writes; with Nagle on, the client's delayed
+    # ACK would add ~40 ms to every response and swamp what we are measuring
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            payload = {}
+        config = server.config
+        with server.lock:
+            server.stats["requests"] += 1
+            server.stats["request_bytes"] += len(body)
+            roll = server.random.random()
+            slow = config.slow_rate > 0 and server.random.random() < config.slow_rate
+        key = parse_qs(urlsplit(self.path).query).get("key", [""])[0]
+        if roll < config.rate_limit_rate or key in config.throttled_keys:
+            return self._fail(429, "RESOURCE_EXHAUSTED", "rate_limited")
+        if roll < config.rate_limit_rate + config.error_rate:
+            return self._fail(503, "UNAVAILABLE", "errors")
+
+        if self.path.split("?")[0].endswith("/cachedContents"):
+            return self._create_cache(payload)
+
+        prompt_chars = sum(len(part.get("text", "")) for content in payload.get("contents", [])
+                           for part in content.get("parts", []))
+        cached_tokens = 0
+        if payload.get("cachedContent"):
+            with server.lock:
+                cache = server.caches.get(payload["cachedContent"])
+            if cache is None or cache["expires"] < time.time():
+                return self._send_json(404, {"error": {"code": 404, "status": "NOT_FOUND",
+                                                       "message": "CachedContent not found"}})
+            cached_tokens = cache["tokens"]
+        latency_ms = config.key_latency_ms.get(key, config.latency_ms) + (config.slow_ms if slow else 0.0)
+        time.sleep(latency_ms / 1000.0)
+        text = " ".join(WORDS[i % len(WORDS)] for i in range(config.reply_words))
+        usage = {"promptTokenCount": prompt_chars // 4 + 1 + cached_tokens, "candidatesTokenCount": len(text) // 4 + 1}
+        usage["totalTokenCount"] = usage["promptTokenCount"] + usage["candidatesTokenCount"]
+        if cached_tokens:
+            usage["cachedContentTokenCount"] = cached_tokens
+
+        if ":streamGenerateContent" in self.path:
+            self._stream(text, usage, config)
+        else:
+            self._send_json(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}],
+                                  "usageMetadata": usage})
+        with server.lock:
+            server.stats["ok"] += 1
+
+    def _create_cache(self, payload):
+        server = self.server
+        chars = sum(len(part.get("text", "")) for content in payload.get("contents", [])
+                    for part in content.get("parts", []))
+        ttl = float(str(payload.get("ttl", "3600s")).rstrip("s"))
+        if chars // 4 + 1 < server.config.min_cache_tokens:
+            return self._fail(400, "INVALID_ARGUMENT", "caches_refused")
+        with server.lock:
+            server.stats["caches_created"] += 1
+            name = f"cachedContents/fake-{server.stats['caches_created']}"
+            server.caches[name] = {"tokens": chars // 4 + 1, "expires": time.time() + ttl}
+        self._send_json(200, {"name": name, "model": payload.get("model"),
+                              "usageMetadata": {"totalTokenCount": chars // 4 + 1}})
+
+    def _fail(self, status, reason, counter):
+        with self.server.lock:
+            self.server.stats[counter] += 1
+        self._send_json(status, {"error": {"code": status, "status": reason, "message": "Injected by fake server"}},
+                        {"Retry-After": f"{self.server.config.retry_after:g}"})
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, text, usage, config):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        size = max(1, -(-len(text) // max(1, config.chunks)))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(config.chunk_delay_ms / 1000.0)
+            event = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}]}
+            if index == len(pieces) - 1:
+                event["usageMetadata"] = usage
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class _Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients hang up mid-response on purpose, e.g. to cancel a hedged request that lost
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeGemini:
+    """The fake server on a background thread; use as a context manager."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or FakeGeminiConfig()
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = self.config
+        self.httpd.lock = threading.Lock()
+        self.httpd.random = random.Random(self.config.seed)
+        self.httpd.caches = {}
+        self.httpd.stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0,
+                            "caches_created": 0, "caches_refused": 0, "request_bytes": 0}
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def stats(self):
+        with self.httpd.lock:
+            return dict(self.httpd.stats)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Gemini API server")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--chunks", type=int, default=8)
+    parser.add_argument("--chunk-delay-ms", type=float, default=10.0)
+    parser.add_argument("--reply-words", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    config = FakeGeminiConfig(args.latency_ms, args.chunks, args.chunk_delay_ms, args.reply_words,
+                              args.error_rate, args.rate_limit_rate, args.retry_after,
+                              slow_rate=args.slow_rate, slow_ms=args.slow_ms)
+    server = FakeGemini(config, port=args.port)
+    print(f"Fake Gemini API on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
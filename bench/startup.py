@@ -0,0 +1,112 @@
+# bench/startup.py
+"""Cold-start benchmark for the CLI entry points.
+
+Times `app.py --version` and `app.py --help` against a bare interpreter and breaks
+the import cost down with `python -X importtime`. Exits non-zero when the median
+overhead over the bare interpreter exceeds the budget, so it can gate CI.
+
+    python bench/startup.py
+    python bench/startup.py --runs 20 --budget-ms 80 --json startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+AGENT_IMPORT = "import sys; sys.path.insert(0, {root!r}); import agent".format(root=ROOT)
+
+# Median milliseconds an entry point may add on top of `python -c pass`
+DEFAULT_BUDGET_MS = 80
+
+COMMANDS = {
+    "baseline": [sys.executable, "-c", "pass"],
+    "app --version": [sys.executable, APP, "--version"],
+    "app --help": [sys.executable, APP, "--help"],
+    "import agent": [sys.executable, "-c", AGENT_IMPORT],
+}
+
+
+def time_command(cmd, runs):
+    """Wall-clock milliseconds for each of `runs` executions of cmd."""
+    samples = []
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="")
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env, check=False)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def import_breakdown(cmd, top):
+    """Top-level imports by cumulative time (microseconds) from `-X importtime`."""
+    result = subprocess.run([cmd[0], "-X", "importtime"] + cmd[1:], stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True, check=False)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        # Nesting is shown as two extra spaces of indentation per level
+        if len(fields[2]) - len(fields[2].lstrip()) > 1:
+            continue
+        modules.append({"module": fields[2].strip(), "self_us": int(fields[0]),
+                        "cumulative_us": int(fields[1])})
+    modules.sort(key=lambda m: -m["cumulative_us"])
+    return modules[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CLI cold-start time")
+    parser.add_argument("--runs", type=int, default=10, help="Executions per command")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="Allowed median overhead over a bare interpreter")
+    parser.add_argument("--top", type=int, default=15, help="Imports to list in the breakdown")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    # Warm the bytecode cache so the first run is not penalised for compiling
+    time_command(COMMANDS["app --version"], 1)
+
+    results = {"python": sys.version.split()[0], "runs": args.runs, "budget_ms": args.budget_ms, "commands": {}}
+    for label, cmd in COMMANDS.items():
+        samples = time_command(cmd, args.runs)
+        results["commands"][label] = {
+            "median_ms": round(statistics.median(samples), 1),
+            "min_ms": round(min(samples), 1),
+            "max_ms": round(max(samples), 1),
+        }
+    baseline = results["commands"]["baseline"]["median_ms"]
+    for label, stats in results["commands"].items():
+        stats["overhead_ms"] = round(stats["median_ms"] - baseline, 1)
+    results["imports"] = import_breakdown(COMMANDS["app --version"], args.top)
+
+    print(f"{'command':<16} {'median':>9} {'min':>9} {'overhead':>9}")
+    for label, stats in results["commands"].items():
+        print(f"{label:<16} {stats['median_ms']:>7.1f}ms {stats['min_ms']:>7.1f}ms {stats['overhead_ms']:>7.1f}ms")
+    print("\nSlowest top-level imports for `app.py --version`:")
+    for module in results["imports"]:
+        print(f"  {module['cumulative_us'] / 1000:>7.1f}ms  {module['module']}")
+
+    over = {label: stats["overhead_ms"] for label, stats in results["commands"].items()
+            if label != "baseline" and stats["overhead_ms"] > args.budget_ms}
+    results["within_budget"] = not over
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if over:
+        for label, overhead in over.items():
+            print(f"\nOver budget: {label} adds {overhead}ms (budget {args.budget_ms}ms)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+# bench/suite.py
+"""Offline performance suite, run against the local fake Gemini server.
+
+Covers CLI cold start, request latency, time to first token and streaming
+throughput, retry overhead under injected 429s and 5xx errors, batch throughput,
+hedging against a latency tail, interactive turns and executor spawn cost. No API key or network access is needed.
+Results are written as JSON; `--compare` checks them against an earlier run and
+exits non-zero on regressions, so it can gate a release.
+
+    python bench/suite.py --json bench-results.json
+    python bench/suite.py --quick --compare bench-results.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_gemini import FakeGemini, FakeGeminiConfig  # noqa: E402
+import startup  # noqa: E402
+
+API_KEY = "bench-key"
+# How much worse than the baseline a metric may get before --compare fails
+DEFAULT_TOLERANCE = 0.25
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize_ms(samples):
+    return {"p50_ms": round(percentile(samples, 50), 2), "p95_ms": round(percentile(samples, 95), 2),
+            "mean_ms": round(statistics.mean(samples), 2)}
+
+
+def use_server(server):
+    """Point the process-wide client at `server` with a fresh connection pool."""
+    from gemini_client import configure_client
+    return configure_client(base_url=server.base_url)
+
+
+def bench_cold_start(runs):
+    baseline = statistics.median(startup.time_command(startup.COMMANDS["baseline"], runs))
+    results = {}
+    for label in ("app --version", "import agent"):
+        median = statistics.median(startup.time_command(startup.COMMANDS[label], runs))
+        results[label.replace(" ", "_").replace("--", "") + "_overhead_ms"] = round(median - baseline, 1)
+    return results
+
+
+def bench_query(count, config):
+    import app
+
+    with FakeGemini(config) as server:
+        client = use_server(server)
+        samples = []
+        for i in range(count):
+            started = time.perf_counter()
+            app.query_gemini(f"benchmark prompt {i}", API_KEY)
+            samples.append((time.perf_counter() - started) * 1000)
+        stats = client.stats()
+    result = summarize_ms(samples)
+    # What the client adds on top of the server's own delay
+    result["client_overhead_ms"] = round(result["p50_ms"] - config.latency_ms, 2)
+    result["reused_connections"] = stats["reused_connections"]
+    result["new_connections"] = stats["new_connections"]
+    return result
+
+
+def bench_stream(count, config):
+    import app
+
+    ttft, rates = [], []
+    with FakeGemini(config) as server:
+        use_server(server)
+        for i in range(count):
+            first = []
+            started = time.perf_counter()
+            text = app.query_gemini_stream(f"stream prompt {i}", API_KEY,
+                                           lambda chunk: first or first.append(time.perf_counter()))
+            finished = time.perf_counter()
+            ttft.append((first[0] - started) * 1000 if first else (finished - started) * 1000)
+            rates.append(len(text) / (finished - started))
+    return {"ttft_p50_ms": round(percentile(ttft, 50), 2), "ttft_p95_ms": round(percentile(ttft, 95), 2),
+            "throughput_chars_per_s": round(statistics.median(rates))}
+
+
+def bench_retries(count, config, error_rate, rate_limit_rate):
+    import app
+
+    faulty = FakeGeminiConfig(config.latency_ms, config.chunks, config.chunk_delay_ms, config.reply_words,
+                              error_rate=error_rate, rate_limit_rate=rate_limit_rate,
+                              retry_after=config.retry_after, seed=1)
+    samples, failures = [], 0
+    with FakeGemini(faulty) as server:
+        client = use_server(server)
+        for i in range(count):
+            started = time.perf_counter()
+            _, ok = app._query(f"retry prompt {i}", API_KEY)
+            samples.append((time.perf_counter() - started) * 1000)
+            failures += not ok
+        stats = client.stats()
+        injected = server.stats
+    result = summarize_ms(samples)
+    result["overhead_per_request_ms"] = round(result["mean_ms"] - config.latency_ms, 2)
+    result["retries"] = stats["retries"]
+    result["injected_faults"] = injected["errors"] + injected["rate_limited"]
+    result["failed_requests"] = failures
+    return result
+
+
+def bench_batch(count, workers, config, work_dir):
+    import app
+    from batch import run_batch
+
+    in_path = os.path.join(work_dir, "batch.jsonl")
+    out_path = os.path.join(work_dir, "batch.results.jsonl")
+    with open(in_path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"p{i}", "prompt": f"batch prompt {i}"}) + "\n")
+    with FakeGemini(config) as server:
+        from gemini_client import configure_client
+        configure_client(base_url=server.base_url, pool_size=workers)
+        summary = run_batch(in_path, out_path, lambda prompt: app.request_gemini(prompt, API_KEY),
+                            workers=workers, progress=False)
+    return {"prompts_per_s": round(summary["total"] / max(summary["elapsed_s"], 1e-6), 2),
+            "elapsed_s": summary["elapsed_s"], "errors": summary["error"], "workers": workers}
+
+
+def bench_context_cache(count, config):
+    """Request bytes and latency for one large --context file, inline versus server-side cached."""
+    import app
+    from context_cache import CachedContext
+
+    context = "Project Context:\n" + "def handler(event):\n    return process(event)\n" * 3000
+    results = {}
+    with FakeGemini(config) as server:
+        use_server(server)
+        for label, cached in (("inline", False), ("cached", True)):
+            app.CACHED_CONTEXT = CachedContext(context, app.DEFAULT_MODEL) if cached else None
+            sent_before = server.stats["request_bytes"]
+            samples = []
+            for i in range(count):
+                prompt = f"context question {i}" if cached else f"{context}\n\nQuery: context question {i}"
+                started = time.perf_counter()
+                app.request_gemini(prompt, API_KEY)
+                samples.append((time.perf_counter() - started) * 1000)
+            results[f"{label}_p50_ms"] = round(percentile(samples, 50), 2)
+            results[f"{label}_request_bytes"] = server.stats["request_bytes"] - sent_before
+    app.CACHED_CONTEXT = None
+    return results
+
+
+def bench_hedging(count, config):
+    """Latency with a slow tail (some requests stall), without and with hedged requests."""
+    import app
+    import hedging
+
+    tail = FakeGeminiConfig(config.latency_ms, config.chunks, config.chunk_delay_ms, config.reply_words,
+                            seed=2, slow_rate=0.05, slow_ms=max(1000.0, config.latency_ms * 20))
+    results = {}
+    for label, hedge in (("plain", False), ("hedged", True)):
+        # The hedger must exist before the client so its pools can abort losing attempts
+        hedger = hedging.enable_hedging(initial_delay=config.latency_ms * 3 / 1000.0) if hedge else None
+        with FakeGemini(tail) as server:
+            use_server(server)
+            samples = []
+            for i in range(count):
+                started = time.perf_counter()
+                app.request_gemini(f"hedge prompt {i}", API_KEY)
+                samples.append((time.perf_counter() - started) * 1000)
+        results[f"{label}_p50_ms"] = round(percentile(samples, 50), 2)
+        results[f"{label}_p99_ms"] = round(percentile(samples, 99), 2)
+        if hedger is not None:
+            stats = hedger.stats()
+            results["hedges_fired"] = stats["hedged"]
+            results["hedges_won"] = stats["hedge_won"]
+        hedging.disable_hedging()
+    return results
+
+
+def bench_interactive(turns, config, env):
+    with FakeGemini(config) as server:
+        script = "".join(f"interactive turn {i}\n" for i in range(turns)) + "exit\n"
+        started = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT, "app.py"), "-i", "--no-cache", "--no-daemon"],
+                       input=script, text=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       env=dict(env, GEMINI_API_BASE=server.base_url), timeout=120, check=False)
+        elapsed = (time.perf_counter() - started) * 1000
+    # Includes one cold start, spread over the session
+    return {"session_ms": round(elapsed, 1), "per_turn_ms": round(elapsed / turns, 2), "turns": turns}
+
+
+def bench_executor(runs, work_dir):
+    import worker_pool
+    from executor import run_plan
+
+    code = "import json\nprint(json.dumps({'ok': True}))\n"
+    result = {}
+    if worker_pool.supported():
+        run_plan(code, work_dir)  # start the pool
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            run_plan(code, work_dir)
+            samples.append((time.perf_counter() - started) * 1000)
+        result["pool_run_p50_ms"] = round(percentile(samples, 50), 2)
+    path = os.path.join(work_dir, "fresh.py")
+    with open(path, "w") as f:
+        f.write(code)
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, path], capture_output=True, check=False)
+        samples.append((time.perf_counter() - started) * 1000)
+    result["fresh_interpreter_p50_ms"] = round(percentile(samples, 50), 2)
+    return result
+
+
+def flatten(results, prefix=""):
+    """Numeric leaves of the results as {"section.metric": value}."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    """Timing and throughput metrics that got worse than baseline by more than tolerance."""
+    regressions = []
+    old = flatten(baseline.get("results", {}))
+    for name, value in flatten(current["results"]).items():
+        if name not in old or not old[name]:
+            continue
+        if name.endswith("_per_s"):
+            change = (old[name] - value) / old[name]
+        elif name.endswith("_ms"):
+            change = (value - old[name]) / old[name]
+        else:
+            continue  # counters such as retries are informational
+        if change > tolerance:
+            regressions.append({"metric": name, "baseline": old[name], "current": value,
+                                "worse_by": f"{change:.0%}"})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite against a fake Gemini server")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations, for a fast sanity check")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake server response delay")
+    parser.add_argument("--chunks", type=int, default=8, help="SSE chunks per streamed response")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="Injected 503 rate for the retry benchmark")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.2, help="Injected 429 rate for the retry benchmark")
+    parser.add_argument("--workers", type=int, default=8, help="Workers for the batch benchmark")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative slowdown per metric with --compare")
+    args = parser.parse_args()
+
+    n = 10 if args.quick else 40
+    # Keep cache, rate-limit and session state away from the user's real ~/.gemini_cli
+    work_dir = tempfile.mkdtemp(prefix="gemini_bench_")
+    os.environ["HOME"] = work_dir
+    os.environ["GEMINI_API_KEY"] = API_KEY
+    os.environ["VSCODE_EXTENSION"] = "true"  # no spinner
+    os.environ.pop("GEMINI_RPM", None)
+    os.environ.pop("GEMINI_TPM", None)
+    config = FakeGeminiConfig(latency_ms=args.latency_ms, chunks=args.chunks)
+
+    sections = [
+        ("cold_start", lambda: bench_cold_start(5 if args.quick else 15)),
+        ("query", lambda: bench_query(n, config)),
+        ("stream", lambda: bench_stream(n, config)),
+        ("retries", lambda: bench_retries(n, config, args.error_rate, args.rate_limit_rate)),
+        ("batch", lambda: bench_batch(n * 4, args.workers, config, work_dir)),
+        ("context_cache", lambda: bench_context_cache(n, config)),
+        ("hedging", lambda: bench_hedging(n * 2, config)),
+        ("interactive", lambda: bench_interactive(n // 2, config, dict(os.environ))),
+        ("executor", lambda: bench_executor(n, work_dir)),
+    ]
+    results = {}
+    for name, run in sections:
+        print(f"{name}...", file=sys.stderr)
+        results[name] = run()
+    report = {"python": sys.version.split()[0], "platform": sys.platform, "time": time.time(),
+              "config": {"latency_ms": args.latency_ms, "chunks": args.chunks, "iterations": n},
+              "results": results}
+
+    for name, values in results.items():
+        print(f"{name}:")
+        for key, value in values.items():
+            print(f"  {key:<28} {value}")
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+        for regression in report["regressions"]:
+            print(f"Regression: {regression['metric']} {regression['baseline']} -> "
+                  f"{regression['current']} ({regression['worse_by']} worse)")
+        exit_code = 1 if report["regressions"] else 0
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    import shutil
+    shutil.rmtree(work_dir, ignore_errors=True)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
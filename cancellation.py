@@ -0,0 +1,113 @@
+# cancellation.py
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+
+_local = threading.local()
+
+
+class Cancelled(Exception):
+    """The request was cancelled before it finished."""
+
+
+class CancelScope:
+    """The connections a unit of work is using, so it can be aborted mid-read from another thread.
+
+    Scopes nest: cancelling one also cancels the scopes created under it, e.g. the
+    attempts of a hedged call made by a background query.
+    """
+
+    def __init__(self, parent: Optional["CancelScope"] = None):
+        self.cancelled = False
+        self._connections = []
+        self._children = []
+        self._lock = threading.Lock()
+        if parent is not None:
+            parent._adopt(self)
+
+    def _adopt(self, child: "CancelScope") -> None:
+        with self._lock:
+            self._children.append(child)
+            cancelled = self.cancelled
+        if cancelled:
+            child.cancel()
+
+    def attach(self, connection) -> None:
+        with self._lock:
+            self._connections.append(connection)
+            cancelled = self.cancelled
+        if cancelled:
+            self._abort(connection)
+
+    def detach(self) -> None:
+        with self._lock:
+            self._connections = []
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            connections, self._connections = self._connections, []
+            children, self._children = self._children, []
+        for connection in connections:
+            self._abort(connection)
+        for child in children:
+            child.cancel()
+
+    @staticmethod
+    def _abort(connection) -> None:
+        import socket
+
+        sock = getattr(connection, "sock", None)
+        if sock is None:
+            return
+        try:
+            # Wakes the thread blocked reading the response; urllib3 then drops the connection
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def current_scope() -> Optional[CancelScope]:
+    """The scope the work on this thread runs in, if any."""
+    return getattr(_local, "scope", None)
+
+
+def cancelled() -> bool:
+    """Whether the work running on this thread has been cancelled."""
+    scope = current_scope()
+    return scope is not None and scope.cancelled
+
+
+def check() -> None:
+    """Raise Cancelled if the work running on this thread has been cancelled."""
+    if cancelled():
+        raise Cancelled()
+
+
+@contextmanager
+def running_in(scope: CancelScope) -> Iterator[CancelScope]:
+    """Run the block on this thread inside `scope`."""
+    previous = current_scope()
+    _local.scope = scope
+    try:
+        yield scope
+    finally:
+        scope.detach()
+        _local.scope = previous
+
+
+def cancellable_pool_classes(bases: Dict[str, Any]) -> Dict[str, Any]:
+    """Subclasses of the given urllib3 pools that register each connection taken inside a scope."""
+    classes = {}
+    for scheme, base in bases.items():
+        class CancellablePool(base):
+            def _get_conn(self, timeout=None):
+                connection = super()._get_conn(timeout)
+                scope = current_scope()
+                if scope is not None:
+                    scope.attach(connection)
+                return connection
+
+        CancellablePool.__name__ = f"Cancellable{base.__name__}"
+        classes[scheme] = CancellablePool
+    return classes
@@ -0,0 +1,141 @@
+# context_cache.py
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Optional, Dict, Any
+
+from locking import file_lock
+
+STATE_PATH = os.path.expanduser("~/.gemini_cli/context_caches.json")
+
+# The API refuses to cache less than 32,768 tokens for the default model; at about
+# 4 characters per token, shorter context is sent inline without trying
+DEFAULT_MIN_CHARS = int(os.environ.get("GEMINI_CONTEXT_CACHE_MIN_CHARS", "131072"))
+# Lifetime requested for a new server-side cache
+DEFAULT_TTL = float(os.environ.get("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+# A cache this close to expiring is re-created rather than risked on a request
+REFRESH_MARGIN = 60.0
+# How long a context the API refused to cache is sent inline before caching is tried again
+REFUSED_TTL = 24 * 3600.0
+
+
+def context_key(model: str, text: str) -> str:
+    """A cache is bound to its model, so the key covers both."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class ContextCacheRegistry:
+    """Server-side cachedContents handles created by any CLI process, with their local expiry.
+
+    Lives in a small JSON file under a lock file, so a second invocation with the
+    same context reuses the handle instead of uploading the context again.
+    """
+
+    def __init__(self, path: str = STATE_PATH):
+        self.path = path
+        self.lock_path = path + ".lock"
+        # Held while a cache is created, so parallel runs upload the same context once
+        self.create_lock_path = path + ".create.lock"
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        return {key: entry for key, entry in entries.items() if entry.get("expires", 0) - REFRESH_MARGIN > now}
+
+    def _save(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """The {"name", "expires"} entry of a live cache for `key`, {"refused", "expires"} if
+        the API recently refused to cache it, or None."""
+        return self._load().get(key)
+
+    def remember(self, key: str, entry: Dict[str, Any]) -> None:
+        with file_lock(self.lock_path):
+            entries = self._load()
+            entries[key] = entry
+            self._save(entries)
+
+    def forget(self, key: str, name: str) -> None:
+        """Drop the entry for `key` if it still points at cache `name`."""
+        with file_lock(self.lock_path):
+            entries = self._load()
+            if entries.get(key, {}).get("name") == name:
+                del entries[key]
+                self._save(entries)
+
+
+class CachedContext:
+    """A large, stable prompt prefix uploaded once as a cachedContents resource.
+
+    Requests then reference the cache by name instead of carrying the text. If the
+    API refuses to create a cache (e.g. the context is below the model's minimum),
+    handle() returns None from then on and the caller sends the text inline. The
+    refusal is recorded in the registry, so later runs do not upload the text again.
+    """
+
+    def __init__(self, text: str, model: str, ttl: float = DEFAULT_TTL,
+                 registry: Optional[ContextCacheRegistry] = None):
+        self.text = text
+        self.model = model
+        self.ttl = ttl
+        self.registry = registry or ContextCacheRegistry()
+        self.key = context_key(model, text)
+        self.failed = False
+        self._name: Optional[str] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def handle(self, client, api_key: str) -> Optional[str]:
+        """The cachedContents name to put in a request, creating the cache if needed."""
+        with self._lock:
+            if self.failed:
+                return None
+            if self._name and self._expires - REFRESH_MARGIN > time.time():
+                return self._name
+            with file_lock(self.registry.create_lock_path):
+                entry = self.registry.lookup(self.key) or self._create(client, api_key)
+            if entry is None or entry.get("refused"):
+                self.failed = True
+                return None
+            self._name, self._expires = entry["name"], entry["expires"]
+            return self._name
+
+    def _create(self, client, api_key: str) -> Optional[Dict[str, Any]]:
+        import requests
+
+        contents = [{"role": "user", "parts": [{"text": self.text}]}]
+        # Counted from before the upload, so the local expiry never outlives the server's
+        expires = time.time() + self.ttl
+        try:
+            name = client.create_cached_content(contents, api_key, self.model, self.ttl).get("name")
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status is not None and 400 <= status < 500 and status != 429:
+                # Refused for this content and model, not throttled or down: remember that
+                self.registry.remember(self.key, {"refused": True, "expires": time.time() + REFUSED_TTL})
+            name = None
+        if not name:
+            return None
+        entry = {"name": name, "expires": expires}
+        self.registry.remember(self.key, entry)
+        return entry
+
+    def invalidate(self, name: str) -> None:
+        """Drop a handle the API no longer recognises; the next handle() re-creates it.
+
+        Concurrent requests that fail on the same stale handle re-create it once.
+        """
+        with self._lock:
+            if self._name == name:
+                self._name = None
+            self.registry.forget(self.key, name)
@@ -0,0 +1,114 @@
+# conversation.py
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+# Tokens of earlier conversation sent with each interactive turn
+DEFAULT_HISTORY_BUDGET = 6000
+
+SUMMARY_PROMPT = """Summarize the conversation below so it can replace the full transcript as context for later questions.
+Keep facts, decisions, code identifiers and open questions; drop pleasantries. Answer with the summary only.
+
+{previous}{transcript}"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def turn_tokens(turn: Tuple[str, str]) -> int:
+    return estimate_tokens(turn[0]) + estimate_tokens(turn[1])
+
+
+class Conversation:
+    """Bounded memory for a multi-turn chat.
+
+    The most recent turns are sent verbatim as long as they fit the token budget.
+    When they no longer fit, the oldest ones are folded into a running summary, which
+    is generated once and reused on every later turn. Compaction shrinks the window to
+    half the budget so the summarizer runs every few turns rather than on each one.
+    """
+
+    def __init__(self, summarize: Callable[[str], str], budget_tokens: int = DEFAULT_HISTORY_BUDGET,
+                 turns: Optional[List[Tuple[str, str]]] = None):
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        # Only turns not yet covered by the summary are kept, so memory stays bounded
+        self.turns: List[Tuple[str, str]] = list(turns or [])
+        self.summary = ""
+
+    def add_turn(self, prompt: str, response: str) -> None:
+        self.turns.append((prompt, response))
+
+    def reset(self) -> None:
+        """Start a fresh conversation; the displayed history is kept."""
+        self.summary = ""
+        self.turns = []
+
+    def _window_start(self, budget: int) -> int:
+        """Index of the oldest turn that still fits in `budget` tokens next to the summary."""
+        used = estimate_tokens(self.summary) if self.summary else 0
+        start = len(self.turns)
+        while start > 0:
+            cost = turn_tokens(self.turns[start - 1])
+            if used + cost > budget:
+                break
+            used += cost
+            start -= 1
+        return start
+
+    def compaction(self) -> Optional[Tuple[str, List[Tuple[str, str]], str]]:
+        """The summary request compact() would make, or None if every turn fits the budget.
+
+        Returns the prompt for the summarizer, the turns it covers and the summary it
+        builds on, to be handed back to fold() with the result. This lets the caller
+        run the (slow) summarizer without holding whatever lock guards the conversation.
+        """
+        if self._window_start(self.budget_tokens) == 0:
+            return None
+        keep_from = self._window_start(self.budget_tokens // 2)
+        covered = self.turns[:keep_from]
+        transcript = "\n\n".join(f"User: {q}\nAssistant: {a}" for q, a in covered)
+        previous = f"Summary so far:\n{self.summary}\n\nNew turns:\n" if self.summary else ""
+        return SUMMARY_PROMPT.format(previous=previous, transcript=transcript), covered, self.summary
+
+    def fold(self, compaction: Tuple[str, List[Tuple[str, str]], str], summary: Optional[str]) -> bool:
+        """Replace the turns a compaction covered with its summary (None: just drop them).
+
+        Does nothing and returns False if the conversation was reset or compacted
+        since compaction() was called; turns added in the meantime are kept.
+        """
+        _, covered, base = compaction
+        if self.summary != base or self.turns[:len(covered)] != covered:
+            return False
+        if summary is not None:
+            self.summary = summary
+        del self.turns[:len(covered)]
+        return True
+
+    def compact(self) -> None:
+        """Fold turns that fall outside the budget into the summary."""
+        compaction = self.compaction()
+        if compaction is None:
+            return
+        try:
+            summary = self.summarize(compaction[0]).strip()
+        except Exception:
+            # Without a summary the old turns are simply dropped from the context
+            summary = None
+        self.fold(compaction, summary)
+
+    def contents(self, compact: bool = True) -> List[Dict[str, Any]]:
+        """Earlier conversation as Gemini `contents` with alternating user/model roles.
+
+        With compact=False, turns outside the budget are left out rather than summarized.
+        """
+        if compact:
+            self.compact()
+        contents = []
+        if self.summary:
+            contents.append({"role": "user", "parts": [{"text": f"Summary of our conversation so far:\n{self.summary}"}]})
+            contents.append({"role": "model", "parts": [{"text": "Understood, I will keep that in mind."}]})
+        for prompt, response in self.turns[self._window_start(self.budget_tokens):]:
+            contents.append({"role": "user", "parts": [{"text": prompt}]})
+            contents.append({"role": "model", "parts": [{"text": response}]})
+        return contents
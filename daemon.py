@@ -0,0 +1,91 @@
+# daemon.py
+import os
+import json
+import threading
+from typing import Callable, Dict, Any, Optional
+
+SOCKET_PATH = os.environ.get("GEMINI_DAEMON_SOCKET", os.path.expanduser("~/.gemini_cli/daemon.sock"))
+
+class DaemonError(Exception):
+    """The daemon ran the request and reported an error."""
+
+
+def supported() -> bool:
+    import socket
+    return hasattr(socket, "AF_UNIX")
+
+
+class DaemonClient:
+    """Client for a running daemon; keeps one connection open for many calls."""
+
+    def __init__(self, path: str = SOCKET_PATH, timeout: Optional[float] = None):
+        self.path = path
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._sock is None:
+            # Imported here so thin clients that find no daemon never load socket
+            import socket
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._sock = sock
+            self._reader = sock.makefile("rb")
+
+    def call(self, method: str, params: Optional[Dict[str, Any]] = None,
+             on_chunk: Optional[Callable[[Any], None]] = None) -> Any:
+        """Send one request and wait for its result, passing streamed chunks to on_chunk.
+
+        Raises DaemonError for errors reported by the daemon and OSError when it
+        cannot be reached.
+        """
+        with self._lock:
+            try:
+                self._connect()
+                self._next_id += 1
+                request_id = self._next_id
+                message = {"id": request_id, "method": method, "params": params or {}}
+                self._sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+                while True:
+                    line = self._reader.readline()
+                    if not line:
+                        raise ConnectionError("Daemon closed the connection")
+                    reply = json.loads(line)
+                    if "chunk" in reply:
+                        if on_chunk is not None:
+                            on_chunk(reply["chunk"])
+                        continue
+                    if "error" in reply:
+                        raise DaemonError(reply["error"].get("message", "Unknown daemon error"))
+                    return reply.get("result")
+            except (OSError, ValueError, KeyboardInterrupt):
+                # A call abandoned part-way (e.g. with Ctrl-C) would leave its replies unread on the socket
+                self.close()
+                raise
+
+    def close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+            self._reader = None
+
+
+def is_running(path: str = SOCKET_PATH) -> bool:
+    """Whether a daemon answers on `path`."""
+    if not supported() or not os.path.exists(path):
+        return False
+    client = DaemonClient(path, timeout=1.0)
+    try:
+        return client.call("ping") == "pong"
+    except (OSError, ValueError, DaemonError):
+        return False
+    finally:
+        client.close()
@@ -0,0 +1,85 @@
+# daemon_server.py
+import os
+import json
+import threading
+import socketserver
+from typing import Callable, Dict, Any
+
+from daemon import DaemonError, SOCKET_PATH, is_running
+
+# A handler receives the request params and an `emit` callback for streamed chunks,
+# and returns the JSON-serialisable result.
+Handler = Callable[[Dict[str, Any], Callable[[Any], None]], Any]
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Newline-delimited JSON-RPC: one request object per line, one or more replies per request.
+
+    Request:  {"id": 1, "method": "query", "params": {...}}
+    Replies:  {"id": 1, "chunk": ...}          zero or more, for streamed results
+              {"id": 1, "result": ...}         or {"id": 1, "error": {"message": ...}}
+    A connection may carry any number of requests; they are answered in order.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            request_id = None
+            try:
+                request = json.loads(line)
+                request_id = request.get("id")
+                handler = self.server.handlers.get(request.get("method"))
+                if handler is None:
+                    raise DaemonError(f"Unknown method: {request.get('method')}")
+                result = handler(request.get("params") or {},
+                                 lambda chunk: self._send({"id": request_id, "chunk": chunk}))
+                self._send({"id": request_id, "result": result})
+            except Exception as e:
+                self._send({"id": request_id, "error": {"message": str(e)}})
+            if self.server.stopping.is_set():
+                break
+
+    def _send(self, message: Dict[str, Any]) -> None:
+        self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+# Windows has no Unix domain sockets; supported() gates every use of the server
+_UnixStreamServer = getattr(socketserver, "UnixStreamServer", socketserver.BaseServer)
+
+
+class DaemonServer(socketserver.ThreadingMixIn, _UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, handlers: Dict[str, Handler], path: str = SOCKET_PATH):
+        self.handlers = dict(handlers)
+        self.stopping = threading.Event()
+        self.handlers.setdefault("ping", lambda params, emit: "pong")
+        self.handlers["shutdown"] = self._shutdown
+        self.path = path
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path):
+            if is_running(path):
+                raise OSError(f"A daemon is already listening on {path}")
+            os.remove(path)  # stale socket from a daemon that did not exit cleanly
+        # The socket carries the user's API key, so only the user may connect
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def _shutdown(self, params, emit):
+        self.stopping.set()
+        # shutdown() blocks until serve_forever returns, so it must run on another thread
+        threading.Thread(target=self.shutdown, daemon=True).start()
+        return "stopping"
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -1,61 +1,297 @@
 # executor.py
 import subprocess
 import os
+import sys
+import time
 import tempfile
 import shutil
 import re
+import threading
 
-def execute_code(code):
-    print("\n🚀 Executing plan...")
+import worker_pool
+from workspace import get_dependency_cache
+from output_capture import OutputCapture, DEFAULT_OUTPUT_LIMIT
+
+# Limits for each plan run; a runaway script is stopped instead of hanging the agent
+DEFAULT_TIMEOUT = float(os.environ.get("GEMINI_EXEC_TIMEOUT", "60"))
+# Package installs routinely take longer than a plan's own work, so they get their own limit
+DEFAULT_INSTALL_TIMEOUT = float(os.environ.get("GEMINI_EXEC_INSTALL_TIMEOUT", "600"))
+# Off by default: 0 means no memory cap
+DEFAULT_MEMORY_MB = int(os.environ.get("GEMINI_EXEC_MEMORY_MB", "0"))
+# Optional file that receives every run's complete output, beyond what is kept in memory
+DEFAULT_LOG_PATH = os.environ.get("GEMINI_EXEC_LOG") or None
+
+def is_python_code(code):
+    return code.startswith("#!") or "def " in code or "import " in code
+
+def is_install(code):
+    """Whether the plan installs packages (pip, conda, apt, npm), which gets the longer install timeout."""
+    return re.search(r"""\b(pip3?|conda|mamba|apt(-get)?|npm|yarn)["',\s]+(install|add)\b""", code) is not None
+
+def is_dangerous(code, python=None):
+    """Basic sanitization for shell commands: refuse obviously destructive ones."""
+    if python if python is not None else is_python_code(code):
+        return False
+    # Restrict potentially dangerous commands
+    dangerous_patterns = [
+        r'rm\s+-rf\s+/',        # Removing system directories
+        r'>\s+/dev/',           # Writing to device files
+        r'dd\s+if=',            # Raw disk operations
+        r'mkfs',                # Formatting filesystems
+        r'wget\s+.+\s+\|\s+bash', # Piping web content to bash
+        r'curl\s+.+\s+\|\s+bash'  # Piping curl to bash
+    ]
+    return any(re.search(pattern, code, re.IGNORECASE) for pattern in dangerous_patterns)
+
+def plan_succeeded(result):
+    return (result["exit_code"] == 0 and not result["timed_out"]
+            and not result["output_limited"] and not result.get("cancelled"))
+
+def run_plan(code, work_dir, timeout=DEFAULT_TIMEOUT, memory_mb=DEFAULT_MEMORY_MB, capture=None, cancel=None,
+             python=None, script_name="temp_task.py", deps=None):
+    """Run a plan in work_dir and return its exit code, output and resource usage.
+
+    Output is streamed into `capture` (an OutputCapture) as it is produced, and the
+    run is stopped early if the threading.Event `cancel` is set. `python` says whether
+    the code is Python or shell; by default it is guessed. With `deps` (a
+    workspace.DependencyCache) the plan runs in its venv, so packages it installs are
+    kept. Uses the warm worker pool where the platform supports it, and a fresh
+    interpreter (with the same wall-clock timeout) elsewhere.
+    """
+    capture = capture or OutputCapture()
+    if python is None:
+        python = is_python_code(code)
+    if timeout and is_install(code):
+        timeout = max(timeout, DEFAULT_INSTALL_TIMEOUT)
+    path = None
+    if python:
+        path = os.path.join(work_dir, script_name)
+        with open(path, "w") as f:
+            f.write(code)
+
+    if worker_pool.supported():
+        return worker_pool.get_pool().run(
+            work_dir, path=path, command=None if python else code, timeout=timeout,
+            cpu_seconds=timeout, memory_bytes=memory_mb * 1024 * 1024 if memory_mb else None,
+            capture=capture, cancel=cancel, env=deps.env() if deps else None,
+            executable=deps.python if deps else None, site_packages=deps.site_packages if deps else None,
+        )
+
+    started = time.perf_counter()
+    args = [deps.python if deps else sys.executable, "-u", path] if python else code
+    # Its own process group, so stopping the plan also stops whatever it started (with a shell, the shell's children)
+    group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == "nt" else {"start_new_session": True}
+    proc = subprocess.Popen(args, shell=not python, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, cwd=work_dir, env=dict(os.environ, **deps.env()) if deps else None,
+                            **group)
+    readers = [threading.Thread(target=capture.drain, args=(pipe.read1, stream, lambda: kill_process_tree(proc)),
+                                daemon=True)
+               for pipe, stream in ((proc.stdout, "stdout"), (proc.stderr, "stderr"))]
+    for reader in readers:
+        reader.start()
+    timed_out = cancelled = False
+    while proc.poll() is None:
+        if cancel is not None and cancel.is_set():
+            cancelled = True
+            break
+        if timeout and time.perf_counter() - started >= timeout:
+            timed_out = True
+            break
+        try:
+            proc.wait(timeout=worker_pool.CANCEL_POLL_INTERVAL)
+        except subprocess.TimeoutExpired:
+            pass
+    if proc.poll() is None:
+        kill_process_tree(proc)
+        proc.wait()
+    for reader in readers:
+        # A grandchild that escaped its group could still hold the pipes open
+        reader.join(worker_pool.READER_JOIN_TIMEOUT)
+    return {"exit_code": proc.returncode, "timed_out": timed_out, "cancelled": cancelled,
+            "stdout": capture.text("stdout"), "stderr": capture.text("stderr"),
+            "output_bytes": capture.total, "output_limited": capture.limit_hit,
+            "output_truncated": any(reader.is_alive() for reader in readers),
+            "wall_s": round(time.perf_counter() - started, 3),
+            "cpu_user_s": None, "cpu_sys_s": None, "max_rss_kb": None}
+
+def kill_process_tree(proc):
+    """Kill a plan started by run_plan's fallback together with every process it started."""
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                       stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        import signal
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+    try:
+        proc.kill()
+    except OSError:
+        pass
+
+def echo_output(stream, data):
+    """Show plan output live, as it arrives."""
+    target = sys.stdout if stream == "stdout" else sys.stderr
+    if hasattr(target, "buffer"):
+        target.flush()
+        target.buffer.write(data)
+    else:
+        target.write(data.decode("utf-8", "replace"))
+    target.flush()
+
+def describe_signal(signum):
+    import signal
+    if signum == getattr(signal, "SIGXCPU", None):
+        return "the CPU time limit"
     try:
+        return signal.Signals(signum).name
+    except ValueError:
+        return f"signal {signum}"
+
+def format_usage(result):
+    parts = [f"{result['wall_s']:.2f}s wall"]
+    if result.get("cpu_user_s") is not None:
+        parts.append(f"{result['cpu_user_s'] + result['cpu_sys_s']:.2f}s CPU")
+    if result.get("max_rss_kb"):
+        parts.append(f"{result['max_rss_kb'] / 1024:.1f} MB peak memory")
+    return ", ".join(parts)
+
+def print_stop_reason(result, timeout, output_limit):
+    if result["output_limited"]:
+        print(f"\n✂️ Stopped after {output_limit // (1024 * 1024)} MB of output")
+    elif result["timed_out"]:
+        print(f"\n⏱️ Stopped after {timeout:g}s without finishing")
+    elif result["exit_code"] is not None and result["exit_code"] < 0:
+        print(f"\n⛔ Terminated by {describe_signal(-result['exit_code'])}")
+    if result.get("output_truncated"):
+        print("\n✂️ Output may be incomplete: a process the plan started in the background still holds it open")
+
+def extract_exception(stderr):
+    """The last Python traceback in stderr, or its last few lines if there is none."""
+    start = stderr.rfind("Traceback (most recent call last):")
+    if start != -1:
+        return stderr[start:].strip()
+    return "\n".join(stderr.strip().splitlines()[-5:])
+
+def failed_result(error):
+    """Result for a plan that could not be run at all."""
+    result = worker_pool.cancelled_result()
+    result.update(cancelled=False, error=error, success=False, exception="")
+    return result
+
+def finish_result(result):
+    """Add the fields the agent and planner read: success, and the exception if any."""
+    result["success"] = plan_succeeded(result)
+    result["exception"] = "" if result["success"] else extract_exception(result["stderr"])
+    result.setdefault("error", None)
+    return result
+
+def execute_code(code, timeout=DEFAULT_TIMEOUT, output_limit=DEFAULT_OUTPUT_LIMIT, log_path=DEFAULT_LOG_PATH,
+                 workspace=None):
+    """Run a plan with live output and return its result.
+
+    The result is a dict with `success`, `exit_code`, the head and tail of `stdout`
+    and `stderr`, the last `exception` traceback, the stop reason (`timed_out`,
+    `output_limited`) and resource usage, so a failure can be fed back to the planner.
+    With a `workspace` (a workspace.Workspace) the plan runs in the task's kept
+    directory with the shared dependency cache; otherwise in a throwaway directory.
+    """
+    print("\n🚀 Executing plan...")
+    deps = None
+    if workspace is not None:
+        work_dir = workspace.path
+        deps = get_dependency_cache()
+    else:
         # Create a temporary directory that will be automatically cleaned up
-        temp_dir = tempfile.mkdtemp(prefix="ai_agent_")
-        temp_file_path = os.path.join(temp_dir, "temp_task.py")
-        
-        if code.startswith("#!") or "def " in code or "import " in code:
-            # Handle Python code
-            with open(temp_file_path, "w") as f:
-                f.write(code)
-            
-            # Use a list for command arguments (safer than shell=True)
-            result = subprocess.run(["python", temp_file_path], 
-                                   capture_output=True, 
-                                   text=True,
-                                   cwd=temp_dir)
-        else:
-            # For shell commands, do basic sanitization
-            # Restrict potentially dangerous commands
-            dangerous_patterns = [
-                r'rm\s+-rf\s+/',        # Removing system directories
-                r'>\s+/dev/',           # Writing to device files
-                r'dd\s+if=',            # Raw disk operations
-                r'mkfs',                # Formatting filesystems
-                r'wget\s+.+\s+\|\s+bash', # Piping web content to bash
-                r'curl\s+.+\s+\|\s+bash'  # Piping curl to bash
-            ]
-            
-            for pattern in dangerous_patterns:
-                if re.search(pattern, code, re.IGNORECASE):
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                    return False
-            
-            # Execute the command in a controlled environment
-            result = subprocess.run(code, 
-                                  shell=True, 
-                                  capture_output=True, 
-                                  text=True,
-                                  cwd=temp_dir)
-        
-        print("\n📤 Output:\n", result.stdout)
-        if result.stderr:
-            print("\n⚠️ Errors:\n", result.stderr)
-        
-        # Clean up
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        return result.returncode == 0
+        work_dir = tempfile.mkdtemp(prefix="ai_agent_")
+    try:
+        if is_dangerous(code):
+            print("\n🛑 Refusing to run a potentially dangerous shell command")
+            return failed_result("refused a potentially dangerous shell command")
+
+        # Execute in a controlled environment: own directory, time, memory and output limits
+        print("\n📤 Output:")
+        capture = OutputCapture(limit_bytes=output_limit, echo=echo_output, log_path=log_path)
+        try:
+            result = run_plan(code, work_dir, timeout=timeout, capture=capture, deps=deps)
+        finally:
+            capture.close()
+
+        print_stop_reason(result, timeout, output_limit)
+        if log_path:
+            print(f"\n📝 Full output ({result['output_bytes']} bytes) appended to {log_path}")
+        print(f"\n📊 {format_usage(result)}")
+
+        return finish_result(result)
     except Exception as e:
         print(f"\n❌ Exception during execution: {e}")
-        # Clean up in case of exception
-        if 'temp_dir' in locals():
-            shutil.rmtree(temp_dir, ignore_errors=True)
-        return False
+        return failed_result(f"exception during execution: {e}")
+    finally:
+        # Clean up
+        if workspace is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def race_plans(plans, timeout=DEFAULT_TIMEOUT, output_limit=DEFAULT_OUTPUT_LIMIT, workspace=None):
+    """Run candidate plans side by side, each in its own sandbox; the first to succeed wins.
+
+    The remaining candidates are cancelled as soon as one succeeds. Returns the index
+    and result of the winner or, if every candidate failed, of the first candidate.
+    With a `workspace`, candidate N runs in its `candidate-N` subdirectory, kept for
+    the next round, and all of them share the dependency cache.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    print(f"\n🏁 Racing {len(plans)} plans...")
+    if worker_pool.supported():
+        worker_pool.get_pool().grow(len(plans))
+    cancel = threading.Event()
+    if workspace is not None:
+        work_dirs = [workspace.subdir(f"candidate-{index + 1}") for index in range(len(plans))]
+        deps = get_dependency_cache()
+    else:
+        work_dirs = [tempfile.mkdtemp(prefix="ai_agent_") for _ in plans]
+        deps = None
+    # Output is only shown for the winner, so nothing is echoed while the race runs
+    captures = [OutputCapture(limit_bytes=output_limit) for _ in plans]
+
+    def run_candidate(index):
+        if is_dangerous(plans[index]):
+            raise ValueError("refused a potentially dangerous shell command")
+        return run_plan(plans[index], work_dirs[index], timeout=timeout,
+                        capture=captures[index], cancel=cancel, deps=deps)
+
+    winner = None
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=len(plans)) as pool:
+            futures = {pool.submit(run_candidate, index): index for index in range(len(plans))}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = results[index] = finish_result(future.result())
+                except Exception as e:
+                    print(f"❌ Plan {index + 1}: {e}")
+                    results[index] = failed_result(str(e))
+                    continue
+                if winner is None and result["success"]:
+                    winner = index
+                    cancel.set()
+                    print(f"🏆 Plan {index + 1} succeeded ({format_usage(result)}); cancelling the rest")
+                elif result.get("cancelled"):
+                    print(f"⏹️ Plan {index + 1} cancelled")
+                else:
+                    print(f"❌ Plan {index + 1} failed ({format_usage(result)})")
+    finally:
+        if workspace is None:
+            for work_dir in work_dirs:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Show the winner's output, or the first failure's so the user can see what went wrong
+    shown = winner if winner is not None else min(results)
+    result = results[shown]
+    print(f"\n📤 Output of plan {shown + 1}:\n", result["stdout"])
+    if result["stderr"]:
+        print("\n⚠️ Errors:\n", result["stderr"])
+    print_stop_reason(result, timeout, output_limit)
+    return shown, result
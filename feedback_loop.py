@@ -1,8 +1,10 @@
 # feedback_loop.py
 def feedback_loop(success):
+    """True when the agent should stop: the task succeeded, or the user declined a retry."""
     if success:
         print("\n🎉 Task completed successfully!")
         return True
     else:
         user_feedback = input("\n❌ Task failed. Do you want the agent to retry? (yes/no): ").strip().lower()
-        return user_feedback != 'no'
+        # Stop only on an explicit "no"; any other answer retries
+        return user_feedback == 'no'
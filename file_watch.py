@@ -0,0 +1,251 @@
+# file_watch.py
+import os
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import difflib
+from typing import Dict, List, Optional, Tuple
+
+from project_index import DEFAULT_EXCLUDE_PATTERNS, is_excluded, read_text
+
+# A burst of saves (editor temp files, formatters, git checkouts) settles within this
+DEBOUNCE_SECONDS = 0.3
+# Flush a change even if saves keep coming for this long
+MAX_DEBOUNCE_SECONDS = 2.0
+# How often the polling watcher scans, where inotify is unavailable
+POLL_INTERVAL = 1.0
+
+# inotify(7) event bits
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MODIFY
+_EVENT = struct.Struct("iIII")
+
+
+def watched_files(paths: List[str], exclude: Optional[List[str]] = None) -> List[str]:
+    """The files under `paths` (files or directories), skipping excluded names as --context does."""
+    patterns = DEFAULT_EXCLUDE_PATTERNS + list(exclude or [])
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            rel_dir = os.path.relpath(dirpath, path)
+            dirnames[:] = sorted(d for d in dirnames if not is_excluded(os.path.join(rel_dir, d), patterns))
+            files.extend(os.path.normpath(os.path.join(dirpath, name)) for name in sorted(filenames)
+                         if not is_excluded(os.path.join(rel_dir, name), patterns))
+    return files
+
+
+class Snapshot:
+    """The text of every watched file, re-read only when its size or mtime changes."""
+
+    def __init__(self, paths: List[str], exclude: Optional[List[str]] = None):
+        self.paths = paths
+        self.exclude = exclude
+        self.files: Dict[str, str] = {}
+        self._stats: Dict[str, Tuple[int, int]] = {}
+
+    def refresh(self) -> "Snapshot":
+        """A new snapshot of the files as they are now; this one is left unchanged."""
+        current = Snapshot(self.paths, self.exclude)
+        for path in watched_files(self.paths, self.exclude):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # deleted since the walk, or a dangling link
+            stat = (st.st_size, st.st_mtime_ns)
+            if self._stats.get(path) == stat:
+                text = self.files.get(path)
+            else:
+                text = read_text(path)
+            if text is not None:
+                current.files[path] = text
+                current._stats[path] = stat
+        return current
+
+    def diff(self, newer: "Snapshot", context_lines: int = 3) -> str:
+        """Unified diff from this snapshot to `newer`, with created and deleted files in full."""
+        parts = []
+        for path in sorted(set(self.files) | set(newer.files)):
+            old, new = self.files.get(path), newer.files.get(path)
+            if old == new:
+                continue
+            for line in difflib.unified_diff(
+                    (old or "").splitlines(keepends=True), (new or "").splitlines(keepends=True),
+                    "/dev/null" if old is None else f"a/{path}", "/dev/null" if new is None else f"b/{path}",
+                    n=context_lines):
+                parts.append(line if line.endswith("\n") else line + "\n\\ No newline at end of file\n")
+        return "".join(parts)
+
+    def render(self) -> str:
+        """Every file in full, for the first turn."""
+        return "\n\n".join(f"File: {path}\n```\n{text}\n```" for path, text in sorted(self.files.items()))
+
+
+class PollingWatcher:
+    """Notices changes by comparing sizes and mtimes every POLL_INTERVAL seconds."""
+
+    kind = "polling"
+
+    def __init__(self, paths: List[str], exclude: Optional[List[str]] = None, interval: float = POLL_INTERVAL):
+        self.paths = paths
+        self.exclude = exclude
+        self.interval = interval
+        self._state = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        state = {}
+        for path in watched_files(self.paths, self.exclude):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            state[path] = (st.st_size, st.st_mtime_ns)
+        return state
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until something changed (True) or `timeout` seconds passed (False)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            pause = self.interval if deadline is None else min(self.interval, max(0.0, deadline - time.monotonic()))
+            time.sleep(pause)
+            state = self._scan()
+            if state != self._state:
+                self._state = state
+                return True
+        return False
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify on every watched directory, read through libc with ctypes.
+
+    Directories created later are watched as they appear. Events for files outside
+    the watch set (an editor's swap file, an excluded directory) are ignored.
+    """
+
+    kind = "inotify"
+
+    def __init__(self, paths: List[str], exclude: Optional[List[str]] = None):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        # Raises AttributeError where libc has no inotify, e.g. on macOS
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.patterns = DEFAULT_EXCLUDE_PATTERNS + list(exclude or [])
+        self._dirs: Dict[int, str] = {}
+        self._roots: List[str] = []  # watched directories, for the exclude patterns
+        self._files = set()          # individually watched files
+        try:
+            for path in paths:
+                path = os.path.abspath(path)
+                if os.path.isdir(path):
+                    self._roots.append(path)
+                    self._watch_tree(path)
+                else:
+                    self._files.add(path)
+                    self._watch(os.path.dirname(path))
+        except OSError:
+            self.close()
+            raise
+
+    def _watch(self, directory: str) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {directory}")
+        self._dirs[wd] = directory
+
+    def _watch_tree(self, root: str) -> None:
+        for dirpath, dirnames, _ in os.walk(root):
+            self._watch(dirpath)
+            dirnames[:] = [d for d in dirnames if self._relevant(os.path.join(dirpath, d))]
+
+    def _relevant(self, path: str) -> bool:
+        if path in self._files:
+            return True
+        for root in self._roots:
+            if path == root or path.startswith(root + os.sep):
+                return not is_excluded(os.path.relpath(path, root), self.patterns)
+        return False
+
+    def _drain(self) -> bool:
+        """Read pending events; whether any of them touched a watched file."""
+        relevant = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return relevant
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    relevant = True  # events were lost; let the snapshot sort it out
+                    continue
+                directory = self._dirs.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name)) if name else directory
+                if not self._relevant(path):
+                    continue
+                relevant = True
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and os.path.isdir(path):
+                    try:
+                        self._watch_tree(path)
+                    except OSError:
+                        pass
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until a watched file changed (True) or `timeout` seconds passed (False)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return False
+            if self._drain():
+                return True
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def open_watcher(paths: List[str], exclude: Optional[List[str]] = None):
+    """An inotify watcher where the platform has one, else a polling watcher.
+
+    GEMINI_WATCH_POLL=1 forces polling, for file systems that do not deliver
+    inotify events (network mounts, some container volumes).
+    """
+    if os.environ.get("GEMINI_WATCH_POLL") != "1":
+        try:
+            return InotifyWatcher(paths, exclude)
+        except (AttributeError, OSError):
+            pass
+    return PollingWatcher(paths, exclude)
+
+
+def wait_for_change(watcher, debounce: float = DEBOUNCE_SECONDS,
+                    max_wait: float = MAX_DEBOUNCE_SECONDS) -> None:
+    """Block until a change, then until the burst of saves around it has settled."""
+    watcher.wait()
+    settle_by = time.monotonic() + max_wait
+    while time.monotonic() < settle_by and watcher.wait(max(0.0, min(debounce, settle_by - time.monotonic()))):
+        pass
+
@@ -0,0 +1,344 @@
+# gemini_client.py
+import os
+import json
+import time
+import threading
+from typing import Optional, Dict, Any, Iterator, List, TYPE_CHECKING
+
+from rate_limiter import RateLimiter, RetryPolicy, RETRY_STATUSES, estimate_tokens
+import tracing
+import cancellation
+
+if TYPE_CHECKING:
+    import requests
+
+API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1")
+# cachedContents, and requests that reference a cache, are served by the beta API
+CACHE_API_BASE = os.environ.get("GEMINI_CACHE_API_BASE")
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+# Connect fails fast; read covers the time the model spends generating
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get("GEMINI_CONNECT_TIMEOUT", "5"))
+DEFAULT_READ_TIMEOUT = float(os.environ.get("GEMINI_READ_TIMEOUT", "30"))
+DEFAULT_POOL_SIZE = int(os.environ.get("GEMINI_POOL_SIZE", "4"))
+# Longest a request waits for a pooled connection to come free before failing, so a
+# response that is never closed cannot stall every later request
+DEFAULT_POOL_TIMEOUT = float(os.environ.get("GEMINI_POOL_TIMEOUT", "120"))
+
+# Client-side budget; 0 leaves that limit off
+DEFAULT_RPM = float(os.environ.get("GEMINI_RPM", "0"))
+DEFAULT_TPM = float(os.environ.get("GEMINI_TPM", "0"))
+DEFAULT_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", "4"))
+
+
+class GeminiResponseError(ValueError):
+    """The API answered, but not with a response we know how to read."""
+
+
+def bounded_pool_classes(bases: Dict[str, Any], pool_timeout: float) -> Dict[str, Any]:
+    """Subclasses of the given urllib3 pools that wait at most pool_timeout seconds for a free connection.
+
+    requests never passes urllib3 a pool timeout, so with pool_block a pool whose
+    connections were all leaked would otherwise make every later request wait forever.
+    """
+    from urllib3.exceptions import EmptyPoolError
+
+    classes = {}
+    for scheme, base in bases.items():
+        class BoundedPool(base):
+            def _get_conn(self, timeout=None):
+                try:
+                    return super()._get_conn(pool_timeout if timeout is None else timeout)
+                except EmptyPoolError:
+                    raise EmptyPoolError(self, f"No pooled connection came free within {pool_timeout:g}s; "
+                                               f"all of them are still in use") from None
+
+        BoundedPool.__name__ = f"Bounded{base.__name__}"
+        classes[scheme] = BoundedPool
+    return classes
+
+
+class GeminiClient:
+    """Long-lived HTTP client with a keep-alive connection pool for the Gemini API."""
+
+    def __init__(self, base_url: Optional[str] = None,
+                 connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None,
+                 pool_size: Optional[int] = None,
+                 limiter: Optional[RateLimiter] = None,
+                 retry: Optional[RetryPolicy] = None,
+                 cache_base_url: Optional[str] = None,
+                 pool_timeout: Optional[float] = None):
+        self.base_url = (base_url or API_BASE).rstrip("/")
+        self.cache_base_url = (cache_base_url or CACHE_API_BASE or beta_base(self.base_url)).rstrip("/")
+        self.connect_timeout = connect_timeout or DEFAULT_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or DEFAULT_READ_TIMEOUT
+        self.pool_size = pool_size or DEFAULT_POOL_SIZE
+        self.pool_timeout = pool_timeout or DEFAULT_POOL_TIMEOUT
+
+        # requests is imported here rather than at module load so `app.py --help` stays fast
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        # One host, so one pool; pool_block keeps concurrent callers within pool_size sockets
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                                    pool_block=True, max_retries=0)
+        if tracing.get_tracer() is not None:
+            # Connections that report their DNS, TCP and TLS time to the current trace span
+            self._adapter.poolmanager.pool_classes_by_scheme = tracing.timed_pool_classes()
+        # Pools that let a cancelled request (a hedge that lost, a query stopped with Ctrl-C) be aborted
+        self._adapter.poolmanager.pool_classes_by_scheme = cancellation.cancellable_pool_classes(
+            self._adapter.poolmanager.pool_classes_by_scheme)
+        self._adapter.poolmanager.pool_classes_by_scheme = bounded_pool_classes(
+            self._adapter.poolmanager.pool_classes_by_scheme, self.pool_timeout)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+        self.limiter = limiter or RateLimiter(DEFAULT_RPM, DEFAULT_TPM)
+        self.retry = retry or RetryPolicy(max_retries=DEFAULT_MAX_RETRIES)
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._retries = 0
+        self._throttled = 0
+        self._rate_wait = 0.0
+        self.last_request_reused = None
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def settings(self) -> Dict[str, Any]:
+        """The constructor arguments this client was built with, e.g. to rebuild it with a bigger pool."""
+        return {"base_url": self.base_url, "cache_base_url": self.cache_base_url,
+                "connect_timeout": self.connect_timeout, "read_timeout": self.read_timeout,
+                "pool_size": self.pool_size, "pool_timeout": self.pool_timeout,
+                "limiter": self.limiter, "retry": self.retry}
+
+    def url_for(self, model: str, method: str, api_key: str, **params: str) -> str:
+        """Build the REST URL for a model method such as generateContent."""
+        query = "".join(f"&{name}={value}" for name, value in params.items())
+        return f"{self.base_url}/models/{model}:{method}?key={api_key}{query}"
+
+    def _content_url(self, payload: Dict[str, Any], model: str, method: str, api_key: str, **params: str) -> str:
+        url = self.url_for(model, method, api_key, **params)
+        if "cachedContent" in payload:
+            return self.cache_base_url + url[len(self.base_url):]
+        return url
+
+    def _connections_opened(self) -> int:
+        """Total number of sockets opened by the pool since the client was created."""
+        pools = self._adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def _send(self, url: str, payload: Dict[str, Any], stream: bool) -> "requests.Response":
+        span = tracing.current_span()
+        opened_before = self._connections_opened()
+        if span is None:
+            response = self.session.post(url, json=payload, timeout=self.timeout, stream=stream)
+        else:
+            body = json.dumps(payload).encode("utf-8")
+            setup_before = span["dns_ms"] + span["connect_ms"] + span["tls_ms"]
+            span["attempts"] += 1
+            span["request_bytes"] += len(body)
+            response = self.session.post(url, data=body, timeout=self.timeout, stream=stream)
+            # elapsed runs from sending to parsed headers and includes any new connection
+            setup_ms = span["dns_ms"] + span["connect_ms"] + span["tls_ms"] - setup_before
+            span["ttfb_ms"] = round(max(0.0, response.elapsed.total_seconds() * 1000 - setup_ms), 2)
+            span["status"] = response.status_code
+        # Under concurrent use this attribution is approximate; the totals in stats() stay exact
+        self.last_request_reused = self._connections_opened() == opened_before
+        if span is not None:
+            span["reused_connection"] = self.last_request_reused
+        with self._lock:
+            self._requests += 1
+        return response
+
+    def post(self, url: str, payload: Dict[str, Any], stream: bool = False,
+             max_retries: Optional[int] = None) -> "requests.Response":
+        """POST a JSON payload within the rate budget, retrying throttling and transient errors.
+
+        Connection failures and 429/5xx responses are retried with jittered exponential
+        backoff (or the server's Retry-After). The last response is returned as-is once
+        retries run out, so callers still see the final status. `max_retries` overrides
+        the retry policy for this call, e.g. 0 when the caller fails over elsewhere.
+        """
+        import requests
+
+        if max_retries is None:
+            max_retries = self.retry.max_retries
+        tokens = estimate_tokens(payload)
+        span = tracing.current_span()
+        attempt = 0
+        while True:
+            cancellation.check()
+            waited = self.limiter.acquire(tokens)
+            if waited:
+                with self._lock:
+                    self._rate_wait += waited
+                if span is not None:
+                    span["rate_limit_wait_ms"] += waited * 1000
+            try:
+                response = self._send(url, payload, stream)
+            except requests.exceptions.ConnectionError:
+                if attempt >= max_retries or cancellation.cancelled():
+                    raise
+                delay = self.retry.delay(attempt)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= max_retries:
+                    return response
+                delay = self.retry.delay(attempt, response.headers.get("Retry-After"))
+                if response.status_code == 429:
+                    with self._lock:
+                        self._throttled += 1
+                    # Every CLI process on the host backs off, not just this one
+                    self.limiter.block_for(delay)
+                response.close()
+            with self._lock:
+                self._retries += 1
+            if span is not None:
+                span["retries"] += 1
+            attempt += 1
+            time.sleep(delay)
+
+    def generate_content(self, payload: Dict[str, Any], api_key: str, model: str = DEFAULT_MODEL,
+                         max_retries: Optional[int] = None) -> Dict[str, Any]:
+        """Call :generateContent and return the decoded JSON body."""
+        response = self.post(self._content_url(payload, model, "generateContent", api_key), payload,
+                             max_retries=max_retries)
+        response.raise_for_status()
+        data = response.json()
+        span = tracing.current_span()
+        if span is not None:
+            span["response_bytes"] += len(response.content)
+            record_usage(span, data)
+        return data
+
+    def stream_generate_content(self, payload: Dict[str, Any], api_key: str, model: str = DEFAULT_MODEL,
+                                max_retries: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Call :streamGenerateContent over SSE and yield each decoded chunk as it arrives."""
+        url = self._content_url(payload, model, "streamGenerateContent", api_key, alt="sse")
+        response = self.post(url, payload, stream=True, max_retries=max_retries)
+        span = tracing.current_span()
+        try:
+            response.raise_for_status()
+            if span is None:
+                yield from iter_sse_events(response)
+                return
+            started = time.perf_counter()
+            for event in iter_sse_events(response, span):
+                if span["first_chunk_ms"] is None:
+                    # From the headers to the first decoded chunk, on top of ttfb
+                    span["first_chunk_ms"] = round(span["ttfb_ms"] + (time.perf_counter() - started) * 1000, 2)
+                record_usage(span, event)
+                yield event
+        finally:
+            response.close()
+
+    def create_cached_content(self, contents: List[Dict[str, Any]], api_key: str,
+                              model: str = DEFAULT_MODEL, ttl: float = 3600) -> Dict[str, Any]:
+        """Upload `contents` once as a cachedContents resource and return it (its `name` in particular)."""
+        payload = {"model": f"models/{model}", "contents": contents, "ttl": f"{int(ttl)}s"}
+        response = self.post(f"{self.cache_base_url}/cachedContents?key={api_key}", payload)
+        response.raise_for_status()
+        return response.json()
+
+    def generate_text(self, prompt: str, api_key: str, model: str = DEFAULT_MODEL,
+                      generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """Send a single-turn prompt and return the text of the first candidate."""
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        data = self.generate_content(payload, api_key, model)
+        text = extract_text(data)
+        if text is None:
+            raise GeminiResponseError(f"Error parsing response from Gemini API. Raw response:\n{json.dumps(data, indent=2)}")
+        return text
+
+    def stats(self) -> Dict[str, int]:
+        """Connection reuse and retry counters for the lifetime of this client."""
+        with self._lock:
+            requests_sent = self._requests
+            retries = self._retries
+            throttled = self._throttled
+            rate_wait = self._rate_wait
+        opened = self._connections_opened()
+        return {
+            "requests": requests_sent,
+            "new_connections": opened,
+            "reused_connections": max(0, requests_sent - opened),
+            "retries": retries,
+            "throttled": throttled,
+            "rate_limit_wait_s": round(rate_wait, 2),
+        }
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def beta_base(base_url: str) -> str:
+    """The v1beta counterpart of a v1 API base URL."""
+    return base_url[:-len("/v1")] + "/v1beta" if base_url.endswith("/v1") else base_url
+
+
+def extract_text(data: Dict[str, Any]) -> Optional[str]:
+    """Return the text of the first candidate in a Gemini response, or None."""
+    if "candidates" in data and len(data["candidates"]) > 0:
+        content = data["candidates"][0].get("content", {})
+        if "parts" in content and len(content["parts"]) > 0:
+            return content["parts"][0].get("text")
+    return None
+
+
+def record_usage(span: Dict[str, Any], data: Dict[str, Any]) -> None:
+    """Copy the token counts the API reports in usageMetadata into a trace span."""
+    usage = data.get("usageMetadata")
+    if usage:
+        span["prompt_tokens"] = usage.get("promptTokenCount", span["prompt_tokens"])
+        span["output_tokens"] = usage.get("candidatesTokenCount", span["output_tokens"])
+        span["cached_tokens"] = usage.get("cachedContentTokenCount", span["cached_tokens"])
+
+
+def iter_sse_events(response: "requests.Response",
+                    span: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """Decode the `data:` events of a server-sent event stream as JSON objects.
+
+    With a trace span, the size of the decoded stream is added to its response_bytes.
+    """
+    # chunk_size=None hands over bytes as soon as the server flushes them
+    for line in response.iter_lines(chunk_size=None):
+        if span is not None:
+            span["response_bytes"] += len(line) + 1
+        if not line:
+            continue
+        line = line.decode("utf-8") if isinstance(line, bytes) else line
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data and data != "[DONE]":
+            yield json.loads(data)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> GeminiClient:
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClient()
+        return _client
+
+
+def configure_client(**kwargs) -> GeminiClient:
+    """Replace the process-wide client, e.g. to apply timeouts from the command line."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = GeminiClient(**kwargs)
+        return _client
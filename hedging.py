@@ -0,0 +1,180 @@
+# hedging.py
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Any, Optional, TypeVar
+
+import tracing
+from cancellation import CancelScope, current_scope, running_in
+
+# Hedge once a call has been waiting longer than this percentile of recent calls
+DEFAULT_PERCENTILE = float(os.environ.get("GEMINI_HEDGE_PERCENTILE", "90"))
+# At most this fraction of calls may send a duplicate request
+DEFAULT_MAX_RATE = float(os.environ.get("GEMINI_HEDGE_MAX_RATE", "0.1"))
+# Waiting time before hedging until enough latencies have been seen to take a percentile
+DEFAULT_INITIAL_DELAY = float(os.environ.get("GEMINI_HEDGE_INITIAL_DELAY", "5"))
+# Never hedge sooner than this, however fast calls usually are
+MIN_DELAY = 0.25
+MIN_SAMPLES = 10
+WINDOW = 200
+
+T = TypeVar("T")
+
+
+class Hedger:
+    """Sends a duplicate of a slow call and takes whichever answers first.
+
+    A call that has not answered after the configured percentile of recent latencies
+    gets one duplicate; the first successful answer wins and the other attempt is
+    cancelled. Hedges are capped at max_rate of all calls so quota use stays bounded.
+    """
+
+    def __init__(self, percentile: float = DEFAULT_PERCENTILE, max_rate: float = DEFAULT_MAX_RATE,
+                 initial_delay: float = DEFAULT_INITIAL_DELAY):
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.initial_delay = initial_delay
+        self._samples = deque(maxlen=WINDOW)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_won = 0
+        self.capped = 0
+
+    def delay(self) -> float:
+        """Seconds to wait for the first attempt before hedging."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < MIN_SAMPLES:
+            return self.initial_delay
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100.0))
+        return max(MIN_DELAY, samples[index])
+
+    def _record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            # One hedge is always allowed so a slow first call can be rescued
+            if self.hedged + 1 > self.max_rate * self.calls + 1:
+                self.capped += 1
+                return False
+            self.hedged += 1
+            return True
+
+    def run(self, call: Callable[[], T], discard: Optional[Callable[[T], None]] = None) -> T:
+        """Return call()'s result, hedging it with a second call() if the first is slow.
+
+        `call` should return as soon as the response starts arriving (for a stream,
+        after its first event). `discard` releases the result of an attempt that
+        succeeded after the other one had already won, e.g. closes its stream.
+        """
+        with self._lock:
+            self.calls += 1
+        span = tracing.current_span()
+        results: "queue.Queue" = queue.Queue()
+        scopes = []
+        settled = threading.Lock()
+        winner = []
+
+        def attempt(index, scope):
+            tracing.set_current_span(span)
+            started = time.perf_counter()
+            try:
+                with running_in(scope):
+                    ok, value = True, call()
+            except Exception as e:
+                ok, value = False, e
+            finally:
+                tracing.set_current_span(None)
+            # Decided here rather than by the caller, so a late success can never leak
+            with settled:
+                won = ok and not winner
+                if won:
+                    winner.append(index)
+            if ok and not won and discard is not None:
+                discard(value)
+            results.put((index, ok, value, time.perf_counter() - started, won))
+
+        # Cancelling the caller (e.g. a background query) cancels both attempts
+        parent = current_scope()
+
+        def start(index):
+            scope = CancelScope(parent)
+            scopes.append(scope)
+            threading.Thread(target=attempt, args=(index, scope), daemon=True).start()
+
+        try:
+            return self._race(start, results, scopes, span)
+        except KeyboardInterrupt:
+            # Ctrl-C on the waiting thread; the attempts are not left running behind it
+            for scope in scopes:
+                scope.cancel()
+            raise
+
+    def _race(self, start, results: "queue.Queue", scopes, span):
+        started = time.perf_counter()
+        start(0)
+        try:
+            return self._finish(results.get(timeout=self.delay()))
+        except queue.Empty:
+            pass
+        if not self._may_hedge():
+            return self._finish(results.get())
+
+        start(1)
+        if span is not None:
+            span["hedged"] = True
+        failure = None
+        for _ in range(2):
+            index, ok, value, elapsed, won = results.get()
+            if won:
+                scopes[1 - index].cancel()
+                if index == 1:
+                    with self._lock:
+                        self.hedge_won += 1
+                    if span is not None:
+                        span["hedge_won"] = True
+                    # The first attempt took at least this long; keep the tail in the percentile
+                    self._record(time.perf_counter() - started)
+                else:
+                    self._record(elapsed)
+                return value
+            failure = failure or value
+        raise failure
+
+    def _finish(self, outcome):
+        index, ok, value, elapsed, won = outcome
+        if not ok:
+            raise value
+        self._record(elapsed)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls, hedged, won, capped = self.calls, self.hedged, self.hedge_won, self.capped
+        return {"calls": calls, "hedged": hedged, "hedge_won": won, "capped": capped,
+                "delay_ms": round(self.delay() * 1000, 1)}
+
+
+_hedger: Optional[Hedger] = None
+
+
+def get_hedger() -> Optional[Hedger]:
+    """The process-wide hedger, or None when hedging is off."""
+    return _hedger
+
+
+def enable_hedging(**kwargs) -> Hedger:
+    """Hedge calls from now on; clients created before this cannot abort a losing attempt."""
+    global _hedger
+    _hedger = Hedger(**kwargs)
+    return _hedger
+
+
+def disable_hedging() -> None:
+    global _hedger
+    _hedger = None
@@ -0,0 +1,169 @@
+# history_view.py
+import sys
+import shutil
+import textwrap
+from typing import List, Tuple
+
+# ANSI control sequences
+CSI = "\x1b["
+CLEAR_SCREEN = CSI + "2J"
+CLEAR_LINE = CSI + "2K"
+HIDE_CURSOR = CSI + "?25l"
+SHOW_CURSOR = CSI + "?25h"
+RESET = CSI + "0m"
+
+HEADER_ROWS = 2  # title, separator
+FOOTER_ROWS = 1  # scroll hint
+PAGE_SIZE = 50   # messages fetched from the store at a time
+
+
+def move_to(row: int) -> str:
+    """Cursor to the start of a 0-based screen row."""
+    return f"{CSI}{row + 1};1H"
+
+
+class HistoryView:
+    """Scrollable, virtualized view of a saved session drawn with ANSI cursor control.
+
+    Messages are wrapped to the terminal width once and kept in a line buffer that is
+    filled page by page as the user scrolls down. Each frame is diffed against what is
+    already on screen: scrolling shifts the body with a scroll region and only the rows
+    that actually changed are rewritten, in a single write, without spawning processes.
+    """
+
+    def __init__(self, store, session_id: int, user_prefix: str = "▷ ", ai_prefix: str = "◆ ",
+                 user_color: str = "", ai_color: str = "", muted_color: str = "", out=None,
+                 use_scroll_region: bool = True):
+        self.store = store
+        self.session_id = session_id
+        self.user_prefix = user_prefix
+        self.ai_prefix = ai_prefix
+        self.user_color = user_color
+        self.ai_color = ai_color
+        self.muted_color = muted_color
+        self.out = out or sys.stdout
+        # Legacy Windows consoles (via colorama) understand cursor moves but not scroll regions
+        self.use_scroll_region = use_scroll_region
+
+        self.top = 0  # first buffer line shown
+        self.lines: List[str] = []
+        self.loaded_messages = 0
+        self.total_messages = 0
+        self.screen: List[str] = []  # rows currently drawn
+        self.drawn_top = 0  # self.top when self.screen was drawn
+        self.size: Tuple[int, int] = (0, 0)
+
+    # Line buffer
+
+    def _wrap_message(self, prompt: str, response: str) -> List[str]:
+        width = max(20, self.size[0] - 1)
+        lines = []
+        for prefix, color, text in ((self.user_prefix, self.user_color, prompt),
+                                    (self.ai_prefix, self.ai_color, response)):
+            indent = " " * len(prefix)
+            first = True
+            for paragraph in text.splitlines() or [""]:
+                wrapped = textwrap.wrap(paragraph, width=width - len(prefix), replace_whitespace=False,
+                                        drop_whitespace=False) or [""]
+                for piece in wrapped:
+                    lines.append(f"{color}{prefix if first else indent}{piece}{RESET}")
+                    first = False
+        lines.append(f"{self.muted_color}{'─' * min(width, 50)}{RESET}")
+        return lines
+
+    def _ensure_lines(self, needed: int) -> None:
+        """Wrap more messages until the buffer holds `needed` lines or the session ends."""
+        while len(self.lines) < needed and self.loaded_messages < self.total_messages:
+            rows = self.store.page(self.session_id, self.loaded_messages, PAGE_SIZE)
+            if not rows:
+                break
+            for prompt, response in rows:
+                self.lines.extend(self._wrap_message(prompt, response))
+            self.loaded_messages += len(rows)
+
+    @property
+    def body_rows(self) -> int:
+        return max(1, self.size[1] - HEADER_ROWS - FOOTER_ROWS)
+
+    def _max_top(self) -> int:
+        self._ensure_lines(self.top + 2 * self.body_rows)
+        return max(0, len(self.lines) - self.body_rows)
+
+    # Screen
+
+    def open(self) -> None:
+        """Take over the terminal and draw the first frame."""
+        self.out.write(HIDE_CURSOR + CLEAR_SCREEN)
+        self.screen = []
+        self.render()
+
+    def close(self) -> None:
+        """Hand the terminal back: reset the scroll region and clear the view."""
+        self.out.write(f"{CSI}r{RESET}{CLEAR_SCREEN}{move_to(0)}{SHOW_CURSOR}")
+        self.out.flush()
+
+    def scroll(self, delta: int) -> None:
+        self.top = max(0, min(self._max_top(), self.top + delta))
+        self.render()
+
+    def page(self, direction: int) -> None:
+        self.scroll(direction * self.body_rows)
+
+    def _frame(self) -> List[str]:
+        self._ensure_lines(self.top + self.body_rows)
+        body = self.lines[self.top:self.top + self.body_rows]
+        more = self.loaded_messages < self.total_messages
+        bottom = self.top + len(body)
+        total = f"{len(self.lines)}{'+' if more else ''}"
+        title = (f"Conversation ({self.total_messages} messages) "
+                 f"{self.muted_color}lines {self.top + 1}-{bottom} of {total}{RESET}")
+        hints = []
+        if self.top > 0:
+            hints.append("↑ more above")
+        if more or bottom < len(self.lines):
+            hints.append("↓ more below")
+        hints.append("Esc to return")
+        footer = f"{self.muted_color}{'  ·  '.join(hints)}{RESET}"
+        separator = f"{self.muted_color}{'─' * min(self.size[0] - 1, 50)}{RESET}"
+        return [title, separator] + body + [""] * (self.body_rows - len(body)) + [footer]
+
+    def render(self) -> None:
+        """Draw the current frame, rewriting only rows that differ from the screen."""
+        size = tuple(shutil.get_terminal_size((80, 24)))
+        if size != self.size:
+            # New width: re-wrap from scratch and repaint everything
+            self.size = size
+            self.total_messages = self.store.count(self.session_id)
+            self.lines = []
+            self.loaded_messages = 0
+            self.top = min(self.top, self._max_top())
+            self.screen = []
+            self.out.write(CLEAR_SCREEN)
+        else:
+            self.total_messages = self.store.count(self.session_id)
+
+        frame = self._frame()
+        parts = []
+        shift = self.drawn_top - self.top
+        if self.use_scroll_region and self.screen and shift and abs(shift) < self.body_rows:
+            # Move the body with the terminal's scroll region instead of repainting it
+            first, last = HEADER_ROWS, HEADER_ROWS + self.body_rows - 1
+            parts.append(f"{CSI}{first + 1};{last + 1}r")
+            parts.append(f"{CSI}{abs(shift)}{'T' if shift > 0 else 'S'}")
+            parts.append(f"{CSI}r")
+            body = self.screen[first:last + 1]
+            if shift > 0:
+                body = [None] * shift + body[:-shift]
+            else:
+                body = body[-shift:] + [None] * (-shift)
+            self.screen[first:last + 1] = body
+
+        for row, text in enumerate(frame):
+            if row < len(self.screen) and self.screen[row] == text:
+                continue
+            parts.append(f"{move_to(row)}{CLEAR_LINE}{text}")
+        if parts:
+            self.out.write("".join(parts))
+            self.out.flush()
+        self.screen = frame
+        self.drawn_top = self.top
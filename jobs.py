@@ -0,0 +1,116 @@
+# jobs.py
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from cancellation import CancelScope, running_in
+
+
+class Job:
+    """One background query and, once it finishes, its answer or error."""
+
+    def __init__(self, number: int, prompt: str, history: Optional[List[Dict[str, Any]]] = None,
+                 context: Any = None):
+        self.number = number
+        self.prompt = prompt
+        self.history = history
+        self.context = context  # whatever the caller needs when the answer arrives, e.g. its session
+        self.scope = CancelScope()
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.response: Optional[str] = None
+        self.error: Optional[Exception] = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.scope.cancelled
+
+    def elapsed(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+
+class JobQueue:
+    """Queries running on their own threads while the prompt stays free for the next one.
+
+    `record(job)` is called on the job's thread as soon as it finishes, so its answer
+    is in the history before the next question is asked. `report(job, idle)` shows
+    the answer: right away when nothing else is printing (idle=True, the user is at
+    the prompt), otherwise once the block wrapped in holding() has finished.
+    Cancelled jobs are neither recorded nor reported.
+    """
+
+    def __init__(self, run: Callable[[Job], str], record: Callable[[Job], None],
+                 report: Callable[[Job, bool], None]):
+        self.run = run
+        self.record = record
+        self.report = report
+        self._jobs: Dict[int, Job] = {}
+        self._next = 0
+        self._held = 0
+        self._ready: List[Job] = []
+        self._lock = threading.Lock()
+
+    def submit(self, prompt: str, history: Optional[List[Dict[str, Any]]] = None, context: Any = None) -> Job:
+        with self._lock:
+            self._next += 1
+            job = Job(self._next, prompt, history, context)
+            self._jobs[job.number] = job
+        # Daemon threads, so a query still running never holds up exiting
+        threading.Thread(target=self._work, args=(job,), daemon=True).start()
+        return job
+
+    def _work(self, job: Job) -> None:
+        try:
+            with running_in(job.scope):
+                job.response = self.run(job)
+        except Exception as e:
+            job.error = e
+        job.finished = time.time()
+        with self._lock:
+            self._jobs.pop(job.number, None)
+        if job.cancelled:
+            return
+        self.record(job)
+        with self._lock:
+            if self._held:
+                self._ready.append(job)
+                return
+        self.report(job, True)
+
+    def pending(self) -> List[Job]:
+        """Jobs still running, oldest first."""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.number)
+
+    def cancel(self, number: int) -> Optional[Job]:
+        """Abort a running job; returns it, or None if no such job is running."""
+        with self._lock:
+            job = self._jobs.pop(number, None)
+        if job is not None:
+            job.scope.cancel()
+        return job
+
+    def cancel_all(self) -> int:
+        jobs = self.pending()
+        for job in jobs:
+            self.cancel(job.number)
+        return len(jobs)
+
+    @contextmanager
+    def holding(self) -> Iterator[None]:
+        """Answers that arrive during the block are reported after it, not in the middle of its output."""
+        with self._lock:
+            self._held += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._held -= 1
+                ready, self._ready = (self._ready, []) if not self._held else ([], self._ready)
+            for job in ready:
+                self.report(job, False)
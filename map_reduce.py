@@ -0,0 +1,236 @@
+# map_reduce.py
+import os
+import sys
+import time
+from collections import deque
+from typing import Callable, Dict, Any, Iterator, List, Optional
+
+# Characters of input per map request (about 100k tokens)
+DEFAULT_CHUNK_CHARS = int(os.environ.get("GEMINI_MAP_CHUNK_CHARS", "400000"))
+# Lines repeated at the start of the next chunk, so nothing is lost at a cut
+OVERLAP_LINES = 20
+OVERLAP_CHARS = 4000
+# Notes merged by one reduce request at most
+REDUCE_FANIN = 8
+# A cut is looked for in this trailing fraction of a chunk before falling back to a hard cut
+BOUNDARY_WINDOW = 0.25
+
+NOTHING_RELEVANT = "NOTHING RELEVANT"
+
+MAP_PROMPT = """You are reading part {index} of a large input ({source}, lines {start}-{end}). The question about the whole input is:
+{question}
+
+Extract everything in this part that helps answer the question: relevant facts, errors, names, numbers and line numbers, quoting briefly where it matters. Do not answer from general knowledge and do not guess about other parts. If nothing in this part is relevant, reply exactly: {nothing}
+
+--- Part {index} (lines {start}-{end}) ---
+{text}"""
+
+REDUCE_PROMPT = """Below are notes taken from consecutive parts of a large input ({source}) for this question:
+{question}
+
+Merge them into one set of notes. Keep every relevant detail and line reference, drop repetition (neighbouring parts overlap by a few lines), and do not add anything that is not in the notes.
+
+{notes}"""
+
+FINAL_PROMPT = """The input {source} was too large to send at once, so it was read in {parts} parts and the notes below were taken from every part. Using only these notes, answer the question. Cite line numbers where the notes give them.{missing}
+
+Question: {question}
+
+{notes}"""
+
+SINGLE_PROMPT = """Input ({source}):
+{text}
+
+Question: {question}"""
+
+def _cut_index(lines: List[str]) -> int:
+    """Where to end a full chunk: before the last syntax boundary near its end, else at its end."""
+    lowest = max(1, int(len(lines) * (1 - BOUNDARY_WINDOW)))
+    for i in range(len(lines) - 1, lowest - 1, -1):
+        # A blank line, or an unindented line after an indented one (a new def, class or block)
+        if not lines[i].strip() or (lines[i][:1] not in (" ", "\t") and lines[i - 1][:1] in (" ", "\t")):
+            return i
+    return len(lines)
+
+
+def iter_chunks(path: str, chunk_chars: int = DEFAULT_CHUNK_CHARS) -> Iterator[Dict[str, Any]]:
+    """Read a file from disk as overlapping chunks of about chunk_chars characters.
+
+    Chunks end on a line boundary, preferably a blank line or the start of a new
+    top-level block, and repeat the last few lines of the previous chunk. Only one
+    chunk is held in memory at a time. Each chunk carries its 1-based line range
+    and how far into the file it ends (`progress`, 0..1).
+    """
+    total = max(1, os.path.getsize(path))
+    overlap_chars = min(OVERLAP_CHARS, chunk_chars // 4)
+    lines: List[str] = []
+    numbers: List[int] = []
+    size = 0
+    fresh = 0  # lines not yet sent in any chunk
+    read = 0
+    index = 0
+
+    def emit(cut):
+        nonlocal lines, numbers, size, fresh, index
+        index += 1
+        chunk = {"index": index, "start": numbers[0], "end": numbers[cut - 1],
+                 "text": "".join(lines[:cut]), "progress": min(1.0, read / total)}
+        # Carry the tail into the next chunk, within both overlap limits
+        keep, carried = cut, 0
+        while keep > 0 and cut - keep < OVERLAP_LINES and carried + len(lines[keep - 1]) <= overlap_chars:
+            keep -= 1
+            carried += len(lines[keep])
+        fresh = len(lines) - cut
+        lines, numbers = lines[keep:], numbers[keep:]
+        size = sum(len(line) for line in lines)
+        return chunk
+
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line_no, line in enumerate(f, 1):
+            read += len(line)
+            # Minified sources and some logs have lines longer than a whole chunk
+            for i in range(0, len(line), chunk_chars):
+                piece = line[i:i + chunk_chars]
+                lines.append(piece)
+                numbers.append(line_no)
+                size += len(piece)
+                fresh += 1
+                if size >= chunk_chars:
+                    yield emit(_cut_index(lines))
+                    # What was left after an early cut can still be a full chunk of long lines
+                    while size >= chunk_chars:
+                        yield emit(len(lines))
+    if fresh:
+        yield emit(len(lines))
+
+
+def _report(message: str, progress: bool) -> None:
+    if progress:
+        print(message, file=sys.stderr, flush=True)
+
+
+def map_chunks(path: str, question: str, query: Callable[[str], str], workers: int,
+               chunk_chars: int = DEFAULT_CHUNK_CHARS, progress: bool = True) -> Dict[str, Any]:
+    """Run the map prompt over every chunk of the file, `workers` requests at a time.
+
+    Chunks are read from disk only as workers free up, so memory stays at a few
+    chunks whatever the file size. Returns the relevant notes in file order, the
+    number of chunks, and the line ranges of chunks whose request failed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    source = os.path.basename(path)
+    result = {"notes": [], "chunks": 0, "failed": []}
+    window = deque()
+    started = time.perf_counter()
+
+    def run(chunk):
+        prompt = MAP_PROMPT.format(index=chunk["index"], source=source, start=chunk["start"], end=chunk["end"],
+                                   question=question, nothing=NOTHING_RELEVANT, text=chunk["text"])
+        return query(prompt)
+
+    def collect(chunk, future):
+        result["chunks"] += 1
+        lines = f"lines {chunk['start']}-{chunk['end']}"
+        try:
+            note = future.result().strip()
+        except Exception as e:
+            result["failed"].append(lines)
+            _report(f"[map {chunk['index']}] {lines}: failed ({e})", progress)
+            return
+        relevant = bool(note) and not note.upper().startswith(NOTHING_RELEVANT)
+        if relevant:
+            result["notes"].append(f"Notes on {lines}:\n{note}")
+        _report(f"[map {chunk['index']}] {lines}: {'relevant' if relevant else 'nothing relevant'} "
+                f"({chunk['progress']:.0%} of file, {time.perf_counter() - started:.1f}s)", progress)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        try:
+            for chunk in iter_chunks(path, chunk_chars):
+                # The chunk text is dropped once its request is done; keep only what collect() needs
+                window.append((dict(chunk, text=None), executor.submit(run, chunk)))
+                if len(window) >= workers * 2:
+                    collect(*window.popleft())
+            while window:
+                collect(*window.popleft())
+        finally:
+            for _, future in window:
+                future.cancel()
+    return result
+
+
+def _groups(notes: List[str], budget_chars: int) -> List[List[str]]:
+    """Consecutive runs of notes, each within budget_chars and REDUCE_FANIN notes."""
+    groups: List[List[str]] = []
+    size = 0
+    for note in notes:
+        if groups and len(groups[-1]) < REDUCE_FANIN and size + len(note) <= budget_chars:
+            groups[-1].append(note)
+            size += len(note)
+        else:
+            groups.append([note])
+            size = len(note)
+    return groups
+
+
+def reduce_notes(notes: List[str], source: str, question: str, query: Callable[[str], str], workers: int,
+                 budget_chars: int = DEFAULT_CHUNK_CHARS, progress: bool = True) -> List[str]:
+    """Merge notes in rounds, each group in one request, until they fit one final prompt.
+
+    A group whose merge fails keeps its notes as they were, so no information is lost;
+    rounds stop once merging no longer shrinks the set.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    level = 0
+    while len(notes) > 1 and (sum(len(note) for note in notes) > budget_chars or len(notes) > REDUCE_FANIN):
+        groups = _groups(notes, budget_chars)
+        if len(groups) == len(notes):
+            break
+        level += 1
+        _report(f"[reduce {level}] merging {len(notes)} notes in {len(groups)} groups", progress)
+
+        def merge(group):
+            if len(group) == 1:
+                return group
+            try:
+                merged = query(REDUCE_PROMPT.format(source=source, question=question,
+                                                    notes="\n\n".join(group))).strip()
+            except Exception as e:
+                _report(f"[reduce {level}] a merge failed ({e}); keeping its notes", progress)
+                return group
+            return [merged] if merged else group
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            notes = [note for merged in executor.map(merge, groups) for note in merged]
+    return notes
+
+
+def map_reduce_prompt(path: str, question: str, query: Callable[[str], str], workers: int = 4,
+                      chunk_chars: int = DEFAULT_CHUNK_CHARS, progress: bool = True,
+                      force: bool = False) -> Optional[str]:
+    """The prompt that answers `question` about a file of any size.
+
+    A file that fits one chunk is sent as it is, unless `force` is set. A larger one is mapped chunk by
+    chunk and its notes reduced hierarchically; what is returned is the final
+    reduce prompt, which the caller sends (and may stream) like any other query.
+    Returns None when every chunk failed.
+    """
+    source = os.path.basename(path)
+    if not force and os.path.getsize(path) <= chunk_chars:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return SINGLE_PROMPT.format(source=source, text=f.read(), question=question)
+
+    mapped = map_chunks(path, question, query, workers, chunk_chars, progress)
+    if len(mapped["failed"]) == mapped["chunks"]:
+        return None
+    notes = reduce_notes(mapped["notes"], source, question, query, workers, chunk_chars, progress)
+    missing = ""
+    if mapped["failed"]:
+        missing = (f" {len(mapped['failed'])} of the parts could not be read "
+                   f"({', '.join(mapped['failed'][:10])}); say so if it may matter.")
+    if not notes:
+        notes = ["No part of the input had anything relevant to the question."]
+    _report(f"[final] answering from {len(notes)} notes on {mapped['chunks']} parts", progress)
+    return FINAL_PROMPT.format(source=source, parts=mapped["chunks"], missing=missing,
+                               question=question, notes="\n\n".join(notes))
@@ -0,0 +1,107 @@
+# output_capture.py
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+# What is kept in memory of each stream for the feedback step: its start and its end
+DEFAULT_HEAD_BYTES = 16 * 1024
+DEFAULT_TAIL_BYTES = 48 * 1024
+# Total output after which a run is stopped; 0 disables the cap
+DEFAULT_OUTPUT_LIMIT = int(float(os.environ.get("GEMINI_EXEC_OUTPUT_LIMIT_MB", "64")) * 1024 * 1024)
+
+
+class _BoundedBuffer:
+    """First head_bytes and last tail_bytes of a byte stream, in constant memory."""
+
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes) -> None:
+        self.total += len(data)
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data[-self.tail_bytes:]
+            if len(self.tail) > self.tail_bytes:
+                del self.tail[:len(self.tail) - self.tail_bytes]
+
+    def text(self) -> str:
+        omitted = self.total - len(self.head) - len(self.tail)
+        if omitted <= 0:
+            return (bytes(self.head) + bytes(self.tail)).decode("utf-8", "replace")
+        return (self.head.decode("utf-8", "replace")
+                + f"\n... [{omitted} bytes omitted] ...\n"
+                + self.tail.decode("utf-8", "replace"))
+
+
+class OutputCapture:
+    """Collects a child's stdout and stderr as they stream in, with flat memory use.
+
+    Each stream keeps only its head and tail in memory. Every chunk can also be
+    echoed live and appended to a log file. Once the combined output passes
+    limit_bytes, feed() returns False so the caller can stop the child.
+    """
+
+    def __init__(self, limit_bytes: int = DEFAULT_OUTPUT_LIMIT,
+                 head_bytes: int = DEFAULT_HEAD_BYTES, tail_bytes: int = DEFAULT_TAIL_BYTES,
+                 echo: Optional[Callable[[str, bytes], None]] = None,
+                 log_path: Optional[str] = None):
+        self.limit_bytes = limit_bytes
+        self.echo = echo
+        self.buffers: Dict[str, _BoundedBuffer] = {
+            "stdout": _BoundedBuffer(head_bytes, tail_bytes),
+            "stderr": _BoundedBuffer(head_bytes, tail_bytes),
+        }
+        self.log = open(log_path, "ab") if log_path else None
+        self.limit_hit = False
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return sum(buffer.total for buffer in self.buffers.values())
+
+    def feed(self, stream: str, data: bytes) -> bool:
+        """Record a chunk of `stream`; False once the output limit has been exceeded."""
+        with self._lock:
+            if self.limit_hit:
+                return False
+            if self.limit_bytes and self.total + len(data) > self.limit_bytes:
+                data = data[:self.limit_bytes - self.total]
+                self.limit_hit = True
+            self.buffers[stream].write(data)
+            if self.log is not None:
+                self.log.write(data)
+            if self.echo is not None and data:
+                self.echo(stream, data)
+            return not self.limit_hit
+
+    def drain(self, read: Callable[[int], bytes], stream: str,
+              on_limit: Optional[Callable[[], None]] = None) -> None:
+        """Read `stream` until EOF, calling on_limit once if the output cap is hit.
+
+        Output past the cap is read and discarded, so the child never blocks on a
+        full pipe while it is being stopped.
+        """
+        over = False
+        while True:
+            data = read(65536)
+            if not data:
+                break
+            if not self.feed(stream, data) and not over:
+                over = True
+                if on_limit is not None:
+                    on_limit()
+
+    def text(self, stream: str) -> str:
+        return self.buffers[stream].text()
+
+    def close(self) -> None:
+        if self.log is not None:
+            self.log.close()
+            self.log = None
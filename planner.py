@@ -1,25 +1,187 @@
-import google.generativeai as genai
 import os
-from dotenv import load_dotenv
+import threading
 
-# Load API Key
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY") or os.getenv("OPENAI_API_KEY")  # Try both for backward compatibility
-if not api_key:
-    print("Warning: No API key found. Please set GEMINI_API_KEY in your environment or .env file.")
-genai.configure(api_key=api_key)
+from gemini_client import get_client, extract_text
+from rate_limiter import estimate_tokens
+from router import get_router, configured_router
+from hedging import get_hedger
 
-def generate_plan(task):
-    prompt = f"""
+# Used with GEMINI_API_KEY when no endpoints file is configured
+PLAN_MODEL = os.environ.get("GEMINI_PLAN_MODEL", "gemini-pro")
+
+# Characters of error output sent back to the planner when a plan fails
+FEEDBACK_CHARS = 2000
+
+REFINE_PROMPT = """Running that failed.
+
+{failure}
+
+Fix the problem and output the complete corrected code. Only output the code, no explanation.
+"""
+
+STEP_REFINE_PROMPT = """Some steps failed.
+
+{failure}
+
+Output the complete corrected plan as JSON in the same form. Keep the steps that worked
+exactly as they were, so they do not need to run again.
+"""
+
+_api_key = None
+
+def get_api_key():
+    """Load the API key from the environment or .env on first use."""
+    global _api_key
+    if _api_key is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _api_key = os.getenv("GEMINI_API_KEY") or os.getenv("OPENAI_API_KEY") or ""  # Try both for backward compatibility
+        if not _api_key and configured_router() is not None:
+            # The endpoints file brings its own keys
+            _api_key = configured_router().endpoints[0].key
+        if not _api_key:
+            print("Warning: No API key found. Please set GEMINI_API_KEY in your environment or .env file.")
+    return _api_key
+
+def plan_prompt(task):
+    return f"""
 You are a coding assistant. Given the task: "{task}", generate the code or shell command(s) needed to perform it.
 Only output the code, no explanation.
 """
+
+# Token usage of every planner request in this process, for measuring cost per task
+_usage = {"requests": 0, "prompt_tokens": 0, "output_tokens": 0}
+_usage_lock = threading.Lock()
+
+def usage():
+    with _usage_lock:
+        return dict(_usage)
+
+def reset_usage():
+    with _usage_lock:
+        for key in _usage:
+            _usage[key] = 0
+
+def _record_usage(contents, data, text):
+    metadata = data.get("usageMetadata") or {}
+    # Fall back to the rough four-characters-per-token estimate if the API omits usage
+    prompt_tokens = metadata.get("promptTokenCount") or estimate_tokens({"contents": contents})
+    output_tokens = metadata.get("candidatesTokenCount") or len(text) // 4 + 1
+    with _usage_lock:
+        _usage["requests"] += 1
+        _usage["prompt_tokens"] += prompt_tokens
+        _usage["output_tokens"] += output_tokens
+
+def _generate(contents, temperature=None):
     try:
+        api_key = get_api_key()
         if not api_key:
             return "Error: No API key provided. Please set GEMINI_API_KEY in your environment or .env file."
-        model = genai.GenerativeModel(model_name="gemini-pro")
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        payload = {"contents": contents}
+        if temperature is not None:
+            payload["generationConfig"] = {"temperature": temperature}
+        # Shares the pooled keep-alive client with app.py, so retries reuse the same connection;
+        # with an endpoints file the router picks the key and model
+        call = lambda: get_router(api_key, PLAN_MODEL).call(
+            lambda endpoint, retries: get_client().generate_content(payload, endpoint.key, endpoint.model, retries))
+        hedger = get_hedger()
+        data = hedger.run(call) if hedger is not None else call()
+        text = extract_text(data)
+        if text is None:
+            return "Error generating plan: the response contained no text"
+        _record_usage(contents, data, text)
+        return text.strip()
     except Exception as e:
         return f"Error generating plan: {e}"
 
+def generate_plan(task, temperature=None):
+    return _generate([{"role": "user", "parts": [{"text": plan_prompt(task)}]}], temperature)
+
+def describe_failure(result):
+    """Compact account of a failed run for the planner: exit status, error and output tails."""
+    lines = []
+    if result.get("error"):
+        lines.append(f"The plan was not run: {result['error']}.")
+    elif result.get("timed_out"):
+        lines.append("It was stopped by the time limit before finishing.")
+    elif result.get("output_limited"):
+        lines.append("It was stopped for printing too much output.")
+    else:
+        lines.append(f"It exited with code {result.get('exit_code')}.")
+    error = result.get("exception") or result.get("stderr", "")
+    if error.strip():
+        lines.append(f"Error output:\n{error[-FEEDBACK_CHARS:]}")
+    if result.get("stdout", "").strip():
+        lines.append(f"Last lines of standard output:\n{result['stdout'][-FEEDBACK_CHARS // 2:]}")
+    return "\n\n".join(lines)
+
+def refine_plan(task, plan, result, temperature=None):
+    """Ask for a corrected plan as a follow-up turn, showing the model its plan and how it failed.
+
+    Only the failure report is new text, so the model fixes the specific problem
+    instead of starting over.
+    """
+    contents = [
+        {"role": "user", "parts": [{"text": plan_prompt(task)}]},
+        {"role": "model", "parts": [{"text": plan}]},
+        {"role": "user", "parts": [{"text": REFINE_PROMPT.format(failure=describe_failure(result))}]},
+    ]
+    return _generate(contents, temperature)
+
+def step_plan_prompt(task):
+    return f"""
+You are a coding assistant. Break the task "{task}" into steps that can run as separate programs.
+Steps share one working directory: a step passes results to later steps by writing files there.
+Give independent steps no dependency on each other so they can run at the same time.
+Only output JSON in this form, no explanation:
+{{"steps": [{{"id": "download", "kind": "python", "depends_on": [], "code": "..."}},
+            {{"id": "merge", "kind": "shell", "depends_on": ["download"], "code": "..."}}]}}
+Step ids use letters, digits, "-" and "_"; "kind" is "python" or "shell".
+"""
+
+def generate_step_plan(task, temperature=None):
+    return _generate([{"role": "user", "parts": [{"text": step_plan_prompt(task)}]}], temperature)
+
+def refine_step_plan(task, plan, failures, temperature=None):
+    """Follow-up turn for a step plan: which steps failed and how, asking for a corrected plan.
+
+    `failures` maps step ids to their results. Steps that succeeded can be kept
+    unchanged, and are then not run again.
+    """
+    report = "\n\n".join(f"Step {step_id}: {describe_failure(result)}" for step_id, result in failures.items())
+    contents = [
+        {"role": "user", "parts": [{"text": step_plan_prompt(task)}]},
+        {"role": "model", "parts": [{"text": plan}]},
+        {"role": "user", "parts": [{"text": STEP_REFINE_PROMPT.format(failure=report)}]},
+    ]
+    return _generate(contents, temperature)
+
+def candidate_temperatures(n):
+    """n temperatures spread from fairly deterministic to exploratory."""
+    if n <= 1:
+        return [None]
+    low, high = 0.2, 1.0
+    return [round(low + (high - low) * i / (n - 1), 2) for i in range(n)]
+
+def generate_plans(task, n, failed=None):
+    """Request n candidate plans concurrently, one per temperature; duplicates are dropped.
+
+    With `failed`, a (plan, result) pair from the last run, each candidate is a
+    refinement of that plan rather than a fresh one.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def generate(temperature):
+        if failed is not None:
+            return refine_plan(task, failed[0], failed[1], temperature)
+        return generate_plan(task, temperature)
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        plans = list(pool.map(generate, candidate_temperatures(n)))
+    unique = []
+    for plan in plans:
+        if plan not in unique:
+            unique.append(plan)
+    # Keep failed requests out of the race unless nothing else came back
+    usable = [plan for plan in unique if not plan.startswith("Error")]
+    return usable or unique[:1]
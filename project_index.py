@@ -0,0 +1,249 @@
+# project_index.py
+import os
+import re
+import json
+import math
+import fnmatch
+import hashlib
+import tempfile
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+INDEX_DIR = os.path.expanduser("~/.gemini_cli/index")
+INDEX_VERSION = 3
+
+# The VS Code extension's aiAssistant.excludePatterns defaults, plus "venv"
+DEFAULT_EXCLUDE_PATTERNS = [
+    "node_modules", ".git", "dist", "build", "out", "target", ".vscode", ".idea",
+    "__pycache__", ".venv", "venv", "env",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico", "*.mp4", "*.mp3", "*.wav",
+    "*.pdf", "*.zip", "*.tar", "*.gz", "*.rar",
+]
+MAX_FILE_BYTES = 1000 * 1024  # matches the extension's maxFileSize default (1000 KB)
+
+CHUNK_LINES = 60
+CHUNK_OVERLAP = 10
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_CAMEL_RE = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased identifiers plus their snake_case and camelCase parts."""
+    tokens = []
+    for word in _TOKEN_RE.findall(text):
+        lowered = word.lower()
+        tokens.append(lowered)
+        parts = [p for piece in word.split("_") for p in _CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(p.lower() for p in parts)
+    return tokens
+
+
+def is_excluded(rel_path: str, patterns: List[str]) -> bool:
+    """Whether any component of rel_path matches one of the exclude patterns."""
+    for component in rel_path.replace(os.sep, "/").split("/"):
+        for pattern in patterns:
+            if fnmatch.fnmatch(component, pattern):
+                return True
+    return False
+
+
+def chunk_lines(lines: List[str]) -> List[Tuple[int, int]]:
+    """Overlapping (start, end) line ranges, 0-based and end-exclusive."""
+    ranges = []
+    step = CHUNK_LINES - CHUNK_OVERLAP
+    start = 0
+    while start < len(lines):
+        end = min(len(lines), start + CHUNK_LINES)
+        ranges.append((start, end))
+        if end == len(lines):
+            break
+        start += step
+    return ranges
+
+
+def read_text(path: str) -> Optional[str]:
+    """File contents as text, or None for binary or unreadable files."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read(MAX_FILE_BYTES + 1)
+    except OSError:
+        return None
+    if len(data) > MAX_FILE_BYTES or b"\0" in data[:8192]:
+        return None
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+class ProjectIndex:
+    """Persistent inverted index of a source tree, split into line chunks for BM25 retrieval.
+
+    The index is stored under ~/.gemini_cli/index and refreshed incrementally: only
+    files whose size or mtime changed are re-read, and only those whose content hash
+    changed are re-chunked.
+    """
+
+    def __init__(self, root: str, exclude_patterns: Optional[List[str]] = None,
+                 index_dir: str = INDEX_DIR):
+        self.root = os.path.abspath(root)
+        self.exclude_patterns = exclude_patterns if exclude_patterns is not None else DEFAULT_EXCLUDE_PATTERNS
+        root_id = hashlib.sha256(self.root.encode("utf-8")).hexdigest()[:16]
+        self.index_path = os.path.join(index_dir, f"{root_id}.json")
+        # Per-file chunks with their term counts; the only part that is stored
+        self.files: Dict[str, Dict[str, Any]] = {}
+        # Derived from self.files on load and after each change:
+        # the chunk table, and the inverted index term -> [[chunk_id, term_frequency], ...]
+        self.chunks: List[List[Any]] = []
+        self.postings: Dict[str, List[List[int]]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION and data.get("root") == self.root:
+            self.files = data.get("files", {})
+            self._rebuild_postings()
+
+    def _rebuild_postings(self) -> None:
+        """Derive the chunk table and postings lists from the per-file term counts."""
+        self.chunks = []
+        self.postings = {}
+        for path, entry in self.files.items():
+            for chunk in entry["chunks"]:
+                chunk_id = len(self.chunks)
+                self.chunks.append([path, chunk["start"], chunk["end"], chunk["len"]])
+                for term, tf in chunk["tf"].items():
+                    self.postings.setdefault(term, []).append([chunk_id, tf])
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.index_path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "root": self.root, "files": self.files}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _walk(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            rel_dir = os.path.relpath(dirpath, self.root)
+            dirnames[:] = [d for d in dirnames
+                           if not is_excluded(os.path.join(rel_dir, d), self.exclude_patterns)]
+            for name in filenames:
+                rel_path = os.path.normpath(os.path.join(rel_dir, name))
+                if not is_excluded(rel_path, self.exclude_patterns):
+                    yield rel_path
+
+    def refresh(self) -> Dict[str, int]:
+        """Bring the index up to date with the tree; returns counts of what changed."""
+        counts = {"files": 0, "indexed": 0, "unchanged": 0, "removed": 0}
+        seen = set()
+        changed = False  # the stored index is out of date
+        rechunked = False  # and so are the chunk table and postings
+        for rel_path in self._walk():
+            full_path = os.path.join(self.root, rel_path)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                continue
+            seen.add(rel_path)
+            counts["files"] += 1
+            entry = self.files.get(rel_path)
+            if entry and entry["mtime"] == st.st_mtime and entry["size"] == st.st_size:
+                counts["unchanged"] += 1
+                continue
+
+            changed = True
+            text = read_text(full_path)
+            if text is None:
+                # Binary or too large: recorded without chunks, so it is not read again until it changes
+                rechunked = rechunked or bool(entry and entry["chunks"])
+                self.files[rel_path] = {"mtime": st.st_mtime, "size": st.st_size, "sha": None, "chunks": []}
+                continue
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            if entry and entry["sha"] == digest:
+                # Touched but not edited: keep the chunks
+                entry.update(mtime=st.st_mtime, size=st.st_size)
+                counts["unchanged"] += 1
+                continue
+
+            lines = text.splitlines()
+            chunks = []
+            for start, end in chunk_lines(lines):
+                terms = Counter(tokenize("\n".join(lines[start:end]) + " " + rel_path))
+                chunks.append({"start": start, "end": end, "tf": dict(terms),
+                               "len": sum(terms.values())})
+            self.files[rel_path] = {"mtime": st.st_mtime, "size": st.st_size, "sha": digest,
+                                    "chunks": chunks}
+            counts["indexed"] += 1
+            rechunked = True
+
+        for rel_path in list(self.files):
+            if rel_path not in seen:
+                del self.files[rel_path]
+                counts["removed"] += 1
+        if counts["removed"]:
+            changed = rechunked = True
+        if rechunked:
+            self._rebuild_postings()
+        if changed:
+            # A touched but unedited file only updates its mtime, which still has to be stored
+            self.save()
+        return counts
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[float, str, int, int]]:
+        """Top chunks for a query as (score, path, start_line, end_line), best first."""
+        query_terms = set(tokenize(query))
+        n = len(self.chunks)
+        if not query_terms or not n:
+            return []
+        avg_len = sum(chunk[3] for chunk in self.chunks) / n or 1.0
+
+        # Only the postings of the query terms are visited
+        scores: Dict[int, float] = {}
+        for term in query_terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings:
+                length = self.chunks[chunk_id][3]
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + \
+                    idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_len))
+
+        best = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+        return [(score, self.chunks[chunk_id][0], self.chunks[chunk_id][1], self.chunks[chunk_id][2])
+                for chunk_id, score in best]
+
+    def build_context(self, query: str, budget_chars: int) -> Tuple[str, int]:
+        """Pack the best-scoring chunks into at most budget_chars characters.
+
+        Returns the context text and the number of chunks it contains. Overlapping
+        chunks of the same file are skipped so no line is sent twice.
+        """
+        sections = []
+        used = 0
+        taken: Dict[str, List[Tuple[int, int]]] = {}
+        file_lines: Dict[str, List[str]] = {}
+        for _, path, start, end in self.search(query, limit=200):
+            if any(start < e and s < end for s, e in taken.get(path, [])):
+                continue
+            if path not in file_lines:
+                text = read_text(os.path.join(self.root, path))
+                file_lines[path] = text.splitlines() if text is not None else []
+            body = "\n".join(file_lines[path][start:end])
+            section = f"File: {path} (lines {start + 1}-{end})\n```\n{body}\n```\n"
+            if used + len(section) > budget_chars:
+                continue
+            sections.append(section)
+            used += len(section)
+            taken.setdefault(path, []).append((start, end))
+        return "\n".join(sections), len(sections)
@@ -0,0 +1,139 @@
+# rate_limiter.py
+import os
+import json
+import time
+import random
+from typing import Optional, Dict, Any
+
+from locking import file_lock
+
+STATE_DIR = os.path.expanduser("~/.gemini_cli")
+
+# Statuses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """Rough input token count for a request body (about four characters per token)."""
+    chars = 0
+    for content in payload.get("contents", []):
+        for part in content.get("parts", []):
+            chars += len(part.get("text", ""))
+    return chars // 4 + 1
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # email.utils is slow to import and HTTP-date values are rare
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, deferring to the server's Retry-After."""
+
+    def __init__(self, max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 32.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """How long to sleep before retry number `attempt` (0-based)."""
+        server_delay = parse_retry_after(retry_after)
+        if server_delay is not None:
+            return min(server_delay, self.max_delay * 4)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class RateLimiter:
+    """Token buckets for requests/min and tokens/min, shared by every CLI process on the host.
+
+    Bucket levels live in a small JSON state file guarded by a lock file, so parallel
+    invocations draw from a single budget instead of each bursting on its own.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 state_dir: str = STATE_DIR):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.state_path = os.path.join(state_dir, "ratelimit.json")
+        self.lock_path = os.path.join(state_dir, "ratelimit.lock")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rpm or self.tpm)
+
+    def _read_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_state(self, state: Dict[str, Any]) -> None:
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    @staticmethod
+    def _refill(bucket: Optional[Dict[str, float]], per_minute: float, now: float) -> Dict[str, float]:
+        if bucket is None:
+            return {"level": per_minute, "updated": now}
+        elapsed = max(0.0, now - bucket["updated"])
+        return {"level": min(per_minute, bucket["level"] + elapsed * per_minute / 60.0), "updated": now}
+
+    def acquire(self, tokens: int = 1) -> float:
+        """Block until one request carrying `tokens` input tokens fits the budget.
+
+        A backoff recorded by block_for() is honoured even without a budget. Returns
+        the number of seconds spent waiting.
+        """
+        waited = 0.0
+        if not self.enabled:
+            # The state file is replaced atomically, so reading it needs no lock
+            wait = max(0.0, self._read_state().get("blocked_until", 0.0) - time.time())
+            if wait:
+                time.sleep(wait)
+            return wait
+        while True:
+            with file_lock(self.lock_path):
+                now = time.time()
+                state = self._read_state()
+                wait = max(0.0, state.get("blocked_until", 0.0) - now)
+                if wait == 0.0:
+                    buckets = [("requests", self.rpm, 1), ("tokens", self.tpm, min(tokens, self.tpm))]
+                    for name, per_minute, cost in buckets:
+                        if not per_minute:
+                            continue
+                        state[name] = self._refill(state.get(name), per_minute, now)
+                        shortfall = cost - state[name]["level"]
+                        if shortfall > 0:
+                            wait = max(wait, shortfall * 60.0 / per_minute)
+                    if wait == 0.0:
+                        for name, per_minute, cost in buckets:
+                            if per_minute:
+                                state[name]["level"] -= cost
+                        self._write_state(state)
+                        return waited
+            time.sleep(wait)
+            waited += wait
+
+    def block_for(self, seconds: float) -> None:
+        """Pause every process sharing this limiter, e.g. after a 429 with Retry-After.
+
+        Recorded whether or not a budget is set, so processes without one back off too.
+        """
+        with file_lock(self.lock_path):
+            state = self._read_state()
+            state["blocked_until"] = max(state.get("blocked_until", 0.0), time.time() + seconds)
+            self._write_state(state)
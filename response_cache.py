@@ -0,0 +1,147 @@
+# response_cache.py
+import os
+import json
+import time
+import hashlib
+from typing import Optional, Dict, Any
+
+from locking import file_lock
+
+CACHE_DIR = os.path.expanduser("~/.gemini_cli/cache")
+DEFAULT_MAX_BYTES = int(float(os.environ.get("GEMINI_CACHE_MAX_MB", "100")) * 1024 * 1024)
+DEFAULT_TTL = float(os.environ.get("GEMINI_CACHE_TTL", "0")) or None  # seconds; None keeps entries until evicted
+
+
+def cache_key(model: str, generation_config: Dict[str, Any], prompt: str) -> str:
+    """Content address for a request: the model, its sampling settings and the final prompt."""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    material = json.dumps({"model": model, "generationConfig": generation_config, "prompt": prompt_hash},
+                          sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of model responses, shared by every CLI process on the host.
+
+    Each entry is its own JSON file written atomically, so readers never need the lock.
+    The lock file only serialises eviction and the hit/miss counters.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: Optional[float] = DEFAULT_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock_path = os.path.join(directory, ".lock")
+        self.stats_path = os.path.join(directory, "stats.json")
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached text for `key`, or None on a miss or expired entry."""
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._record("misses")
+            return None
+
+        if self.ttl and time.time() - entry.get("created", 0) > self.ttl:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._record("misses")
+            return None
+
+        try:
+            # The file mtime doubles as the LRU timestamp
+            os.utime(path, None)
+        except OSError:
+            pass
+        self._record("hits")
+        return entry.get("text")
+
+    def put(self, key: str, text: str, model: str = "") -> None:
+        """Store a response and evict least recently used entries beyond max_bytes."""
+        import tempfile
+
+        entry = {"key": key, "model": model, "created": time.time(), "text": text}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._entry_path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def _entries(self):
+        """(mtime, size, path) for every cache entry, oldest first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json") or name == "stats.json":
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits; returns the number removed."""
+        removed = 0
+        with file_lock(self.lock_path):
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+        return removed
+
+    def _record(self, counter: str) -> None:
+        with file_lock(self.lock_path):
+            stats = self._read_stats()
+            stats[counter] = stats.get(counter, 0) + 1
+            try:
+                with open(self.stats_path, "w") as f:
+                    json.dump(stats, f)
+            except OSError:
+                pass
+
+    def _read_stats(self) -> Dict[str, int]:
+        try:
+            with open(self.stats_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, size on disk and lifetime hit/miss counters."""
+        entries = self._entries()
+        counters = self._read_stats()
+        return {
+            "directory": self.directory,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+        }
@@ -0,0 +1,248 @@
+# router.py
+import os
+import sys
+import json
+import time
+import threading
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple, TypeVar
+
+from rate_limiter import RETRY_STATUSES, parse_retry_after
+import tracing
+import cancellation
+
+ENDPOINTS_PATH = os.environ.get("GEMINI_ENDPOINTS") or os.path.expanduser("~/.gemini_cli/endpoints.json")
+
+# Weight of the newest sample in the latency and error-rate averages
+EWMA_ALPHA = 0.3
+# Longest an endpoint is benched after repeated failures
+MAX_COOLDOWN = 60.0
+# Answers that say this key or model cannot serve right now, rather than that the request is bad:
+# throttling and server errors, plus rejected keys and retired models
+FAILOVER_STATUSES = RETRY_STATUSES | {401, 403, 404}
+
+T = TypeVar("T")
+
+
+class RouterConfigError(ValueError):
+    """The endpoints file cannot be used."""
+
+
+class Endpoint:
+    """One API key and model, with the health the router has observed for it."""
+
+    def __init__(self, key: str, model: str, name: Optional[str] = None):
+        self.key = key
+        self.model = model
+        self.name = name or f"{model} (key …{key[-4:]})"
+        self.latency_ewma: Optional[float] = None  # seconds until the response starts arriving
+        self.error_ewma = 0.0
+        self.in_flight = 0
+        self.failures_in_row = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+
+    def score(self) -> float:
+        """Expected wait for a new request here, in seconds; lower is better.
+
+        Endpoints without a latency sample yet score 0, so each one gets tried.
+        Requests already in flight count against an endpoint, which spreads
+        concurrent load across keys.
+        """
+        latency = self.latency_ewma or 0.0
+        return latency * (1 + self.in_flight) * (1 + 4 * self.error_ewma)
+
+
+def _failover_reason(e: Exception) -> Optional[Tuple[Optional[int], Optional[float]]]:
+    """(status, Retry-After seconds) if `e` means the endpoint failed rather than the request, else None."""
+    import requests
+
+    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+        if e.response.status_code not in FAILOVER_STATUSES:
+            return None
+        return e.response.status_code, parse_retry_after(e.response.headers.get("Retry-After"))
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return None, None
+    return None
+
+
+class Router:
+    """Sends each request to the healthiest, fastest endpoint and fails over to the others.
+
+    Every endpoint keeps an EWMA of its latency (for a stream, the time to its first
+    event, so a long answer does not make its endpoint look slow) and error rate. A failure benches the
+    endpoint for a while (its Retry-After, or an exponential backoff), so a throttled
+    key is skipped until it recovers. Each endpoint is tried once without retries;
+    only when all of them fail does the least-recently-benched one get the client's
+    full retry policy, to ride out a throttle affecting every key.
+    """
+
+    def __init__(self, endpoints: List[Endpoint]):
+        if not endpoints:
+            raise RouterConfigError("A router needs at least one endpoint")
+        self.endpoints = endpoints
+        self._lock = threading.Lock()
+
+    def _order(self) -> List[Endpoint]:
+        now = time.time()
+        with self._lock:
+            ready = sorted((e for e in self.endpoints if e.cooldown_until <= now), key=Endpoint.score)
+            benched = sorted((e for e in self.endpoints if e.cooldown_until > now), key=lambda e: e.cooldown_until)
+        return ready + benched
+
+    def _start(self, endpoint: Endpoint) -> float:
+        with self._lock:
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+        span = tracing.current_span()
+        if span is not None:
+            span["endpoint"] = endpoint.name
+        return time.perf_counter()
+
+    def _finish(self, endpoint: Endpoint, started: float, failure=None, healthy: bool = True,
+                ended: Optional[float] = None) -> None:
+        elapsed = (ended or time.perf_counter()) - started
+        with self._lock:
+            endpoint.in_flight -= 1
+            if failure is not None:
+                status, retry_after = failure
+                endpoint.errors += 1
+                endpoint.throttled += status == 429
+                endpoint.failures_in_row += 1
+                endpoint.error_ewma = EWMA_ALPHA + (1 - EWMA_ALPHA) * endpoint.error_ewma
+                cooldown = retry_after if retry_after is not None else 2.0 ** endpoint.failures_in_row
+                endpoint.cooldown_until = time.time() + min(MAX_COOLDOWN, cooldown)
+            elif healthy:
+                endpoint.failures_in_row = 0
+                endpoint.error_ewma *= 1 - EWMA_ALPHA
+                endpoint.latency_ewma = elapsed if endpoint.latency_ewma is None else \
+                    EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * endpoint.latency_ewma
+
+    def call(self, request: Callable[[Endpoint, Optional[int]], T],
+             first_byte: Optional[Callable[[Endpoint], Optional[float]]] = None) -> T:
+        """Run request(endpoint, max_retries) on the best endpoint, failing over on endpoint errors.
+
+        Errors that are about the request itself (a 400, an unreadable response) are
+        raised straight away; trying another key would not help. `first_byte(endpoint)`,
+        if given, is when the response started arriving; the latency is measured to it
+        instead of to the end of the call.
+        """
+        order = self._order()
+        if len(order) > 1:
+            # Everything failed fast once: give the endpoint that recovers first the full retry policy
+            attempts = [(endpoint, 0) for endpoint in order] + [(None, None)]
+        else:
+            attempts = [(order[0], None)]
+        last_error = None
+        for endpoint, max_retries in attempts:
+            if endpoint is None:
+                endpoint = self._order()[0]
+            started = self._start(endpoint)
+            try:
+                result = request(endpoint, max_retries)
+            except Exception as e:
+                # A cancelled request was aborted on purpose; that says nothing about the endpoint
+                failure = None if cancellation.cancelled() else _failover_reason(e)
+                self._finish(endpoint, started, failure, healthy=False)
+                if failure is None:
+                    raise
+                last_error = e
+                continue
+            except BaseException:
+                # Ctrl-C abandoned the request; release the endpoint without judging it
+                self._finish(endpoint, started, healthy=False)
+                raise
+            self._finish(endpoint, started, ended=first_byte(endpoint) if first_byte is not None else None)
+            return result
+        raise last_error
+
+    def start_stream(self, open_stream: Callable[[Endpoint, Optional[int]], Iterator[T]]) -> Tuple[Iterator[T], Optional[T]]:
+        """call() for a streamed response: the open stream and its first event.
+
+        The endpoint is committed to once its first event arrives.
+        """
+        arrived = {}
+
+        def first_event(endpoint, max_retries):
+            events = open_stream(endpoint, max_retries)
+            # HTTP errors surface on the first read, before anything reaches the caller
+            head = next(events, None)
+            arrived[endpoint] = time.perf_counter()
+            return events, head
+
+        return self.call(first_event, arrived.get)
+
+    def stream(self, open_stream: Callable[[Endpoint, Optional[int]], Iterator[T]]) -> Iterator[T]:
+        events, head = self.start_stream(open_stream)
+        if head is not None:
+            yield head
+            yield from events
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [{"name": e.name, "model": e.model, "requests": e.requests, "errors": e.errors,
+                     "throttled": e.throttled,
+                     "latency_ms": round(e.latency_ewma * 1000, 1) if e.latency_ewma is not None else None,
+                     "error_rate": round(e.error_ewma, 3),
+                     "cooldown_s": round(max(0.0, e.cooldown_until - now), 1)}
+                    for e in self.endpoints]
+
+
+def load_endpoints(path: str = ENDPOINTS_PATH) -> List[Endpoint]:
+    """Endpoints from the config file, or [] if there is none.
+
+    The file holds a list of {"model", "key" or "key_env", "name"} objects, or an
+    object with such a list under "endpoints". `key_env` names an environment
+    variable holding the key, so the file itself need not contain secrets.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        raise RouterConfigError(f"Cannot read endpoints from {path}: {e}")
+    entries = data.get("endpoints") if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        raise RouterConfigError(f"{path} must contain a list of endpoints")
+    endpoints = []
+    for number, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict) or not entry.get("model"):
+            raise RouterConfigError(f"Endpoint {number} in {path} needs at least a model")
+        key = entry.get("key") or os.environ.get(entry.get("key_env") or "")
+        if not key:
+            print(f"Skipping endpoint {entry.get('name') or number} in {path}: no key "
+                  f"(set {entry.get('key_env') or 'key or key_env'})", file=sys.stderr)
+            continue
+        endpoints.append(Endpoint(key, entry["model"], entry.get("name")))
+    return endpoints
+
+
+_configured: Optional[Router] = None
+_loaded = False
+_single: Dict[Tuple[str, str], Router] = {}
+_router_lock = threading.Lock()
+
+
+def configured_router() -> Optional[Router]:
+    """The router over the endpoints file, or None when there is no file."""
+    global _configured, _loaded
+    with _router_lock:
+        if not _loaded:
+            endpoints = load_endpoints()
+            _loaded = True
+            _configured = Router(endpoints) if endpoints else None
+        return _configured
+
+
+def get_router(api_key: str, model: str) -> Router:
+    """The configured router shared by the whole process, else one for just this key and model."""
+    router = configured_router()
+    if router is not None:
+        return router
+    with _router_lock:
+        if (api_key, model) not in _single:
+            _single[(api_key, model)] = Router([Endpoint(api_key, model)])
+        return _single[(api_key, model)]
@@ -0,0 +1,127 @@
+# session_store.py
+import os
+import time
+from typing import Dict, Any, List, Tuple
+
+DB_PATH = os.path.expanduser("~/.gemini_cli/history.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    created REAL NOT NULL,
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    ok INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, id);
+"""
+
+# External-content FTS table kept in sync by a trigger; messages are never edited
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    prompt, response, content='messages', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, prompt, response) VALUES (new.id, new.prompt, new.response);
+END;
+"""
+
+
+class SessionStore:
+    """Interactive sessions persisted to SQLite, with full-text search over every turn.
+
+    Nothing is cached in memory: the history view pages rows straight from the
+    database, so long sessions keep a flat footprint.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        import sqlite3
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        # WAL lets several CLI processes read while one writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5; search falls back to LIKE
+            self.has_fts = False
+        self.conn.commit()
+
+    def new_session(self) -> int:
+        with self.conn:
+            return self.conn.execute("INSERT INTO sessions (started) VALUES (?)", (time.time(),)).lastrowid
+
+    def session_exists(self, session_id: int) -> bool:
+        row = self.conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def add_message(self, session_id: int, prompt: str, response: str, ok: bool = True) -> int:
+        with self.conn:
+            return self.conn.execute(
+                "INSERT INTO messages (session_id, created, prompt, response, ok) VALUES (?, ?, ?, ?, ?)",
+                (session_id, time.time(), prompt, response, int(ok)),
+            ).lastrowid
+
+    def count(self, session_id: int) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?",
+                                 (session_id,)).fetchone()[0]
+
+    def page(self, session_id: int, offset: int, limit: int) -> List[Tuple[str, str]]:
+        """(prompt, response) pairs of a session, oldest first, starting at `offset`."""
+        return self.conn.execute(
+            "SELECT prompt, response FROM messages WHERE session_id = ? ORDER BY id LIMIT ? OFFSET ?",
+            (session_id, limit, offset),
+        ).fetchall()
+
+    def tail(self, session_id: int, limit: int) -> List[Tuple[str, str]]:
+        """The last `limit` successful turns of a session, oldest first."""
+        rows = self.conn.execute(
+            "SELECT prompt, response FROM messages WHERE session_id = ? AND ok = 1 ORDER BY id DESC LIMIT ?",
+            (session_id, limit),
+        ).fetchall()
+        return rows[::-1]
+
+    def sessions(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent sessions with their size and first prompt."""
+        rows = self.conn.execute(
+            """SELECT s.id, s.started, COUNT(m.id),
+                      (SELECT prompt FROM messages WHERE session_id = s.id ORDER BY id LIMIT 1)
+               FROM sessions s LEFT JOIN messages m ON m.session_id = s.id
+               GROUP BY s.id HAVING COUNT(m.id) > 0 ORDER BY s.id DESC LIMIT ?""",
+            (limit,),
+        ).fetchall()
+        return [{"id": r[0], "started": r[1], "messages": r[2], "first_prompt": r[3] or ""} for r in rows]
+
+    def search(self, terms: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Best matches for `terms` across all sessions, with a short snippet each."""
+        if self.has_fts:
+            # Quote each word so user input is never parsed as FTS query syntax
+            query = " ".join('"' + word.replace('"', '""') + '"' for word in terms.split())
+            if not query:
+                return []
+            rows = self.conn.execute(
+                """SELECT m.session_id, m.id, m.created,
+                          snippet(messages_fts, -1, '[', ']', '...', 12)
+                   FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+                   WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?""",
+                (query, limit),
+            ).fetchall()
+        else:
+            pattern = f"%{terms}%"
+            rows = self.conn.execute(
+                """SELECT session_id, id, created, substr(prompt, 1, 80) FROM messages
+                   WHERE prompt LIKE ? OR response LIKE ? ORDER BY id DESC LIMIT ?""",
+                (pattern, pattern, limit),
+            ).fetchall()
+        return [{"session_id": r[0], "message_id": r[1], "created": r[2], "snippet": r[3]} for r in rows]
+
+    def close(self) -> None:
+        self.conn.close()
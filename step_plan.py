@@ -0,0 +1,203 @@
+# step_plan.py
+import os
+import re
+import sys
+import json
+import threading
+from typing import Dict, Any, List
+
+import worker_pool
+from executor import (run_plan, finish_result, failed_result, is_dangerous, format_usage,
+                      DEFAULT_TIMEOUT)
+from output_capture import OutputCapture, DEFAULT_OUTPUT_LIMIT
+
+# Steps run at the same time at most; each occupies one warm worker
+DEFAULT_STEP_WORKERS = int(os.environ.get("GEMINI_STEP_WORKERS", "4"))
+
+STEP_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class StepPlanError(ValueError):
+    """The planner's output is not a valid step graph."""
+
+
+def parse_step_plan(text: str) -> List[Dict[str, Any]]:
+    """Read a step plan from the planner's JSON and check that it forms a DAG.
+
+    Each step has an `id`, a `kind` ("python" or "shell"), its `code`, and the ids
+    it `depends_on`. Steps are returned in a valid execution order.
+    """
+    # Models like to wrap JSON in a markdown fence
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    try:
+        data = json.loads(fenced.group(1) if fenced else text)
+    except ValueError as e:
+        raise StepPlanError(f"Plan is not valid JSON: {e}")
+    raw_steps = data.get("steps") if isinstance(data, dict) else data
+    if not isinstance(raw_steps, list) or not raw_steps:
+        raise StepPlanError("Plan has no steps")
+
+    steps = {}
+    for raw in raw_steps:
+        if not isinstance(raw, dict):
+            raise StepPlanError("Each step must be a JSON object")
+        step_id = str(raw.get("id", ""))
+        if not STEP_ID.match(step_id):
+            raise StepPlanError(f"Invalid step id: {step_id!r}")
+        if step_id in steps:
+            raise StepPlanError(f"Duplicate step id: {step_id}")
+        kind = raw.get("kind", "python")
+        if kind not in ("python", "shell"):
+            raise StepPlanError(f"Step {step_id} has unknown kind {kind!r}")
+        if not raw.get("code"):
+            raise StepPlanError(f"Step {step_id} has no code")
+        steps[step_id] = {"id": step_id, "kind": kind, "code": str(raw["code"]),
+                          "depends_on": [str(dep) for dep in raw.get("depends_on") or []]}
+
+    for step in steps.values():
+        for dep in step["depends_on"]:
+            if dep not in steps:
+                raise StepPlanError(f"Step {step['id']} depends on unknown step {dep}")
+
+    # Kahn's algorithm: a topological order, or proof of a cycle
+    order = []
+    remaining = {step_id: set(step["depends_on"]) for step_id, step in steps.items()}
+    while remaining:
+        ready = [step_id for step_id, deps in remaining.items() if not deps]
+        if not ready:
+            raise StepPlanError(f"Steps depend on each other in a cycle: {', '.join(sorted(remaining))}")
+        for step_id in ready:
+            order.append(steps[step_id])
+            del remaining[step_id]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return order
+
+
+def format_step_plan(steps: List[Dict[str, Any]]) -> str:
+    lines = []
+    for step in steps:
+        after = f" (after {', '.join(step['depends_on'])})" if step["depends_on"] else ""
+        lines.append(f"── {step['id']} [{step['kind']}]{after}")
+        lines.extend(f"   {line}" for line in step["code"].splitlines())
+    return "\n".join(lines)
+
+
+def reusable_steps(steps: List[Dict[str, Any]], state: Dict[str, Dict[str, Any]]) -> set:
+    """Ids of steps whose earlier successful run still stands.
+
+    A step is reused only if it succeeded with the same kind and code and every step
+    it depends on is reused too; anything downstream of a changed step runs again.
+    """
+    reused = set()
+    for step in steps:  # topological order, so dependencies are decided first
+        previous = state.get(step["id"])
+        if (previous and previous["success"] and previous["code"] == step["code"]
+                and previous["kind"] == step["kind"] and all(dep in reused for dep in step["depends_on"])):
+            reused.add(step["id"])
+    return reused
+
+
+class _PrefixedEcho:
+    """Live output of concurrent steps, one whole line at a time, tagged with the step id."""
+
+    lock = threading.Lock()
+
+    def __init__(self, step_id: str):
+        self.prefix = f"[{step_id}] ".encode("utf-8")
+        self.partial = {"stdout": b"", "stderr": b""}
+
+    def __call__(self, stream: str, data: bytes) -> None:
+        data = self.partial[stream] + data
+        lines = data.split(b"\n")
+        self.partial[stream] = lines.pop()
+        if lines:
+            self._write(stream, b"".join(self.prefix + line + b"\n" for line in lines))
+
+    def flush(self) -> None:
+        for stream, rest in self.partial.items():
+            if rest:
+                self._write(stream, self.prefix + rest + b"\n")
+                self.partial[stream] = b""
+
+    def _write(self, stream: str, data: bytes) -> None:
+        target = sys.stdout if stream == "stdout" else sys.stderr
+        with self.lock:
+            target.flush()
+            if hasattr(target, "buffer"):
+                target.buffer.write(data)
+            else:
+                target.write(data.decode("utf-8", "replace"))
+            target.flush()
+
+
+def run_step_plan(steps: List[Dict[str, Any]], workspace: str, state: Dict[str, Dict[str, Any]],
+                  timeout: float = DEFAULT_TIMEOUT, output_limit: int = DEFAULT_OUTPUT_LIMIT,
+                  workers: int = DEFAULT_STEP_WORKERS, deps=None) -> Dict[str, Dict[str, Any]]:
+    """Run the steps in dependency order, independent steps concurrently.
+
+    Every step runs with the shared `workspace` as its working directory, so a step
+    reads the files its dependencies wrote, and in the venv of `deps` (a
+    workspace.DependencyCache) if given. `state` maps step ids to their last run
+    and is updated in place; steps that already succeeded are skipped, so a retry
+    only re-runs the failed part of the graph. Returns this round's result per step.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    reused = reusable_steps(steps, state)
+    to_run = [step for step in steps if step["id"] not in reused]
+    if reused:
+        print(f"\n♻️ Reusing {len(reused)} step(s) that already succeeded: {', '.join(sorted(reused))}")
+    if worker_pool.supported():
+        worker_pool.get_pool().grow(min(workers, len(to_run)))
+
+    def run_step(step, echo):
+        if is_dangerous(step["code"], python=step["kind"] == "python"):
+            return failed_result("refused a potentially dangerous shell command")
+        capture = OutputCapture(limit_bytes=output_limit, echo=echo)
+        try:
+            return finish_result(run_plan(step["code"], workspace, timeout=timeout, capture=capture,
+                                          python=step["kind"] == "python",
+                                          script_name=f".step-{step['id']}.py", deps=deps))
+        finally:
+            echo.flush()
+
+    results: Dict[str, Dict[str, Any]] = {}
+    done = set(reused)
+    failed = set()
+    pending = {step["id"]: step for step in to_run}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while pending or running:
+            for step_id, step in list(pending.items()):
+                if any(dep in failed for dep in step["depends_on"]):
+                    # Nothing downstream of a failure runs; it is retried with the failed step
+                    del pending[step_id]
+                    failed.add(step_id)
+                    results[step_id] = failed_result(
+                        f"skipped because {', '.join(dep for dep in step['depends_on'] if dep in failed)} failed")
+                    results[step_id]["skipped"] = True
+                    print(f"⏭️ {step_id}: skipped")
+                elif all(dep in done for dep in step["depends_on"]):
+                    del pending[step_id]
+                    print(f"▶️ {step_id}: started")
+                    running[pool.submit(run_step, step, _PrefixedEcho(step_id))] = step
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = failed_result(f"exception during execution: {e}")
+                results[step["id"]] = result
+                state[step["id"]] = {"code": step["code"], "kind": step["kind"], "success": result["success"]}
+                if result["success"]:
+                    done.add(step["id"])
+                    print(f"✅ {step['id']}: done ({format_usage(result)})")
+                else:
+                    failed.add(step["id"])
+                    reason = result.get("error") or f"exit code {result['exit_code']}"
+                    print(f"❌ {step['id']}: failed ({reason})")
+    return results
@@ -0,0 +1,91 @@
+# tests/test_batch.py
+import json
+
+from batch import load_batch, resume_results, run_batch
+
+
+def write_lines(path, lines):
+    path.write_text("".join(lines), encoding="utf-8")
+
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_resume_results_keeps_one_successful_line_per_id(tmp_path):
+    out = tmp_path / "out.jsonl"
+    write_lines(out, [
+        json.dumps({"id": "a", "status": "ok", "response": "first"}) + "\n",
+        json.dumps({"id": "b", "status": "error", "error": "boom"}) + "\n",
+        json.dumps({"id": "a", "status": "ok", "response": "again"}) + "\n",
+        json.dumps({"id": "c", "status": "ok", "response": "c"}) + "\n",
+        '{"id": "d", "stat',  # a run killed mid-write
+    ])
+    assert resume_results(str(out)) == {"a", "c"}
+    results = read_results(out)
+    assert [(r["id"], r["response"]) for r in results] == [("a", "first"), ("c", "c")]
+
+
+def test_resume_results_terminates_a_complete_last_line(tmp_path):
+    out = tmp_path / "out.jsonl"
+    write_lines(out, [json.dumps({"id": "a", "status": "ok"}) + "\n",
+                      json.dumps({"id": "b", "status": "ok"})])
+    assert resume_results(str(out)) == {"a", "b"}
+    assert out.read_text(encoding="utf-8").endswith("\n")
+
+
+def test_resume_results_leaves_a_clean_file_alone(tmp_path):
+    out = tmp_path / "out.jsonl"
+    write_lines(out, [json.dumps({"id": "a", "status": "ok"}) + "\n"])
+    before = out.stat().st_mtime_ns
+    assert resume_results(str(out)) == {"a"}
+    assert out.stat().st_mtime_ns == before
+
+
+def test_resume_results_without_a_file(tmp_path):
+    assert resume_results(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_load_batch_reports_bad_lines(tmp_path):
+    batch = tmp_path / "in.jsonl"
+    write_lines(batch, ['{"id": "x", "prompt": "hi"}\n', "\n", "not json\n", "[1]\n",
+                        '{"request_id": "r", "title": "T", "body": "B"}\n', '{"id": "e"}\n'])
+    items = list(load_batch(str(batch)))
+    assert [(item["id"], item["prompt"], bool(item["error"])) for item in items] == [
+        ("x", "hi", False), ("line-3", "", True), ("line-4", "", True), ("r", "T\n\nB", False), ("e", "", True)]
+
+
+def test_rerun_only_asks_what_did_not_succeed(tmp_path):
+    batch = tmp_path / "in.jsonl"
+    out = tmp_path / "out.jsonl"
+    write_lines(batch, [json.dumps({"id": str(n), "prompt": f"p{n}"}) + "\n" for n in range(5)])
+    write_lines(out, [json.dumps({"id": "0", "status": "ok"}) + "\n",
+                      json.dumps({"id": "1", "status": "error"}) + "\n",
+                      json.dumps({"id": "gone", "status": "ok"}) + "\n"])
+    asked = []
+
+    def query(prompt):
+        asked.append(prompt)
+        return prompt.upper()
+
+    summary = run_batch(str(batch), str(out), query, workers=2, progress=False)
+    assert sorted(asked) == ["p1", "p2", "p3", "p4"]
+    # Only ids that are in the input count as skipped
+    assert (summary["total"], summary["skipped"], summary["ok"], summary["error"]) == (4, 1, 4, 0)
+    results = read_results(out)
+    assert [r["id"] for r in results] == ["0", "gone", "1", "2", "3", "4"]
+
+
+def test_failed_queries_are_recorded_as_errors(tmp_path):
+    batch = tmp_path / "in.jsonl"
+    out = tmp_path / "out.jsonl"
+    write_lines(batch, ['{"id": "ok", "prompt": "fine"}\n', '{"id": "bad", "prompt": "fail"}\n'])
+
+    def query(prompt):
+        if prompt == "fail":
+            raise RuntimeError("no answer")
+        return "answer"
+
+    summary = run_batch(str(batch), str(out), query, progress=False)
+    assert (summary["ok"], summary["error"]) == (1, 1)
+    assert {r["id"]: r["error"] for r in read_results(out)} == {"ok": None, "bad": "no answer"}
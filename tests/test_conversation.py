@@ -0,0 +1,107 @@
+# tests/test_conversation.py
+from conversation import Conversation, estimate_tokens
+
+# Each of these turns costs about 50 tokens
+TURN = ("q" * 100, "a" * 100)
+
+
+def make(budget=120, summary="SUMMARY"):
+    requests = []
+
+    def summarize(prompt):
+        requests.append(prompt)
+        return summary
+
+    return Conversation(summarize, budget_tokens=budget), requests
+
+
+def texts(contents):
+    return [content["parts"][0]["text"] for content in contents]
+
+
+def test_turns_within_the_budget_are_sent_verbatim():
+    conversation, requests = make()
+    conversation.add_turn("hello", "hi")
+    assert conversation.contents() == [
+        {"role": "user", "parts": [{"text": "hello"}]},
+        {"role": "model", "parts": [{"text": "hi"}]},
+    ]
+    assert requests == []
+
+
+def test_old_turns_are_folded_into_a_summary():
+    conversation, requests = make()
+    for _ in range(4):
+        conversation.add_turn(*TURN)
+    contents = conversation.contents()
+    assert len(requests) == 1
+    assert conversation.summary == "SUMMARY"
+    # Compaction keeps half the budget of recent turns
+    assert len(conversation.turns) == 1
+    assert texts(contents)[0].endswith("SUMMARY")
+    assert texts(contents)[2:] == list(TURN)
+
+
+def test_the_summary_is_reused_until_the_budget_is_exceeded_again():
+    conversation, requests = make()
+    for _ in range(4):
+        conversation.add_turn(*TURN)
+    conversation.contents()
+    conversation.contents()
+    assert len(requests) == 1
+    for _ in range(2):
+        conversation.add_turn(*TURN)
+    conversation.contents()
+    assert len(requests) == 2
+    assert "Summary so far:\nSUMMARY" in requests[1]
+
+
+def test_a_failed_summary_drops_the_old_turns():
+    def summarize(prompt):
+        raise RuntimeError("offline")
+
+    conversation = Conversation(summarize, budget_tokens=120)
+    for _ in range(4):
+        conversation.add_turn(*TURN)
+    contents = conversation.contents()
+    assert conversation.summary == ""
+    assert texts(contents) == list(TURN)
+
+
+def test_contents_stays_within_the_budget():
+    conversation, _ = make(budget=300, summary="s" * 40)
+    for _ in range(20):
+        conversation.add_turn(*TURN)
+        used = sum(estimate_tokens(text) for text in texts(conversation.contents()))
+        assert used <= 300 + estimate_tokens("Summary of our conversation so far:\n")
+
+
+def test_contents_without_compacting_leaves_out_old_turns():
+    conversation, requests = make()
+    for _ in range(4):
+        conversation.add_turn(*TURN)
+    assert texts(conversation.contents(compact=False)) == list(TURN) * 2
+    assert requests == [] and len(conversation.turns) == 4
+
+
+def test_fold_keeps_turns_added_while_summarizing():
+    conversation, _ = make()
+    for _ in range(4):
+        conversation.add_turn(*TURN)
+    compaction = conversation.compaction()
+    conversation.add_turn("late", "answer")
+    assert conversation.fold(compaction, "SUMMARY")
+    assert conversation.summary == "SUMMARY"
+    assert conversation.turns[-1] == ("late", "answer")
+
+
+def test_fold_is_skipped_after_a_reset():
+    conversation, _ = make()
+    for _ in range(4):
+        conversation.add_turn(*TURN)
+    compaction = conversation.compaction()
+    conversation.reset()
+    conversation.add_turn("new", "conversation")
+    assert not conversation.fold(compaction, "SUMMARY")
+    assert conversation.summary == ""
+    assert conversation.turns == [("new", "conversation")]
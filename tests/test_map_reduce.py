@@ -0,0 +1,61 @@
+# tests/test_map_reduce.py
+import map_reduce
+from map_reduce import iter_chunks
+
+
+def numbered_file(tmp_path, count, width=30):
+    path = tmp_path / "input.txt"
+    path.write_text("".join(f"{n:0{width}d}\n" for n in range(1, count + 1)), encoding="utf-8")
+    return path
+
+
+def test_chunks_overlap_and_cover_every_line(tmp_path):
+    path = numbered_file(tmp_path, 2000)
+    chunks = list(iter_chunks(str(path), chunk_chars=3000))
+    assert len(chunks) > 1
+    assert chunks[0]["start"] == 1 and chunks[-1]["end"] == 2000
+    for previous, chunk in zip(chunks, chunks[1:]):
+        overlap = previous["end"] - chunk["start"] + 1
+        # The tail of each chunk is repeated, within both overlap limits
+        assert 0 < overlap <= map_reduce.OVERLAP_LINES
+        assert overlap * 31 <= 3000 // 4
+
+
+def test_chunk_text_matches_its_line_range(tmp_path):
+    path = numbered_file(tmp_path, 500)
+    lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    for chunk in iter_chunks(str(path), chunk_chars=2000):
+        assert chunk["text"] == "".join(lines[chunk["start"] - 1:chunk["end"]])
+        assert len(chunk["text"]) <= 2000 + 31
+
+
+def test_chunks_prefer_to_end_at_a_blank_line(tmp_path):
+    path = tmp_path / "code.py"
+    blocks = [f"def f{n}():\n" + "    x = 1\n" * 8 + "\n" for n in range(40)]
+    path.write_text("".join(blocks), encoding="utf-8")
+    chunks = list(iter_chunks(str(path), chunk_chars=1000))
+    lines = path.read_text(encoding="utf-8").splitlines()
+    for chunk in chunks[:-1]:
+        # The line after the chunk's last one is the blank line or the next def
+        assert lines[chunk["end"]] == "" or lines[chunk["end"]].startswith("def ")
+
+
+def test_a_line_longer_than_a_chunk_is_split(tmp_path):
+    path = tmp_path / "minified.js"
+    path.write_text("x" * 10_000 + "\n", encoding="utf-8")
+    chunks = list(iter_chunks(str(path), chunk_chars=3000))
+    assert len(chunks) >= 4
+    assert all(chunk["start"] == chunk["end"] == 1 for chunk in chunks)
+    assert all(len(chunk["text"]) <= 3000 for chunk in chunks)
+
+
+def test_progress_reaches_the_end_of_the_file(tmp_path):
+    path = numbered_file(tmp_path, 1000)
+    progress = [chunk["progress"] for chunk in iter_chunks(str(path), chunk_chars=5000)]
+    assert progress == sorted(progress) and progress[-1] == 1.0
+
+
+def test_a_small_file_is_a_single_chunk(tmp_path):
+    path = numbered_file(tmp_path, 10)
+    chunks = list(iter_chunks(str(path), chunk_chars=10_000))
+    assert [(c["index"], c["start"], c["end"]) for c in chunks] == [(1, 1, 10)]
@@ -0,0 +1,92 @@
+# tests/test_project_index.py
+import json
+
+import pytest
+
+import project_index
+from project_index import ProjectIndex, chunk_lines, tokenize
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "src"
+    root.mkdir()
+    (root / "limiter.py").write_text(
+        "class TokenBucket:\n    def refill(self):\n        return self.level\n", encoding="utf-8")
+    (root / "cache.py").write_text(
+        "def evict_lru(entries):\n    return sorted(entries)\n", encoding="utf-8")
+    (root / "common.py").write_text(
+        "\n".join(f"def helper_{n}(self):\n    return self" for n in range(5)), encoding="utf-8")
+    (root / "node_modules").mkdir()
+    (root / "node_modules" / "dep.js").write_text("function refill() {}\n", encoding="utf-8")
+    return root
+
+
+def make_index(tree, tmp_path):
+    return ProjectIndex(str(tree), index_dir=str(tmp_path / "index"))
+
+
+def test_tokenize_splits_snake_and_camel_case():
+    assert tokenize("evict_lru TokenBucket") == ["evict_lru", "evict", "lru", "tokenbucket", "token", "bucket"]
+
+
+def test_chunks_overlap_and_cover_every_line():
+    ranges = chunk_lines(["x"] * 130)
+    assert ranges[0] == (0, project_index.CHUNK_LINES)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end - start == project_index.CHUNK_OVERLAP
+    assert ranges[-1][1] == 130
+
+
+def test_search_ranks_the_matching_file_first(tree, tmp_path):
+    index = make_index(tree, tmp_path)
+    assert index.refresh() == {"files": 3, "indexed": 3, "unchanged": 0, "removed": 0}
+    assert index.search("how does the token bucket refill")[0][1] == "limiter.py"
+    assert index.search("evict LRU entries")[0][1] == "cache.py"
+    assert index.search("nothing here matches") == []
+
+
+def test_rare_terms_outweigh_common_ones(tree, tmp_path):
+    index = make_index(tree, tmp_path)
+    index.refresh()
+    # "self" is in two files, "refill" only in one
+    ranked = [path for _, path, _, _ in index.search("self refill")]
+    assert ranked[0] == "limiter.py"
+    assert "common.py" in ranked
+
+
+def test_excluded_directories_are_not_indexed(tree, tmp_path):
+    index = make_index(tree, tmp_path)
+    index.refresh()
+    assert all(not path.startswith("node_modules") for path in index.files)
+
+
+def test_saved_index_gives_the_same_results(tree, tmp_path):
+    first = make_index(tree, tmp_path)
+    first.refresh()
+    stored = json.loads(open(first.index_path, encoding="utf-8").read())
+    # Only the per-chunk term counts are stored; the postings are rebuilt on load
+    assert set(stored) == {"version", "root", "files"}
+
+    second = make_index(tree, tmp_path)
+    assert second.search("token bucket refill") == first.search("token bucket refill")
+    assert second.refresh() == {"files": 3, "indexed": 0, "unchanged": 3, "removed": 0}
+
+
+def test_refresh_picks_up_edits_and_removals(tree, tmp_path):
+    index = make_index(tree, tmp_path)
+    index.refresh()
+    (tree / "cache.py").write_text("def evict_lru(entries):\n    return sorted(entries, reverse=True)\n",
+                                   encoding="utf-8")
+    (tree / "common.py").unlink()
+    counts = index.refresh()
+    assert (counts["indexed"], counts["removed"]) == (1, 1)
+    assert all(path != "common.py" for _, path, _, _ in index.search("helper self"))
+
+
+def test_build_context_respects_the_budget(tree, tmp_path):
+    index = make_index(tree, tmp_path)
+    index.refresh()
+    context, chunks = index.build_context("token bucket refill", 10_000)
+    assert chunks >= 1 and context.startswith("File: limiter.py (lines 1-3)")
+    assert index.build_context("token bucket refill", 10) == ("", 0)
@@ -0,0 +1,99 @@
+# tests/test_rate_limiter.py
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, RetryPolicy, estimate_tokens, parse_retry_after
+
+
+class FakeClock:
+    """Stands in for the time module: sleeping advances the clock instead of waiting."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    return fake
+
+
+def test_disabled_limiter_never_waits(tmp_path, clock):
+    limiter = RateLimiter(state_dir=str(tmp_path))
+    assert not limiter.enabled
+    assert [limiter.acquire(10 ** 6) for _ in range(100)] == [0.0] * 100
+
+
+def test_request_bucket_allows_a_burst_then_refills(tmp_path, clock):
+    limiter = RateLimiter(requests_per_minute=60, state_dir=str(tmp_path))
+    for _ in range(60):
+        assert limiter.acquire() == 0.0
+    # The bucket is empty; one request refills every second
+    assert limiter.acquire() == pytest.approx(1.0)
+    clock.now += 5
+    for _ in range(5):
+        assert limiter.acquire() == 0.0
+    assert limiter.acquire() == pytest.approx(1.0)
+
+
+def test_token_bucket_waits_for_the_shortfall(tmp_path, clock):
+    limiter = RateLimiter(tokens_per_minute=600, state_dir=str(tmp_path))
+    assert limiter.acquire(500) == 0.0
+    # 100 tokens left; 200 more are needed at 10 tokens per second
+    assert limiter.acquire(300) == pytest.approx(20.0)
+
+
+def test_request_larger_than_the_budget_still_goes_through(tmp_path, clock):
+    limiter = RateLimiter(tokens_per_minute=100, state_dir=str(tmp_path))
+    assert limiter.acquire(10 ** 6) == 0.0
+
+
+def test_processes_share_one_budget(tmp_path, clock):
+    first = RateLimiter(requests_per_minute=2, state_dir=str(tmp_path))
+    second = RateLimiter(requests_per_minute=2, state_dir=str(tmp_path))
+    assert first.acquire() == 0.0
+    assert second.acquire() == 0.0
+    assert first.acquire() == pytest.approx(30.0)
+
+
+def test_block_for_pauses_limiters_with_and_without_a_budget(tmp_path, clock):
+    RateLimiter(state_dir=str(tmp_path)).block_for(12)
+    assert RateLimiter(state_dir=str(tmp_path)).acquire() == pytest.approx(12.0)
+    RateLimiter(state_dir=str(tmp_path)).block_for(5)
+    assert RateLimiter(requests_per_minute=60, state_dir=str(tmp_path)).acquire() == pytest.approx(5.0)
+
+
+def test_block_for_never_shortens_an_existing_block(tmp_path, clock):
+    limiter = RateLimiter(state_dir=str(tmp_path))
+    limiter.block_for(30)
+    limiter.block_for(5)
+    assert limiter.acquire() == pytest.approx(30.0)
+
+
+def test_retry_policy_prefers_retry_after_and_caps_it():
+    policy = RetryPolicy(max_delay=10)
+    assert policy.delay(0, "3") == 3.0
+    assert policy.delay(0, "3600") == 40.0
+    for attempt in range(6):
+        assert 0 <= policy.delay(attempt) <= min(10, 2 ** attempt)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after("not a date") is None
+
+
+def test_estimate_tokens_counts_text_parts():
+    payload = {"contents": [{"parts": [{"text": "a" * 40}]}, {"parts": [{"text": "b" * 40}]}]}
+    assert estimate_tokens(payload) == 21
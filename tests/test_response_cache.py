@@ -0,0 +1,73 @@
+# tests/test_response_cache.py
+import os
+
+import response_cache
+from response_cache import ResponseCache, cache_key
+
+
+def entry_size(cache, key):
+    return os.path.getsize(cache._entry_path(key))
+
+
+def test_get_returns_what_put_stored(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put("k", "answer", "model")
+    assert cache.get("k") == "answer"
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_cache_key_depends_on_model_config_and_prompt():
+    base = cache_key("m1", {"temperature": 0}, "prompt")
+    assert base == cache_key("m1", {"temperature": 0}, "prompt")
+    assert base != cache_key("m2", {"temperature": 0}, "prompt")
+    assert base != cache_key("m1", {"temperature": 1}, "prompt")
+    assert base != cache_key("m1", {"temperature": 0}, "other prompt")
+
+
+def test_least_recently_used_entry_is_evicted_first(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=10 ** 9)
+    cache.put("a", "x" * 100)
+    cache.put("b", "x" * 100)
+    os.utime(cache._entry_path("a"), (100, 100))
+    os.utime(cache._entry_path("b"), (200, 200))
+    # Reading "a" makes it the most recently used, so "b" is now the oldest
+    assert cache.get("a") is not None
+
+    cache.max_bytes = entry_size(cache, "a") * 2 + entry_size(cache, "a") // 2
+    cache.put("c", "x" * 100)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_evict_stops_once_the_cache_fits(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=10 ** 9)
+    for number, key in enumerate("abcd"):
+        cache.put(key, "x" * 100)
+        os.utime(cache._entry_path(key), (100 + number, 100 + number))
+    cache.max_bytes = entry_size(cache, "a") * 2
+    assert cache.evict() == 2
+    assert [cache.get(key) is not None for key in "abcd"] == [False, False, True, True]
+
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    now = 1_000_000.0
+    monkeypatch.setattr(response_cache.time, "time", lambda: now)
+    cache.put("k", "answer")
+
+    now += 59
+    assert cache.get("k") == "answer"
+    now += 2
+    assert cache.get("k") is None
+    # An expired entry is removed, not just skipped
+    assert not os.path.exists(cache._entry_path("k"))
+
+
+def test_no_ttl_keeps_entries(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), ttl=None)
+    cache.put("k", "answer")
+    monkeypatch.setattr(response_cache.time, "time", lambda: 10 ** 12)
+    assert cache.get("k") == "answer"
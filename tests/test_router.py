@@ -0,0 +1,136 @@
+# tests/test_router.py
+import time
+
+import pytest
+import requests
+
+from router import Endpoint, Router
+
+
+def http_error(status, retry_after=None):
+    response = requests.Response()
+    response.status_code = status
+    if retry_after is not None:
+        response.headers["Retry-After"] = retry_after
+    return requests.exceptions.HTTPError(f"{status} error", response=response)
+
+
+def make_router(*names):
+    return Router([Endpoint(f"key-{name}", "model", name) for name in names])
+
+
+def test_a_throttled_endpoint_fails_over_and_is_benched():
+    router = make_router("first", "second")
+    calls = []
+
+    def request(endpoint, max_retries):
+        calls.append((endpoint.name, max_retries))
+        if endpoint.name == "first":
+            raise http_error(429, "30")
+        return "answer"
+
+    assert router.call(request) == "answer"
+    # Each endpoint is tried once without retries before any gets the full policy
+    assert calls == [("first", 0), ("second", 0)]
+    stats = {s["name"]: s for s in router.stats()}
+    assert stats["first"]["throttled"] == 1
+    assert 29 <= stats["first"]["cooldown_s"] <= 30
+
+    calls.clear()
+    router.call(request)
+    assert calls == [("second", 0)]
+
+
+def test_connection_errors_fail_over_too():
+    router = make_router("down", "up")
+
+    def request(endpoint, max_retries):
+        if endpoint.name == "down":
+            raise requests.exceptions.ConnectionError("refused")
+        return endpoint.name
+
+    assert router.call(request) == "up"
+
+
+def test_errors_about_the_request_are_not_retried_elsewhere():
+    router = make_router("first", "second")
+    tried = []
+
+    def request(endpoint, max_retries):
+        tried.append(endpoint.name)
+        raise http_error(400)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        router.call(request)
+    assert tried == ["first"]
+    assert all(s["cooldown_s"] == 0 for s in router.stats())
+
+
+def test_when_every_endpoint_fails_the_first_to_recover_gets_the_retry_policy():
+    router = make_router("long", "short")
+    calls = []
+
+    def request(endpoint, max_retries):
+        calls.append((endpoint.name, max_retries))
+        if max_retries == 0:
+            raise http_error(503, "60" if endpoint.name == "long" else "5")
+        return "recovered"
+
+    assert router.call(request) == "recovered"
+    assert calls == [("long", 0), ("short", 0), ("short", None)]
+
+
+def test_the_last_error_is_raised_when_nothing_recovers():
+    router = make_router("a", "b")
+
+    def request(endpoint, max_retries):
+        raise http_error(500)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        router.call(request)
+    assert sum(s["errors"] for s in router.stats()) == 3
+
+
+def test_a_single_endpoint_gets_the_full_retry_policy_at_once():
+    router = make_router("only")
+    calls = []
+    router.call(lambda endpoint, max_retries: calls.append(max_retries))
+    assert calls == [None]
+
+
+def test_requests_go_to_the_faster_endpoint():
+    router = make_router("slow", "fast")
+    router.endpoints[0].latency_ewma = 2.0
+    router.endpoints[1].latency_ewma = 0.5
+    assert router.call(lambda endpoint, max_retries: endpoint.name) == "fast"
+
+
+def test_requests_in_flight_count_against_an_endpoint():
+    router = make_router("busy", "idle")
+    router.endpoints[0].latency_ewma = 1.0
+    router.endpoints[1].latency_ewma = 1.5
+    router.endpoints[0].in_flight = 1
+    assert router.call(lambda endpoint, max_retries: endpoint.name) == "idle"
+
+
+def test_stream_latency_is_measured_to_the_first_event():
+    router = make_router("only")
+
+    def open_stream(endpoint, max_retries):
+        yield "first"
+        time.sleep(0.3)
+        yield "second"
+
+    assert list(router.stream(open_stream)) == ["first", "second"]
+    assert router.stats()[0]["latency_ms"] < 200
+
+
+def test_a_failing_stream_fails_over_before_anything_is_yielded():
+    router = make_router("broken", "working")
+
+    def open_stream(endpoint, max_retries):
+        if endpoint.name == "broken":
+            raise http_error(502)
+        yield endpoint.name
+
+    assert list(router.stream(open_stream)) == ["working"]
@@ -0,0 +1,62 @@
+# tests/test_step_plan.py
+import json
+
+import pytest
+
+from step_plan import StepPlanError, parse_step_plan, reusable_steps
+
+
+def plan(*steps):
+    return json.dumps({"steps": [{"id": step_id, "code": f"print({step_id!r})", "depends_on": deps}
+                                 for step_id, deps in steps]})
+
+
+def order(text):
+    return [step["id"] for step in parse_step_plan(text)]
+
+
+def test_steps_come_after_their_dependencies():
+    ids = order(plan(("merge", ["a", "b"]), ("b", ["download"]), ("a", ["download"]), ("download", [])))
+    assert ids[0] == "download" and ids[-1] == "merge"
+    assert set(ids[1:3]) == {"a", "b"}
+
+
+def test_independent_steps_keep_their_plan_order():
+    assert order(plan(("x", []), ("y", []), ("z", []))) == ["x", "y", "z"]
+
+
+def test_a_fenced_plan_is_accepted():
+    text = "Here is the plan:\n```json\n" + plan(("only", [])) + "\n```"
+    assert order(text) == ["only"]
+
+
+def test_cycles_are_rejected():
+    with pytest.raises(StepPlanError, match="cycle: a, b"):
+        parse_step_plan(plan(("start", []), ("a", ["start", "b"]), ("b", ["a"])))
+
+
+def test_a_step_that_depends_on_itself_is_a_cycle():
+    with pytest.raises(StepPlanError, match="cycle"):
+        parse_step_plan(plan(("a", ["a"])))
+
+
+@pytest.mark.parametrize("text, message", [
+    ("not json", "not valid JSON"),
+    (json.dumps({"steps": []}), "no steps"),
+    (plan(("a", ["missing"])), "unknown step missing"),
+    (plan(("a", []), ("a", [])), "Duplicate step id"),
+    (plan(("bad id", [])), "Invalid step id"),
+    (json.dumps([{"id": "a", "code": "x", "kind": "ruby"}]), "unknown kind"),
+    (json.dumps([{"id": "a"}]), "no code"),
+])
+def test_invalid_plans_are_rejected(text, message):
+    with pytest.raises(StepPlanError, match=message):
+        parse_step_plan(text)
+
+
+def test_only_steps_upstream_of_a_change_are_reused():
+    steps = parse_step_plan(plan(("a", []), ("b", ["a"]), ("c", ["b"]), ("d", [])))
+    state = {step["id"]: {"code": step["code"], "kind": step["kind"], "success": True} for step in steps}
+    state["b"]["code"] = "print('old b')"
+    state["d"]["success"] = False
+    assert reusable_steps(steps, state) == {"a"}
@@ -0,0 +1,213 @@
+# tracing.py
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator, List
+
+DEFAULT_TRACE_PATH = os.path.expanduser("~/.gemini_cli/trace.jsonl")
+
+_local = threading.local()
+
+
+def current_span() -> Optional[Dict[str, Any]]:
+    """The trace record of the API call running on this thread, if it is being traced."""
+    return getattr(_local, "span", None)
+
+
+def set_current_span(span: Optional[Dict[str, Any]]) -> None:
+    """Make `span` the current span of this thread, e.g. in a worker thread acting for the caller."""
+    _local.span = span
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Tracer:
+    """Writes one JSONL record per API call and keeps what the end-of-session summary needs.
+
+    The client fills in the record of the call running on the current thread
+    (see current_span): connection phases, time to first byte, retries, payload
+    sizes and the token counts reported by the API.
+    """
+
+    def __init__(self, path: str = DEFAULT_TRACE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._records: List[Dict[str, Any]] = []
+        self.started = time.time()
+
+    @contextmanager
+    def span(self, kind: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+        """Trace one logical call (which may span several HTTP attempts)."""
+        span = {
+            "time": time.time(), "kind": kind, "status": None, "error": None, "cache": None,
+            "attempts": 0, "retries": 0, "reused_connection": None,
+            "rate_limit_wait_ms": 0.0, "dns_ms": 0.0, "connect_ms": 0.0, "tls_ms": 0.0,
+            "ttfb_ms": None, "first_chunk_ms": None, "total_ms": None,
+            "request_bytes": 0, "response_bytes": 0, "prompt_tokens": None, "output_tokens": None, "cached_tokens": None,
+        }
+        span.update(fields)
+        previous = current_span()
+        _local.span = span
+        started = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span["error"] = f"{type(e).__name__}: {str(e)[:200]}"
+            raise
+        finally:
+            span["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            for key in ("dns_ms", "connect_ms", "tls_ms", "rate_limit_wait_ms"):
+                span[key] = round(span[key], 2)
+            _local.span = previous
+            self._write(span)
+
+    def _write(self, span: Dict[str, Any]) -> None:
+        line = json.dumps(span)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._records.append({key: span[key] for key in
+                                  ("total_ms", "ttfb_ms", "first_chunk_ms", "prompt_tokens", "output_tokens",
+                                   "cached_tokens", "cache", "retries", "error", "request_bytes")})
+
+    def summary(self) -> Dict[str, Any]:
+        """Latency percentiles, token throughput and cache hit rate for this session."""
+        with self._lock:
+            records = list(self._records)
+        result: Dict[str, Any] = {"calls": len(records)}
+        if not records:
+            return result
+        for key in ("total_ms", "ttfb_ms", "first_chunk_ms"):
+            samples = [r[key] for r in records if r[key] is not None and r["cache"] != "hit"]
+            if samples:
+                result[key] = {f"p{p}": round(percentile(samples, p), 1) for p in (50, 95, 99)}
+        minutes = max(time.time() - self.started, 1e-6) / 60.0
+        prompt_tokens = sum(r["prompt_tokens"] or 0 for r in records)
+        output_tokens = sum(r["output_tokens"] or 0 for r in records)
+        result.update({
+            "errors": sum(1 for r in records if r["error"]),
+            "retries": sum(r["retries"] for r in records),
+            "cache_hits": sum(1 for r in records if r["cache"] == "hit"),
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "cached_tokens": sum(r["cached_tokens"] or 0 for r in records),
+            "tokens_per_minute": round((prompt_tokens + output_tokens) / minutes, 1),
+            "request_bytes": sum(r["request_bytes"] for r in records),
+        })
+        return result
+
+    def format_summary(self) -> List[str]:
+        summary = self.summary()
+        lines = [f"Trace: {summary['calls']} calls written to {self.path}"]
+        if not summary["calls"]:
+            return lines
+        labels = {"total_ms": "total", "ttfb_ms": "first byte", "first_chunk_ms": "first chunk"}
+        for key, label in labels.items():
+            if key in summary:
+                p = summary[key]
+                lines.append(f"  {label:<12} p50 {p['p50']:.0f} ms  p95 {p['p95']:.0f} ms  p99 {p['p99']:.0f} ms")
+        cached = f" ({summary['cached_tokens']} from cached context)" if summary["cached_tokens"] else ""
+        lines.append(f"  tokens       {summary['prompt_tokens']} in{cached}, {summary['output_tokens']} out "
+                     f"({summary['tokens_per_minute']:.0f}/min)")
+        lines.append(f"  requests     {summary['request_bytes'] / 1024:.1f} KB sent, {summary['retries']} retries, "
+                     f"{summary['cache_hits']} cache hits, {summary['errors']} errors")
+        return lines
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+_POOL_CLASSES = None
+
+
+def timed_pool_classes() -> Dict[str, Any]:
+    """urllib3 connection pools whose new connections report DNS, TCP and TLS time to the span."""
+    global _POOL_CLASSES
+    if _POOL_CLASSES is not None:
+        return _POOL_CLASSES
+
+    import socket
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class _TimedConnection:
+        def _new_conn(self):
+            span = current_span()
+            if span is None:
+                return super()._new_conn()
+            started = time.perf_counter()
+            host = self._dns_host
+            try:
+                resolved = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+            except (OSError, IndexError):
+                resolved = None  # let urllib3 fail with its usual error
+            resolved_at = time.perf_counter()
+            span["dns_ms"] += (resolved_at - started) * 1000
+            # Connect to the address we just resolved so the lookup is not timed twice.
+            # `host` reads _dns_host, so it is restored before TLS uses it for SNI.
+            if resolved:
+                self._dns_host = resolved
+            try:
+                sock = super()._new_conn()
+            finally:
+                self._dns_host = host
+            self._tcp_ms = (time.perf_counter() - started) * 1000
+            span["connect_ms"] += (time.perf_counter() - resolved_at) * 1000
+            return sock
+
+        def connect(self):
+            span = current_span()
+            self._tcp_ms = 0.0
+            started = time.perf_counter()
+            super().connect()
+            if span is not None and isinstance(self, HTTPSConnection):
+                span["tls_ms"] += max(0.0, (time.perf_counter() - started) * 1000 - self._tcp_ms)
+
+    class TimedHTTPConnection(_TimedConnection, HTTPConnection):
+        pass
+
+    class TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+        pass
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = TimedHTTPConnection
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = TimedHTTPSConnection
+
+    _POOL_CLASSES = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+    return _POOL_CLASSES
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Optional[Tracer]:
+    """The process-wide tracer, or None when --trace is off."""
+    return _tracer
+
+
+def enable_tracing(path: str = DEFAULT_TRACE_PATH) -> Tracer:
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(path)
+    return _tracer
+
+
+@contextmanager
+def traced(kind: str, **fields: Any) -> Iterator[Optional[Dict[str, Any]]]:
+    """A span on the process-wide tracer, or a no-op yielding None when tracing is off."""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.span(kind, **fields) as span:
+        yield span
@@ -0,0 +1,430 @@
+# worker_pool.py
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import functools
+import threading
+import subprocess
+from typing import Optional, Dict, Any, List
+
+from output_capture import OutputCapture
+
+# Imported once by every warm worker, so plans that use them start instantly
+PRELOAD_MODULES = (
+    "json", "re", "math", "random", "datetime", "collections", "itertools", "functools",
+    "pathlib", "csv", "shutil", "subprocess", "typing", "urllib.request",
+)
+
+DEFAULT_POOL_SIZE = int(os.environ.get("GEMINI_EXEC_WORKERS", "2"))
+
+
+def supported() -> bool:
+    """Warm workers fork per run, so they need POSIX fork, FIFOs and resource limits."""
+    if not hasattr(os, "fork") or not hasattr(os, "mkfifo"):
+        return False
+    try:
+        import resource  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Worker side: runs in the pre-started interpreter
+
+def _set_limits(cpu_seconds: Optional[float], memory_bytes: Optional[int]) -> None:
+    import resource
+
+    if cpu_seconds:
+        # The soft limit sends SIGXCPU; the hard limit one second later kills outright
+        soft = max(1, int(cpu_seconds))
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, soft + 1))
+    if memory_bytes:
+        # RLIMIT_DATA counts memory the plan actually allocates; RLIMIT_AS would also count the
+        # address space that thread stacks and native libraries merely reserve
+        limit = getattr(resource, "RLIMIT_DATA", resource.RLIMIT_AS)
+        resource.setrlimit(limit, (memory_bytes, memory_bytes))
+
+
+def _run_child(request: Dict[str, Any], out_fd: int, err_fd: int, control_fds: List[int]) -> None:
+    """Body of the forked child: isolate, apply limits, run the plan, never return."""
+    code = 1
+    try:
+        os.setsid()  # own process group, so a timeout also kills anything the plan spawned
+        os.chdir(request["cwd"])
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+        for fd in [devnull, out_fd, err_fd] + control_fds:
+            os.close(fd)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        _set_limits(request.get("cpu_seconds"), request.get("memory_bytes"))
+        os.environ.update(request.get("env") or {})
+
+        if request["kind"] == "shell":
+            os.execv("/bin/sh", ["/bin/sh", "-c", request["command"]])
+
+        import runpy
+        # Line-buffered like a terminal, so progress shows up while the plan runs
+        sys.stdout.reconfigure(line_buffering=True)
+        sys.argv = [request["path"]]
+        sys.path[0] = request["cwd"]
+        if request.get("executable"):
+            # Plans that run `sys.executable -m pip` then install into the venv they run in
+            sys.executable = request["executable"]
+        if request.get("site_packages"):
+            import site
+            before = list(sys.path)
+            site.addsitedir(request["site_packages"])
+            # Ahead of the worker's own packages, as if the venv's interpreter were running
+            sys.path[1:] = [p for p in sys.path if p not in before] + before[1:]
+        try:
+            runpy.run_path(request["path"], run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            if e.code is None:
+                code = 0
+            elif isinstance(e.code, int):
+                code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException as e:
+            import traceback
+            # Start the traceback at the plan's own frames, as `python temp_task.py` would
+            tb = e.__traceback__
+            while tb is not None and tb.tb_frame.f_code.co_filename != request["path"]:
+                tb = tb.tb_next
+            traceback.print_exception(type(e), e, tb or e.__traceback__)
+            code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def _serve() -> None:
+    """Worker main loop: one JSON request per line on stdin, replies on stdout.
+
+    Each request is run in a child forked from this already-warm interpreter; the
+    worker itself never runs plan code, so one plan cannot leak state into the next.
+    """
+    # Keep the control channel on private descriptors; 0-2 are for the children
+    control_in = os.fdopen(os.dup(0), "rb")
+    control_out = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    control_fds = [control_in.fileno(), control_out.fileno()]
+    # Ctrl+C in the terminal reaches the whole foreground group; the pool decides what to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    import importlib
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+    def reply(message):
+        control_out.write((json.dumps(message) + "\n").encode("utf-8"))
+        control_out.flush()
+
+    reply({"ready": True, "pid": os.getpid()})
+    for line in control_in:
+        request = json.loads(line)
+        out_fd = os.open(request["stdout"], os.O_WRONLY)
+        err_fd = os.open(request["stderr"], os.O_WRONLY)
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            _run_child(request, out_fd, err_fd, control_fds)
+        os.close(out_fd)
+        os.close(err_fd)
+        reply({"pid": pid})
+
+        # A timer signal rather than a thread: the worker forks, and must stay single-threaded
+        timed_out = []
+
+        def kill_on_timeout(signum, frame):
+            timed_out.append(True)
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+        if request.get("timeout"):
+            signal.signal(signal.SIGALRM, kill_on_timeout)
+            signal.setitimer(signal.ITIMER_REAL, request["timeout"])
+        _, status, usage = os.wait4(pid, 0)
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        wall = time.perf_counter() - started
+        # Also reap anything the plan left running in its process group
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+        reply({
+            "exit_code": os.waitstatus_to_exitcode(status),
+            "timed_out": bool(timed_out),
+            "wall_s": round(wall, 3),
+            "cpu_user_s": round(usage.ru_utime, 3),
+            "cpu_sys_s": round(usage.ru_stime, 3),
+            # ru_maxrss is kilobytes on Linux and bytes on macOS
+            "max_rss_kb": usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss,
+        })
+
+
+# Pool side: runs in the agent
+
+# How often a running plan checks whether it has been cancelled
+CANCEL_POLL_INTERVAL = 0.05
+# How long to wait for output left in the pipes once the plan has exited
+READER_JOIN_TIMEOUT = 5.0
+
+
+def _drain_and_close(capture: OutputCapture, fd: int, stream: str, stop) -> None:
+    try:
+        capture.drain(functools.partial(os.read, fd), stream, stop)
+    finally:
+        os.close(fd)
+
+
+def _detach(fd: int) -> None:
+    """Point a stuck reader's descriptor at /dev/null: its next read sees EOF and it closes the descriptor."""
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    try:
+        os.dup2(devnull, fd)
+    finally:
+        os.close(devnull)
+
+
+def cancelled_result() -> Dict[str, Any]:
+    """Result of a run that was cancelled before it started."""
+    return {"exit_code": None, "timed_out": False, "cancelled": True, "stdout": "", "stderr": "",
+            "output_bytes": 0, "output_limited": False, "output_truncated": False, "wall_s": 0.0,
+            "cpu_user_s": None, "cpu_sys_s": None, "max_rss_kb": None}
+
+class _Worker:
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        self.ready = False
+
+    def send(self, message: Dict[str, Any]) -> None:
+        self.proc.stdin.write((json.dumps(message) + "\n").encode("utf-8"))
+        self.proc.stdin.flush()
+
+    def receive(self) -> Dict[str, Any]:
+        line = self.proc.stdout.readline()
+        if not line:
+            raise RuntimeError("Execution worker exited unexpectedly")
+        return json.loads(line)
+
+    def wait_ready(self) -> None:
+        if not self.ready:
+            self.receive()
+            self.ready = True
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def close(self) -> None:
+        if self.alive:
+            self.proc.stdin.close()
+            try:
+                self.proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+
+
+class WorkerPool:
+    """Pre-started Python interpreters that run plans in forked, resource-limited children.
+
+    A run costs a fork instead of a fresh interpreter start, and common stdlib modules
+    are already imported. Each run gets its own working directory, a wall-clock
+    timeout, CPU and address-space limits, and reports its resource usage.
+    """
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE):
+        import tempfile
+
+        self.size = max(1, size)
+        # FIFOs for the children's stdout/stderr live here, outside the plan's directory
+        self.io_dir = tempfile.mkdtemp(prefix="ai_agent_io_")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._runs = 0
+        for _ in range(self.size):
+            self._add_worker()
+
+    def _add_worker(self) -> _Worker:
+        worker = _Worker()
+        with self._lock:
+            self._workers.append(worker)
+        self._idle.put(worker)
+        return worker
+
+    def grow(self, size: int) -> None:
+        """Start more workers so at least `size` runs can proceed side by side."""
+        with self._lock:
+            missing = size - len(self._workers)
+            self.size = max(self.size, size)
+        for _ in range(missing):
+            self._add_worker()
+
+    def _checkout(self) -> _Worker:
+        worker = self._idle.get()
+        if not worker.alive:
+            with self._lock:
+                self._workers.remove(worker)
+            worker = _Worker()
+            with self._lock:
+                self._workers.append(worker)
+        worker.wait_ready()
+        return worker
+
+    def run(self, cwd: str, path: Optional[str] = None, command: Optional[str] = None,
+            timeout: Optional[float] = None, cpu_seconds: Optional[float] = None,
+            memory_bytes: Optional[int] = None, capture: Optional[OutputCapture] = None,
+            cancel: Optional[threading.Event] = None, env: Optional[Dict[str, str]] = None,
+            executable: Optional[str] = None, site_packages: Optional[str] = None) -> Dict[str, Any]:
+        """Run the Python file at `path`, or a shell `command`, with `cwd` as working directory.
+
+        Output is streamed into `capture` while the plan runs, and the plan is stopped
+        if it exceeds the capture's byte limit or when `cancel` is set. `env` is added
+        to the plan's environment; `executable` and `site_packages` make a Python plan
+        behave as if run by a virtualenv's interpreter. Returns the exit code, the
+        captured stdout and stderr, whether the run timed out, hit the output limit or
+        was cancelled, and its wall time, CPU time and peak memory.
+        """
+        capture = capture or OutputCapture()
+        with self._lock:
+            self._runs += 1
+            run_id = self._runs
+        fifos = {}
+        for stream in ("stdout", "stderr"):
+            fifos[stream] = os.path.join(self.io_dir, f"{run_id}.{stream}")
+            os.mkfifo(fifos[stream], 0o600)
+
+        worker = self._checkout()
+        if cancel is not None and cancel.is_set():
+            # Cancelled while waiting for a free worker
+            self._idle.put(worker)
+            for fifo in fifos.values():
+                os.remove(fifo)
+            return cancelled_result()
+        read_fds = []
+        child_pid = None
+        try:
+            # Opening the read ends without blocking means the worker's open never waits on us
+            read_fds = [os.open(fifos[stream], os.O_RDONLY | os.O_NONBLOCK) for stream in ("stdout", "stderr")]
+            worker.send({
+                "kind": "shell" if command is not None else "python",
+                "path": path, "command": command, "cwd": cwd,
+                "stdout": fifos["stdout"], "stderr": fifos["stderr"],
+                "timeout": timeout, "cpu_seconds": cpu_seconds, "memory_bytes": memory_bytes,
+                "env": env, "executable": executable, "site_packages": site_packages,
+            })
+            child_pid = worker.receive()["pid"]  # the child is running and holds the write ends
+            for fd in read_fds:
+                os.set_blocking(fd, True)
+
+            def stop():
+                try:
+                    os.killpg(child_pid, signal.SIGKILL)
+                except OSError:
+                    pass
+
+            # From here each reader owns its descriptor and closes it when it is done
+            readers = [
+                threading.Thread(target=_drain_and_close, args=(capture, fd, stream, stop), daemon=True)
+                for fd, stream in zip(read_fds, ("stdout", "stderr"))
+            ]
+            for reader in readers:
+                reader.start()
+            reader_fds, read_fds = read_fds, []
+            finished = threading.Event()
+            if cancel is not None:
+                def watch():
+                    while not finished.wait(CANCEL_POLL_INTERVAL):
+                        if cancel.is_set():
+                            stop()
+                            return
+                threading.Thread(target=watch, daemon=True).start()
+            try:
+                result = worker.receive()
+            finally:
+                finished.set()
+            truncated = False
+            deadline = time.monotonic() + READER_JOIN_TIMEOUT
+            for reader, fd in zip(readers, reader_fds):
+                # A grandchild that left the plan's session can hold the pipe open indefinitely
+                reader.join(max(0.0, deadline - time.monotonic()))
+                if reader.is_alive():
+                    truncated = True
+                    _detach(fd)
+        except BaseException:
+            # The child runs in its own session, so killing the worker alone would orphan it
+            if child_pid is not None:
+                try:
+                    os.killpg(child_pid, signal.SIGKILL)
+                except OSError:
+                    pass
+            # A worker left mid-run is in an unknown state; replace it
+            worker.proc.kill()
+            raise
+        finally:
+            for fd in read_fds:
+                os.close(fd)
+            for fifo in fifos.values():
+                os.remove(fifo)
+            self._idle.put(worker)
+
+        result["stdout"] = capture.text("stdout")
+        result["stderr"] = capture.text("stderr")
+        result["output_bytes"] = capture.total
+        result["output_limited"] = capture.limit_hit
+        result["output_truncated"] = truncated
+        result["cancelled"] = cancel is not None and cancel.is_set() and result["exit_code"] != 0
+        return result
+
+    def close(self) -> None:
+        import shutil
+
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+        shutil.rmtree(self.io_dir, ignore_errors=True)
+
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> WorkerPool:
+    """Return the process-wide worker pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import atexit
+            _pool = WorkerPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+if __name__ == "__main__" and sys.argv[1:] == ["--worker"]:
+    _serve()
@@ -0,0 +1,198 @@
+# workspace.py
+import os
+import sys
+import time
+import shutil
+import hashlib
+import subprocess
+import threading
+from typing import Dict, List, Optional
+
+from locking import file_lock
+
+WORKSPACES_DIR = os.environ.get("GEMINI_WORKSPACES_DIR") or os.path.expanduser("~/.gemini_cli/workspaces")
+DEPS_DIR = os.environ.get("GEMINI_DEPS_DIR") or os.path.expanduser("~/.gemini_cli/deps")
+# Workspaces and the dependency cache together are trimmed back to this size
+DEFAULT_MAX_MB = float(os.environ.get("GEMINI_WORKSPACE_MAX_MB", "4096"))
+
+# Marks a directory as a task workspace and records the task it belongs to
+TASK_FILE = ".task"
+
+
+def task_key(task: str) -> str:
+    """Workspaces are addressed by the task text, ignoring surrounding and repeated whitespace."""
+    return hashlib.sha256(" ".join(task.split()).encode("utf-8")).hexdigest()[:16]
+
+
+def disk_usage(path: str) -> int:
+    """Bytes used by the files under `path` (0 if it does not exist)."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class Workspace:
+    """A task's working directory, kept between runs and retries of the same task.
+
+    Files a plan downloads or writes are still there on the next attempt, so work
+    that succeeded is not repeated. Candidates raced side by side get their own
+    subdirectories.
+    """
+
+    def __init__(self, task: str, root: str = WORKSPACES_DIR):
+        self.task = task
+        self.key = task_key(task)
+        self.path = os.path.join(root, self.key)
+
+    def open(self) -> "Workspace":
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, TASK_FILE), "w", encoding="utf-8") as f:
+            f.write(self.task)
+        # The directory's mtime is its last use, for eviction
+        os.utime(self.path)
+        return self
+
+    def subdir(self, name: str) -> str:
+        path = os.path.join(self.path, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+
+class DependencyCache:
+    """A virtualenv shared by all plans, plus pip's download and wheel cache.
+
+    The venv is addressed by the interpreter it was made from and sees that
+    interpreter's packages. Plans run with it activated, so `pip install pandas` (from
+    the shell, or via sys.executable) installs into it once; on a retry, and in later
+    tasks, pip finds the package already installed. Anything else pip fetches is
+    kept in its content-addressed cache under the same directory.
+    """
+
+    def __init__(self, root: str = DEPS_DIR):
+        self.root = root
+        interpreter = f"{sys.version}\0{os.path.realpath(sys.base_prefix)}"
+        self.venv = os.path.join(root, "venv-" + hashlib.sha256(interpreter.encode("utf-8")).hexdigest()[:12])
+        self.pip_cache = os.path.join(root, "pip")
+        self.bin_dir = os.path.join(self.venv, "Scripts" if os.name == "nt" else "bin")
+        self.python = os.path.join(self.bin_dir, "python.exe" if os.name == "nt" else "python")
+        if os.name == "nt":
+            self.site_packages = os.path.join(self.venv, "Lib", "site-packages")
+        else:
+            self.site_packages = os.path.join(self.venv, "lib", f"python{sys.version_info[0]}.{sys.version_info[1]}",
+                                              "site-packages")
+
+    def ensure(self) -> "DependencyCache":
+        """Create the venv on first use; cheap afterwards."""
+        if os.path.exists(self.python):
+            return self
+        os.makedirs(self.root, exist_ok=True)
+        with file_lock(os.path.join(self.root, ".lock")):
+            if not os.path.exists(self.python):
+                self._create()
+        return self
+
+    def _create(self) -> None:
+        import site
+
+        tmp_venv = f"{self.venv}.{os.getpid()}.tmp"
+        # No pip of its own: the interpreter's pip, seen through the system site-packages, installs into it
+        subprocess.run([sys.executable, "-m", "venv", "--system-site-packages", "--without-pip", tmp_venv],
+                       check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+        tmp_site = self.site_packages.replace(self.venv, tmp_venv, 1)
+        if sys.prefix != sys.base_prefix:
+            # The agent runs in a venv of its own; plans keep seeing its packages too
+            with open(os.path.join(tmp_site, "agent_env.pth"), "w", encoding="utf-8") as f:
+                f.write("\n".join(site.getsitepackages()) + "\n")
+        if os.name != "nt":
+            for name in ("pip", "pip3"):
+                shim = os.path.join(tmp_venv, "bin", name)
+                with open(shim, "w", encoding="utf-8") as f:
+                    f.write(f'#!/bin/sh\nexec "{self.python}" -m pip "$@"\n')
+                os.chmod(shim, 0o755)
+        os.replace(tmp_venv, self.venv)
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables that activate the venv and point pip at the shared cache."""
+        return {"VIRTUAL_ENV": self.venv, "PATH": self.bin_dir + os.pathsep + os.environ.get("PATH", ""),
+                "PIP_CACHE_DIR": self.pip_cache, "PIP_DISABLE_PIP_VERSION_CHECK": "1"}
+
+
+_deps: Optional[DependencyCache] = None
+_deps_lock = threading.Lock()
+
+
+def get_dependency_cache() -> Optional[DependencyCache]:
+    """The shared dependency cache, or None if a venv cannot be created here."""
+    global _deps
+    with _deps_lock:
+        if _deps is None:
+            try:
+                _deps = DependencyCache().ensure()
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"⚠️ Running plans without a dependency cache: {e}", file=sys.stderr)
+                return None
+        return _deps
+
+
+def evict(max_mb: float = DEFAULT_MAX_MB, keep: Optional[str] = None) -> int:
+    """Delete least recently used workspaces until everything fits in max_mb; return bytes freed.
+
+    The workspace of the current task (`keep`) and the venv are never evicted. If
+    the rest is still too large, pip's download cache goes, since it can be refetched.
+    """
+    budget = max_mb * 1024 * 1024
+    entries = []
+    if os.path.isdir(WORKSPACES_DIR):
+        for name in os.listdir(WORKSPACES_DIR):
+            path = os.path.join(WORKSPACES_DIR, name)
+            if os.path.isfile(os.path.join(path, TASK_FILE)):
+                entries.append((os.path.getmtime(path), path, disk_usage(path)))
+    pip_cache = os.path.join(DEPS_DIR, "pip")
+    total = sum(size for _, _, size in entries) + disk_usage(DEPS_DIR)
+    freed = 0
+    for _, path, size in sorted(entries):
+        if total - freed <= budget:
+            break
+        if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        freed += size
+    if total - freed > budget and os.path.isdir(pip_cache):
+        freed += disk_usage(pip_cache)
+        shutil.rmtree(pip_cache, ignore_errors=True)
+    return freed
+
+
+def list_workspaces() -> List[Dict[str, object]]:
+    """Every kept workspace with its task, size and last use, most recent first."""
+    workspaces = []
+    if not os.path.isdir(WORKSPACES_DIR):
+        return workspaces
+    for name in os.listdir(WORKSPACES_DIR):
+        path = os.path.join(WORKSPACES_DIR, name)
+        try:
+            with open(os.path.join(path, TASK_FILE), "r", encoding="utf-8") as f:
+                task = f.read()
+        except OSError:
+            continue
+        workspaces.append({"path": path, "task": task, "bytes": disk_usage(path),
+                           "age_s": time.time() - os.path.getmtime(path)})
+    return sorted(workspaces, key=lambda w: w["age_s"])
+
+
+def purge() -> int:
+    """Delete every workspace and the dependency cache; return bytes freed."""
+    global _deps
+    freed = 0
+    for path in (WORKSPACES_DIR, DEPS_DIR):
+        if os.path.isdir(path):
+            freed += disk_usage(path)
+            shutil.rmtree(path, ignore_errors=True)
+    with _deps_lock:
+        _deps = None
+    return freed